@@ -0,0 +1,108 @@
+"""
+Benchmark of the feature engineering step: serial engineer_features vs. engineer_features_parallel
+(process pool over row shards), on synthetic taxi ride data of 100k, 1M and 10M rows by default.
+
+Usage:
+    python ./benchmarks/engineer_features_benchmark.py --workers 4 --sizes 100000 1000000 10000000
+"""
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import argparse
+import numpy as np
+import pandas as pd
+from src.features import feature_pipeline
+import time
+
+
+def make_processed_df(
+    n_rows: int,
+    seed: int = 0
+) -> pd.DataFrame:
+    """
+    Generates synthetic rows with the columns of the processed dataset (pickup times from 
+    January to June 2016, coordinates around New York City).
+
+    Args:
+        n_rows (int): Number of rows to generate.
+        seed (int): Seed of the random number generator.
+
+    Returns:
+        pd.DataFrame: The synthetic processed dataset.
+    """
+    rng = np.random.default_rng(seed)
+    start, end = pd.Timestamp("2016-01-01").value, pd.Timestamp("2016-07-01").value
+    return pd.DataFrame({
+        'id': np.arange(n_rows),
+        'vendor_id': rng.integers(1, 3, n_rows),
+        # already a datetime column, so that string parsing (serial in both modes) is not measured
+        'pickup_datetime': pd.to_datetime(rng.integers(start, end, n_rows)),
+        'passenger_count': rng.integers(1, 7, n_rows),
+        'pickup_longitude': rng.uniform(-74.05, -73.75, n_rows),
+        'pickup_latitude': rng.uniform(40.60, 40.85, n_rows),
+        'dropoff_longitude': rng.uniform(-74.05, -73.75, n_rows),
+        'dropoff_latitude': rng.uniform(40.60, 40.85, n_rows),
+        'store_and_fwd_flag': 'N',
+        'trip_duration': rng.integers(60, 3600, n_rows)
+    })
+
+
+def time_call(
+    function,
+    df: pd.DataFrame,
+    repeat: int,
+    **kwargs
+) -> float:
+    """
+    Returns the best wall time (in seconds) out of repeat calls of function on a copy of df.
+    """
+    timings = []
+    for _ in range(repeat):
+        df_copy = df.copy()
+        start = time.perf_counter()
+        function(df_copy, **kwargs)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def run(
+    sizes: list,
+    n_workers: int,
+    repeat: int
+) -> pd.DataFrame:
+    """
+    Times serial and parallel feature engineering for every size.
+
+    Args:
+        sizes (list): Numbers of rows to benchmark.
+        n_workers (int): Number of worker processes of the parallel mode.
+        repeat (int): Number of timed calls per mode (the best one is reported).
+
+    Returns:
+        pd.DataFrame: One row per size, with the timings and the speedup.
+    """
+    results = []
+    for n_rows in sizes:
+        df = make_processed_df(n_rows)
+        serial = time_call(feature_pipeline.engineer_features, df, repeat)
+        parallel = time_call(feature_pipeline.engineer_features_parallel, df, repeat, n_workers=n_workers)
+        results.append({
+            'rows': n_rows,
+            'workers': n_workers,
+            'serial_s': round(serial, 3),
+            'parallel_s': round(parallel, 3),
+            'speedup': round(serial / parallel, 2)
+        })
+        print(results[-1])
+    return pd.DataFrame(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100000, 1000000, 10000000], help='Numbers of rows')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Number of worker processes')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of timed calls per mode')
+    args = parser.parse_args()
+
+    print(run(sizes=args.sizes, n_workers=args.workers, repeat=args.repeat).to_string(index=False))
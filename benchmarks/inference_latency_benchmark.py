@@ -0,0 +1,292 @@
+"""
+End-to-end benchmark of the online prediction path, stage by stage: feature engineering
+(app_utils.process_input_batch), holiday calendar lookup, model load, model.predict, and the
+feature store insert (into the local file-backed feature store). Every stage is timed at every batch
+size (1 to 100k trips by default, from trip_generator.generate_trips), and reported as p50/p95/p99
+latency, throughput and peak memory (traced allocations during one call).
+
+The results are written to a JSON file. With --baseline, they are compared with an earlier results
+file, and the benchmark exits with status 1 if a stage got slower than the tolerance allows.
+
+With the trained model (model/1/final_xgb_model.bin), the model stages use XGBoost. With --synthetic
+(or when the trained model can not be loaded), they use a random NumPy tree ensemble with the size of
+the final model, loaded from its JSON file.
+
+Usage:
+    python ./benchmarks/inference_latency_benchmark.py --output results.json
+    python ./benchmarks/inference_latency_benchmark.py --synthetic --baseline results.json --tolerance 0.2
+"""
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import argparse
+from benchmarks.tree_ensemble_benchmark import make_random_model
+from config import config
+import json
+import numpy as np
+import pandas as pd
+from pathlib import Path
+import platform
+import resource
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, List
+
+
+# order of the stages in the results
+STAGES = ["process_input", "holiday_lookup", "model_load", "predict", "insert"]
+
+
+def measure(
+    function: Callable[[], object],
+    repeat: int
+) -> dict:
+    """
+    Times repeat calls of function (after a warm-up call), and traces the peak memory of one more call.
+
+    Args:
+        function (Callable): Function without arguments.
+        repeat (int): Number of timed calls.
+
+    Returns:
+        dict: The latencies ('seconds', a list), and the peak of the memory allocated by one call ('peak_bytes').
+    """
+    function()
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        seconds.append(time.perf_counter() - start)
+    # traced separately, as tracing slows the allocations down
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"seconds": seconds, "peak_bytes": peak}
+
+
+def summarize(
+    stage: str,
+    batch_size: int,
+    measurement: dict
+) -> dict:
+    """
+    Returns the latency percentiles (ms), the throughput (rows per second) and the peak memory (MB) of
+    a measurement.
+    """
+    milliseconds = 1000 * np.asarray(measurement["seconds"])
+    p50, p95, p99 = np.percentile(milliseconds, [50, 95, 99])
+    return {
+        "stage": stage,
+        "batch_size": batch_size,
+        "n_calls": len(milliseconds),
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+        "mean_ms": float(milliseconds.mean()),
+        "throughput_rows_per_s": float(batch_size / (milliseconds.mean() / 1000)) if milliseconds.mean() > 0 else None,
+        "peak_memory_mb": measurement["peak_bytes"] / 2 ** 20,
+    }
+
+
+def load_model_stage(
+    synthetic: bool,
+    n_trees: int,
+    depth: int,
+    work_dir: Path
+) -> tuple:
+    """
+    Returns the model load function (loading the model from disk, bypassing the model cache) and the
+    engine name: the trained XGBoost model, or else a random tree ensemble loaded from its JSON file.
+    """
+    from src.utils import app_utils
+    if not synthetic:
+        try:
+            def load_model():
+                app_utils.clear_model_cache()
+                return app_utils.get_model(project=None, model_name="final_xgboost", version=1)
+            load_model()
+            return load_model, "xgboost"
+        except Exception as e:
+            print(f"Trained model not available ({e}), benchmarking a random tree ensemble instead")
+
+    from src.inference.tree_ensemble import TreeEnsemble
+    model_path = Path(work_dir, "random_model.json")
+    with open(model_path, "w") as f:
+        json.dump(make_random_model(n_trees, depth), f)
+
+    def load_model():
+        with open(model_path) as f:
+            return TreeEnsemble.from_json(json.load(f), output_transform=np.expm1)
+    return load_model, f"numpy (random ensemble, {n_trees} trees of depth {depth})"
+
+
+def run(
+    sizes: List[int],
+    repeat: int,
+    max_rows: int,
+    synthetic: bool = False,
+    n_trees: int = 1000,
+    depth: int = 8,
+    seed: int = 0
+) -> dict:
+    """
+    Benchmarks every stage of the online prediction path at every batch size.
+
+    The number of timed calls of a stage at a batch size is repeat, reduced so that at most max_rows
+    rows are processed (and at least 3 calls are timed).
+
+    Args:
+        sizes (List[int]): Batch sizes (number of trips).
+        repeat (int): Maximum number of timed calls per stage and batch size.
+        max_rows (int): Maximum number of rows processed per stage and batch size.
+        synthetic (bool): Whether to benchmark a random ensemble instead of the trained model.
+        n_trees (int): Number of trees of the random ensemble.
+        depth (int): Depth of the trees of the random ensemble.
+        seed (int): Seed of the trip generator.
+
+    Returns:
+        dict: The environment ('metadata') and one entry per stage and batch size ('results').
+    """
+    from src.features import engineered_features
+    from src.inference import trip_generator
+    from src.utils import app_utils, local_feature_store
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        load_model, engine = load_model_stage(synthetic, n_trees, depth, Path(work_dir))
+        model = load_model()
+        fs = local_feature_store.LocalProject("benchmark", work_dir).get_feature_store()
+        feature_group = fs.create_feature_group(name="predictions", version=1, primary_key=["pickup_datetime"])
+
+        # the model load does not depend on the batch size
+        results.append(summarize("model_load", 1, measure(load_model, max(3, min(repeat, 10)))))
+        for batch_size in sizes:
+            n_calls = max(3, min(repeat, max_rows // batch_size))
+            trips = trip_generator.generate_trips(
+                batch_size,
+                seed=seed,
+                start_time=pd.Timestamp("2016-01-01").timestamp(),
+                end_time=pd.Timestamp("2016-07-01").timestamp()
+            )
+            pickup_datetime = pd.to_datetime(np.floor(trips["pickup_datetime"]), unit="s")
+            features = app_utils.process_input_batch(trips)
+            prediction = model.predict(features)
+            df_updated = pd.concat([
+                pd.DataFrame({"pickup_datetime": pickup_datetime.dt.strftime("%Y-%m-%d %H:%M:%S")}),
+                features,
+                pd.DataFrame({"prediction": prediction})
+            ], axis=1)
+
+            stages = {
+                "process_input": lambda: app_utils.process_input_batch(trips),
+                "holiday_lookup": lambda: engineered_features.get_holidays(pickup_datetime),
+                "predict": lambda: model.predict(features),
+                "insert": lambda: feature_group.insert(features=df_updated),
+            }
+            for stage, function in stages.items():
+                results.append(summarize(stage, batch_size, measure(function, n_calls)))
+                print(f"{stage:<16}{batch_size:>8} rows  p50 {results[-1]['p50_ms']:>10.3f} ms  "
+                      f"p99 {results[-1]['p99_ms']:>10.3f} ms  {results[-1]['peak_memory_mb']:>8.1f} MB")
+
+    results.sort(key=lambda result: (STAGES.index(result["stage"]), result["batch_size"]))
+    return {
+        "metadata": {
+            "engine": engine,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        },
+        "results": results,
+    }
+
+
+def compare(
+    results: dict,
+    baseline: dict,
+    tolerance: float,
+    metrics: List[str],
+    min_delta_ms: float
+) -> List[str]:
+    """
+    Compares results with baseline results (of the same stages and batch sizes).
+
+    A metric regressed if it is more than tolerance (relative) and more than min_delta_ms (absolute,
+    as very short stages are noisy) above its baseline.
+
+    Args:
+        results (dict): The results of run.
+        baseline (dict): Earlier results of run.
+        tolerance (float): Allowed relative slowdown, e.g. 0.2 for 20%.
+        metrics (List[str]): Latency metrics to compare, e.g. ['p50_ms', 'p95_ms'].
+        min_delta_ms (float): Allowed absolute slowdown, in milliseconds.
+
+    Returns:
+        List[str]: One description per regression (empty if there is none).
+    """
+    baseline_results = {(result["stage"], result["batch_size"]): result for result in baseline["results"]}
+    regressions = []
+    for result in results["results"]:
+        reference = baseline_results.get((result["stage"], result["batch_size"]))
+        if reference is None:
+            continue
+        for metric in metrics:
+            value, reference_value = result[metric], reference[metric]
+            if value > reference_value * (1 + tolerance) and value - reference_value > min_delta_ms:
+                regressions.append(
+                    f"{result['stage']} ({result['batch_size']} rows): {metric} {value:.3f} "
+                    f"vs. {reference_value:.3f} in the baseline (+{100 * (value / reference_value - 1):.0f}%)"
+                )
+    return regressions
+
+
+if __name__ == "__main__":
+    # parse command-line arguments to get the batch sizes, the output file and the baseline
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 100, 1000, 10000, 100000], help='Batch sizes (trips)')
+    parser.add_argument('--repeat', type=int, default=100, help='Maximum number of timed calls per stage and batch size')
+    parser.add_argument('--max-rows', type=int, default=1000000, help='Maximum number of rows per stage and batch size')
+    parser.add_argument('--synthetic', action='store_true', help='Benchmark a random ensemble (no XGBoost needed)')
+    parser.add_argument('--trees', type=int, default=1000, help='Number of trees of the random ensemble')
+    parser.add_argument('--depth', type=int, default=8, help='Depth of the trees of the random ensemble')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the trip generator')
+    parser.add_argument('--output', default=str(Path(config.BASE_DIR, "benchmarks", "results", "inference_latency.json")), help='JSON file to write the results to')
+    parser.add_argument('--baseline', help='JSON results file to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed relative slowdown against the baseline')
+    parser.add_argument('--metrics', nargs='+', default=['p50_ms'], help='Latency metrics compared with the baseline')
+    parser.add_argument('--min-delta-ms', type=float, default=0.1, help='Allowed absolute slowdown against the baseline (ms)')
+    args = parser.parse_args()
+
+    # run the benchmark, and write the results
+    results = run(
+        args.sizes,
+        args.repeat,
+        args.max_rows,
+        synthetic=args.synthetic,
+        n_trees=args.trees,
+        depth=args.depth,
+        seed=args.seed
+    )
+    os.makedirs(Path(args.output).parent, exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    # compare with the baseline
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance, args.metrics, args.min_delta_ms)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regression against {args.baseline}")
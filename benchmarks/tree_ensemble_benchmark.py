@@ -0,0 +1,156 @@
+"""
+Benchmark of the prediction latency: model.predict (XGBoost) vs. the NumPy tree ensemble
+(src/inference/tree_ensemble.py), at batch sizes of 1, 64 and 10k rows by default.
+
+With the trained model (model/1/final_xgb_model.bin), the batches are the features of synthetic
+trips (app_utils.process_input_batch). With --synthetic, a random ensemble with the size of the final
+model is evaluated on random features instead (no XGBoost needed, the NumPy engine only).
+
+Usage:
+    python ./benchmarks/tree_ensemble_benchmark.py --sizes 1 64 10000
+    python ./benchmarks/tree_ensemble_benchmark.py --synthetic --trees 1000 --depth 8
+"""
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import argparse
+from config import config
+import numpy as np
+from pathlib import Path
+import pandas as pd
+from src.inference.tree_ensemble import TreeEnsemble
+import time
+
+
+def make_random_model(
+    n_trees: int,
+    depth: int,
+    n_features: int = 14,
+    seed: int = 0
+) -> dict:
+    """
+    Generates a random model in the XGBoost JSON format: complete trees of the given depth with
+    numerical splits on uniform features.
+
+    Args:
+        n_trees (int): Number of trees.
+        depth (int): Depth of every tree.
+        n_features (int): Number of features.
+        seed (int): Seed of the random number generator.
+
+    Returns:
+        dict: The JSON model.
+    """
+    rng = np.random.default_rng(seed)
+    n_inner, n_nodes = 2 ** depth - 1, 2 ** (depth + 1) - 1
+    nodes = np.arange(n_nodes)
+    is_leaf = nodes >= n_inner
+    trees = []
+    for _ in range(n_trees):
+        trees.append({
+            "left_children": np.where(is_leaf, -1, 2 * nodes + 1).tolist(),
+            "right_children": np.where(is_leaf, -1, 2 * nodes + 2).tolist(),
+            "split_indices": rng.integers(0, n_features, n_nodes).tolist(),
+            "split_conditions": np.where(is_leaf, rng.normal(0, 0.01, n_nodes), rng.uniform(0, 1, n_nodes)).tolist(),
+            "default_left": rng.integers(0, 2, n_nodes).tolist(),
+        })
+    return {"learner": {
+        "gradient_booster": {"name": "gbtree", "model": {"gbtree_model_param": {}, "trees": trees}},
+        "learner_model_param": {"base_score": "5E-1"},
+        "objective": {"name": "reg:squaredlogerror"},
+    }}
+
+
+def make_trip_features(
+    n_rows: int,
+    seed: int = 0
+) -> pd.DataFrame:
+    """
+    Returns the model features of synthetic trips (pickup times in 2016, coordinates around New York City).
+
+    Args:
+        n_rows (int): Number of trips.
+        seed (int): Seed of the random number generator.
+
+    Returns:
+        pd.DataFrame: The features, in the model's column order.
+    """
+    from src.utils import app_utils
+    rng = np.random.default_rng(seed)
+    return app_utils.process_input_batch({
+        'vendor_id': rng.integers(1, 3, n_rows),
+        'passenger_count': rng.integers(1, 7, n_rows),
+        'pickup_latitude': rng.uniform(40.60, 40.85, n_rows),
+        'pickup_longitude': rng.uniform(-74.05, -73.75, n_rows),
+        'dropoff_latitude': rng.uniform(40.60, 40.85, n_rows),
+        'dropoff_longitude': rng.uniform(-74.05, -73.75, n_rows),
+        'pickup_datetime': rng.uniform(pd.Timestamp("2016-01-01").timestamp(), pd.Timestamp("2017-01-01").timestamp(), n_rows),
+    })
+
+
+def time_call(
+    function,
+    inputs,
+    repeat: int
+) -> float:
+    """
+    Returns the median wall time (in seconds) of repeat calls of function on inputs (after a warm-up call).
+    """
+    function(inputs)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(inputs)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+
+def run(
+    sizes: list,
+    repeat: int,
+    synthetic: bool = False,
+    n_trees: int = 1000,
+    depth: int = 8
+) -> None:
+    """
+    Prints the latency of every predictor at every batch size.
+
+    Args:
+        sizes (list): Batch sizes (number of rows).
+        repeat (int): Number of timed calls per batch size.
+        synthetic (bool): Whether to benchmark a random ensemble instead of the trained model.
+        n_trees (int): Number of trees of the random ensemble.
+        depth (int): Depth of the trees of the random ensemble.
+
+    Returns:
+        None
+    """
+    if synthetic:
+        predictors = {"numpy": TreeEnsemble.from_json(make_random_model(n_trees, depth)).predict}
+        make_inputs = lambda n_rows: np.random.default_rng(0).uniform(0, 1, (n_rows, 14))
+    else:
+        import joblib
+        model = joblib.load(Path(config.MODEL_DIR, "1", "final_xgb_model.bin"))
+        predictors = {"xgboost": model.predict, "numpy": TreeEnsemble.from_model(model).predict}
+        make_inputs = make_trip_features
+
+    print(f"{'rows':>8} " + " ".join(f"{name + ' (ms)':>14}" for name in predictors))
+    for n_rows in sizes:
+        inputs = make_inputs(n_rows)
+        timings = [time_call(predict, inputs, repeat) * 1000 for predict in predictors.values()]
+        print(f"{n_rows:>8} " + " ".join(f"{timing:>14.3f}" for timing in timings))
+
+
+if __name__ == "__main__":
+    # parse command-line arguments to get the batch sizes
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 64, 10000], help='Batch sizes (rows)')
+    parser.add_argument('--repeat', type=int, default=20, help='Number of timed calls per batch size')
+    parser.add_argument('--synthetic', action='store_true', help='Benchmark a random ensemble (no XGBoost needed)')
+    parser.add_argument('--trees', type=int, default=1000, help='Number of trees of the random ensemble')
+    parser.add_argument('--depth', type=int, default=8, help='Depth of the trees of the random ensemble')
+    args = parser.parse_args()
+
+    # run the benchmark
+    run(args.sizes, args.repeat, synthetic=args.synthetic, n_trees=args.trees, depth=args.depth)
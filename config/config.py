@@ -12,4 +12,16 @@ MODEL_DIR = Path(BASE_DIR, "model")
 # Hopsworks API Key
 # this key was used locally, which has been deleted when the code was made public
 # alternatively, one can also use api key file to login
-HOPSWORKS_API_KEY = 'xxxxx' 
\ No newline at end of file
+HOPSWORKS_API_KEY = 'xxxxx' 
+
+# Feature store backend: "hopsworks", or "local" (file-backed, for offline runs and benchmarks)
+FEATURE_STORE_BACKEND = os.environ.get("FEATURE_STORE_BACKEND", "hopsworks")
+LOCAL_FEATURE_STORE_DIR = Path(os.environ.get("LOCAL_FEATURE_STORE_DIR", Path(DATA_DIR, "local_feature_store")))
+
+# Metrics of the instrumented code (see src/utils/instrumentation.py): disabled unless METRICS_ENABLED=1
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "0") == "1"
+METRICS_DIR = Path(os.environ.get("METRICS_DIR", Path(DATA_DIR, "metrics")))
+
+# Holiday feature: whether it flags US federal holidays besides sundays (see src/features/engineered_features.py).
+# The deployed model was trained with sundays only; enable it only together with regenerated features and a retrain
+FEDERAL_HOLIDAYS_FEATURE = os.environ.get("FEDERAL_HOLIDAYS_FEATURE", "0") == "1"
@@ -1,8 +1,260 @@
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from config import config
 import numpy as np
 import pandas as pd
 from pandas.tseries.holiday import (
     USFederalHolidayCalendar,  # to find public holidays in US
 )
+import threading
+from typing import Tuple
+
+
+# calendar columns produced by extract_datetime_features, in output order
+DATETIME_FEATURES = [
+    "month", "week", "weekday", "hour", "minute", "minute_of_the_day",
+    "hour_before7_after7", "holiday"
+]
+
+# years covered by the process-wide holiday index when it is first built
+# (the index is extended lazily whenever a timestamp falls outside of it)
+HOLIDAY_INDEX_YEARS = (2015, 2030)
+
+_NS_PER_MINUTE = 60 * 10**9
+_MINUTES_PER_DAY = 24 * 60
+_NS_PER_DAY = _NS_PER_MINUTE * _MINUTES_PER_DAY
+_EPOCH_WEEKDAY = 3 # 1970-01-01 was a thursday (monday=0)
+_EPOCH_SHIFT = 719468 # days from 0000-03-01 to 1970-01-01 in the proleptic gregorian calendar
+
+
+def _civil_from_days(
+    days: np.ndarray
+) -> tuple:
+    """
+    Converts days since the unix epoch to (year, month) using integer arithmetic only.
+    (Howard Hinnant's 'civil_from_days' algorithm, vectorized over a NumPy array.)
+
+    Args:
+        days (numpy.ndarray): Array of int64 days since 1970-01-01.
+
+    Returns:
+        tuple: Two int64 arrays holding the year and the month (1-12) of each day.
+    """
+    z = days + _EPOCH_SHIFT
+    era = z // 146097
+    doe = z - era * 146097 # day of era [0, 146096]
+    yoe = (doe - doe // 1460 + doe // 36524 - doe // 146096) // 365 # year of era [0, 399]
+    doy = doe - (365 * yoe + yoe // 4 - yoe // 100) # day of year, counted from march 1st
+    mp = (5 * doy + 2) // 153 # month, counted from march [0, 11]
+    month = np.where(mp < 10, mp + 3, mp - 9)
+    year = yoe + era * 400 + (month <= 2)
+    return year, month
+
+
+def _days_from_new_year(
+    year: np.ndarray
+) -> np.ndarray:
+    """
+    Returns days since the unix epoch of January 1st of each given year 
+    (inverse of _civil_from_days for the first day of the year).
+
+    Args:
+        year (numpy.ndarray): Array of int64 years.
+
+    Returns:
+        numpy.ndarray: Array of int64 days since 1970-01-01.
+    """
+    y = year - 1 # january belongs to the previous year in a march based calendar
+    era = y // 400
+    yoe = y - era * 400
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + 306 # 306 days from march 1st to january 1st
+    return era * 146097 + doe - _EPOCH_SHIFT
+
+
+# the calendar is stateless, so a single instance is shared by the whole process
+_us_federal_holiday_calendar = USFederalHolidayCalendar()
+
+# process-wide holiday index: (days since epoch of the first covered day, bitmap with 1 for every
+# day of the holiday feature, whether it flags US federal holidays), replaced as a whole whenever it 
+# is extended or the flag changes
+_holiday_index = None
+_holiday_index_lock = threading.Lock()
+
+
+def get_holiday_index(
+    first_day: int = None,
+    last_day: int = None
+) -> Tuple[int, np.ndarray]:
+    """
+    Returns the process-wide holiday index, building or extending it if it does not cover the 
+    requested days. The index is a bitmap over consecutive days (since 1970-01-01), with 1 for 
+    the days of the holiday feature, and 0 otherwise.
+
+    The holiday feature the model was trained with flags sundays only (the training features passed 
+    the holiday calendar DataFrame to Series.isin, which matches its column labels, not its dates). 
+    US federal holidays are flagged as well only if config.FEDERAL_HOLIDAYS_FEATURE is set, which 
+    requires regenerating the features and retraining the model.
+
+    Args:
+        first_day (int, optional): First day (since the epoch) the index must cover.
+        last_day (int, optional): Last day (since the epoch) the index must cover.
+
+    Returns:
+        Tuple[int, numpy.ndarray]: 
+            Day (since the epoch) of the first entry of the bitmap, and the uint8 bitmap itself.
+    """
+    global _holiday_index
+    federal = config.FEDERAL_HOLIDAYS_FEATURE
+    index = _holiday_index
+    if index is not None and index[2] == federal and (first_day is None or first_day >= index[0]) \
+            and (last_day is None or last_day < index[0] + len(index[1])):
+        return index[:2]
+
+    with _holiday_index_lock:
+        index = _holiday_index if _holiday_index is not None and _holiday_index[2] == federal else None
+        # always cover whole years, and at least the configured range
+        first_year, last_year = HOLIDAY_INDEX_YEARS
+        if index is not None:
+            first_year = min(first_year, pd.Timestamp(int(index[0]), unit="D").year)
+            last_year = max(last_year, pd.Timestamp(int(index[0]) + len(index[1]) - 1, unit="D").year)
+        if first_day is not None:
+            first_year = min(first_year, pd.Timestamp(int(first_day), unit="D").year)
+        if last_day is not None:
+            last_year = max(last_year, pd.Timestamp(int(last_day), unit="D").year)
+        start = int(_days_from_new_year(np.int64(first_year)))
+        end = int(_days_from_new_year(np.int64(last_year + 1)))
+
+        days = np.arange(start, end, dtype=np.int64)
+        bitmap = ((days + _EPOCH_WEEKDAY) % 7 == 6).astype(np.uint8) # sundays
+        if federal:
+            holidays = _us_federal_holiday_calendar.holidays(
+                start=pd.Timestamp(start, unit="D"), 
+                end=pd.Timestamp(end - 1, unit="D")
+            )
+            bitmap[holidays.asi8 // _NS_PER_DAY - start] = 1
+        _holiday_index = (start, bitmap, federal)
+        return _holiday_index[:2]
+
+
+def to_epoch_ns(
+    datetime: pd.Series
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the int64 nanoseconds since the epoch of a pandas datetime column (wall clock time 
+    for timezone aware values), together with the mask of missing values.
+
+    Args:
+        datetime (pandas.Series): Column of datetime values.
+
+    Returns:
+        Tuple[numpy.ndarray, numpy.ndarray]: 
+            The int64 nanoseconds since the epoch, and a boolean array which is True for missing values.
+    """
+    # wall clock time is used for timezone aware values, as with the .dt accessor
+    if datetime.dt.tz is not None:
+        datetime = datetime.dt.tz_localize(None)
+    ns = np.asarray(datetime.values, dtype="datetime64[ns]").view("i8")
+    return ns, ns == np.iinfo(np.int64).min
+
+
+def _lookup_holidays(
+    days: np.ndarray,
+    nat: np.ndarray,
+    out: np.ndarray
+) -> np.ndarray:
+    """
+    Fills out with the holiday index entry of each day (0 where the timestamp is missing).
+    """
+    out[:] = 0
+    valid_days = days[~nat]
+    if len(valid_days):
+        first_day, bitmap = get_holiday_index(valid_days.min(), valid_days.max())
+        out[~nat] = bitmap[valid_days - first_day]
+    return out
+
+
+def extract_datetime_features(
+    datetime: pd.Series,
+    holiday_list: list = None
+) -> pd.DataFrame:
+    """
+    Extracts every calendar feature from a pandas datetime column in a single pass.
+
+    The int64 timestamps are decoded once into minutes and days since the epoch, and all 
+    the columns are filled from those with integer arithmetic into one preallocated array. 
+    The per-feature functions below (extract_month, get_holidays, ...) are thin wrappers 
+    around this function and return identical values.
+
+    Args:
+        datetime (pandas.Series): Column of datetime values from which to extract the features.
+        holiday_list (list, optional): 
+            List of dates corresponding to public holidays (same semantics as in get_holidays).
+            If None, the process-wide holiday index is used (sundays, see get_holiday_index).
+
+    Returns:
+        pandas.DataFrame: 
+            DataFrame with the columns listed in DATETIME_FEATURES, sharing the index of the 
+            input datetime.
+    """
+    ns, nat = to_epoch_ns(datetime)
+    has_nat = bool(nat.any())
+
+    columns = DATETIME_FEATURES
+    out = np.empty((len(columns), len(ns)), dtype=np.int64)
+    month, week, weekday, hour, minute, minute_of_the_day, hour_flag, holiday = out
+
+    # decode the timestamps once
+    minutes = np.floor_divide(ns, _NS_PER_MINUTE)
+    days = np.floor_divide(minutes, _MINUTES_PER_DAY)
+    np.subtract(minutes, days * _MINUTES_PER_DAY, out=minute_of_the_day)
+    np.floor_divide(minute_of_the_day, 60, out=hour)
+    np.subtract(minute_of_the_day, hour * 60, out=minute)
+    np.remainder(days + _EPOCH_WEEKDAY, 7, out=weekday)
+    month[:] = _civil_from_days(days)[1]
+
+    # iso week: the week (and its year) is the one of the thursday in the same monday-sunday week
+    thursday = days - weekday + 3
+    np.floor_divide(thursday - _days_from_new_year(_civil_from_days(thursday)[0]), 7, out=week)
+    week += 1
+
+    # 1 for hours between 2:00pm and 7:00am (hours 0, 1 and 8-23), 0 otherwise
+    np.logical_or(hour < 2, hour > 7, out=hour_flag, casting="unsafe")
+
+    if holiday_list is None:
+        # one gather per row from the holiday index
+        _lookup_holidays(days, nat, out=holiday)
+    else:
+        np.equal(weekday, 6, out=holiday, casting="unsafe")
+        valid_days = days[~nat] if has_nat else days
+        if len(valid_days):
+            # look holidays up once per calendar day in the covered range instead of once per row
+            first_day = valid_days.min()
+            day_range = pd.date_range(
+                start=pd.Timestamp(int(first_day), unit="D"), 
+                periods=int(valid_days.max() - first_day) + 1, 
+                freq="D"
+            )
+            is_holiday = pd.Series(day_range.date).isin(holiday_list).to_numpy()
+            if has_nat:
+                holiday[~nat] |= is_holiday[valid_days - first_day]
+            else:
+                holiday |= is_holiday[days - first_day]
+
+    if not has_nat:
+        return pd.DataFrame(out.T, columns=columns, index=datetime.index)
+
+    # missing timestamps give NaN calendar values (float64) and 0 flags, as with the .dt accessor
+    data = {}
+    for name, values in zip(columns, out):
+        if name in ("hour_before7_after7", "holiday"):
+            values[nat] = 0
+        else:
+            values = values.astype(np.float64)
+            values[nat] = np.nan
+        data[name] = values
+    return pd.DataFrame(data, index=datetime.index)
 
 
 def extract_month(
@@ -19,8 +271,7 @@ def extract_month(
             DataFrame containing a single column "month", with the extracted month
             values for each element in the input datetime.
     """
-    dic = {"month": datetime.dt.month}
-    return pd.DataFrame(data=dic)
+    return extract_datetime_features(datetime)[["month"]]
 
 
 def extract_week(
@@ -37,8 +288,7 @@ def extract_week(
             DataFrame containing a single column "week", with the extracted week 
             values for each element in the input datetime.
     """
-    dic = {"week": datetime.dt.week}
-    return pd.DataFrame(data=dic)
+    return extract_datetime_features(datetime)[["week"]]
 
 
 def extract_weekday(
@@ -55,8 +305,7 @@ def extract_weekday(
             DataFrame containing a single column "weekday", with the extracted weekday 
             values for each element in the input datetime.
     """
-    dic = {"weekday": datetime.dt.weekday}
-    return pd.DataFrame(data=dic)
+    return extract_datetime_features(datetime)[["weekday"]]
 
 
 def extract_hour(
@@ -73,8 +322,7 @@ def extract_hour(
             ataFrame containing a single column "hour", with the extracted hour values for 
             each element in the input datetime.
     """
-    dic = {"hour": datetime.dt.hour}
-    return pd.DataFrame(data=dic)
+    return extract_datetime_features(datetime)[["hour"]]
 
 
 def extract_minute(
@@ -91,8 +339,7 @@ def extract_minute(
             DataFrame containing a single column "minute", with the extracted minute values 
             for each element in the input datetime.
     """
-    dic = {"minute": datetime.dt.minute}
-    return pd.DataFrame(data=dic)
+    return extract_datetime_features(datetime)[["minute"]]
 
 
 def extract_minute_of_the_day(
@@ -110,13 +357,12 @@ def extract_minute_of_the_day(
             DataFrame containing a single column "minute_of_the_day", with the extracted 
             'minute of the day' values for each element in the input datetime.
     """
-    dic = {"minute_of_the_day": datetime.dt.hour * 60 + datetime.dt.minute}
-    return pd.DataFrame(data=dic)
+    return extract_datetime_features(datetime)[["minute_of_the_day"]]
 
 
 def get_holidays(
     datetime: pd.Series, 
-    holiday_list: list
+    holiday_list: list = None
 ) -> np.ndarray:
     """
     Returns a binary indicator for whether each element in a pandas datetime column 
@@ -124,7 +370,9 @@ def get_holidays(
 
     Args:
         datetime (pandas.Series): Column of datetime values for which to compute the holiday indicator.
-        holiday_list (list): List of dates corresponding to public holidays. 
+        holiday_list (list, optional): 
+            List of dates corresponding to public holidays. If None, the process-wide holiday 
+            index (sundays, the trained semantics, see get_holiday_index) is used.
 
     Returns:
         numpy.ndarray: 
@@ -133,9 +381,10 @@ def get_holidays(
             corresponding element is a holiday (public holiday and sunday), and a value of 0 indicates 
             that it is not.
     """
-    return np.where(
-        (datetime.dt.weekday == 6) | (datetime.dt.date.isin(holiday_list)), 1, 0
-    )
+    if holiday_list is None:
+        ns, nat = to_epoch_ns(datetime)
+        return _lookup_holidays(ns // _NS_PER_DAY, nat, out=np.empty(len(ns), dtype=np.int64))
+    return extract_datetime_features(datetime, holiday_list)["holiday"].to_numpy()
 
 
 def get_us_federal_holiday_calender(
@@ -152,8 +401,10 @@ def get_us_federal_holiday_calender(
     Returns:
         pandas.DataFrame: DataFrame with column 'date' containing US Federal holidays.
     """
-    calender = USFederalHolidayCalendar()
-    return pd.DataFrame(calender.holidays(start=datetime_min, end=datetime_max), columns=["date"])
+    return pd.DataFrame(
+        _us_federal_holiday_calendar.holidays(start=datetime_min, end=datetime_max), 
+        columns=["date"]
+    )
 
 
 def get_hour_before7_after7(
@@ -174,9 +425,7 @@ def get_hour_before7_after7(
             A value of 1 indicates that the corresponding element is between 2:00 PM and 7:00 AM, 
             and a value of 0 indicates that it is between 7:00 AM and 2 PM.
     """
-    return np.where(
-        (datetime.dt.hour == 0) | (datetime.dt.hour == 1) | (datetime.dt.hour > 7), 1, 0
-    )
+    return extract_datetime_features(datetime)["hour_before7_after7"].to_numpy()
 
 
 def calculate_haversine_distance(
@@ -240,4 +489,100 @@ def calculate_direction(
     lng_delta_rad = dropoff_longitude - pickup_longitude
     y_coordinate = np.sin(lng_delta_rad) * np.cos(dropoff_latitude)
     x_coordinate = np.cos(pickup_latitude) * np.sin(dropoff_latitude) - np.sin(pickup_latitude) * np.cos(dropoff_latitude) * np.cos(lng_delta_rad)
-    return (np.degrees(np.arctan2(y_coordinate, x_coordinate)) + 360) % 360
\ No newline at end of file
+    return (np.degrees(np.arctan2(y_coordinate, x_coordinate)) + 360) % 360
+
+
+def calculate_distance_and_direction(
+    pickup_latitude: np.ndarray, 
+    pickup_longitude: np.ndarray, 
+    dropoff_latitude: np.ndarray, 
+    dropoff_longitude: np.ndarray,
+    dtype: type = np.float64,
+    out: Tuple[np.ndarray, np.ndarray] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Calculate both the haversine distance (in km) and the direction (in degrees) from the pickup location 
+    to the dropoff location. The trigonometric terms shared by the two are computed once, and the results 
+    are written into the given output buffers if any. With dtype=np.float64 the results are identical to 
+    calculate_haversine_distance and calculate_direction.
+
+    Args:
+        pickup_latitude (numpy.ndarray): The latitude coordinates of the pickup locations.
+        pickup_longitude (numpy.ndarray): The longitude coordinates of the pickup locations.
+        dropoff_latitude (numpy.ndarray): The latitude coordinates of the dropoff locations.
+        dropoff_longitude (numpy.ndarray): The longitude coordinates of the dropoff locations.
+        dtype (type, optional): Floating point type of the computation (np.float64 or np.float32).
+        out (Tuple[numpy.ndarray, numpy.ndarray], optional): 
+            Buffers of the given dtype and of the (broadcast) shape of the inputs, into which the distance 
+            and the direction are written.
+
+    Returns:
+        Tuple[numpy.ndarray, numpy.ndarray]: The haversine distances and the directions.
+
+    Raises:
+        ValueError: If the output buffers do not match the shape or the dtype of the computation.
+    """
+    pickup_latitude, pickup_longitude, dropoff_latitude, dropoff_longitude = np.broadcast_arrays(*(
+        np.asarray(coordinate, dtype=dtype) 
+        for coordinate in (pickup_latitude, pickup_longitude, dropoff_latitude, dropoff_longitude)
+    ))
+    if out is None:
+        distance = np.empty(pickup_latitude.shape, dtype=dtype)
+        direction = np.empty(pickup_latitude.shape, dtype=dtype)
+    else:
+        distance, direction = out
+        for buffer in out:
+            if buffer.shape != pickup_latitude.shape or buffer.dtype != np.dtype(dtype):
+                raise ValueError(
+                    f"Output buffers must have shape {pickup_latitude.shape} and dtype {np.dtype(dtype)}."
+                )
+    # ufuncs return scalars (and not arrays that can be written into) for 0-d inputs
+    is_scalar = pickup_latitude.ndim == 0
+    if is_scalar:
+        pickup_latitude, pickup_longitude, dropoff_latitude, dropoff_longitude, distance, direction = (
+            array.reshape(1) for array in (
+                pickup_latitude, pickup_longitude, dropoff_latitude, dropoff_longitude, distance, direction
+            )
+        )
+
+    # terms shared by the distance and the direction
+    AVG_EARTH_RADIUS = 6371  # in km
+    pickup_lat_rad = np.radians(pickup_latitude)
+    dropoff_lat_rad = np.radians(dropoff_latitude)
+    lng_delta_rad = np.radians(dropoff_longitude)
+    lng_delta_rad -= np.radians(pickup_longitude)
+    cos_pickup_lat = np.cos(pickup_lat_rad)
+    cos_dropoff_lat = np.cos(dropoff_lat_rad)
+    temp = np.empty_like(pickup_lat_rad)
+
+    # haversine distance (same operations, in the same order, as in calculate_haversine_distance)
+    np.subtract(dropoff_lat_rad, pickup_lat_rad, out=distance)
+    distance *= 0.5
+    np.sin(distance, out=distance)
+    np.square(distance, out=distance)
+    np.multiply(lng_delta_rad, 0.5, out=temp)
+    np.sin(temp, out=temp)
+    np.square(temp, out=temp)
+    temp *= cos_pickup_lat * cos_dropoff_lat
+    distance += temp
+    np.sqrt(distance, out=distance)
+    np.arcsin(distance, out=distance)
+    distance *= 2 * AVG_EARTH_RADIUS
+
+    # direction (same operations, in the same order, as in calculate_direction)
+    np.sin(lng_delta_rad, out=direction)
+    direction *= cos_dropoff_lat # y coordinate
+    np.sin(dropoff_lat_rad, out=temp)
+    temp *= cos_pickup_lat
+    np.sin(pickup_lat_rad, out=pickup_lat_rad)
+    pickup_lat_rad *= cos_dropoff_lat
+    pickup_lat_rad *= np.cos(lng_delta_rad, out=lng_delta_rad)
+    temp -= pickup_lat_rad # x coordinate
+    np.arctan2(direction, temp, out=direction)
+    np.degrees(direction, out=direction)
+    direction += 360
+    np.remainder(direction, 360, out=direction)
+
+    if is_scalar:
+        return (distance[0], direction[0]) if out is None else out
+    return distance, direction
@@ -2,14 +2,48 @@ import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 from config import config
+import numpy as np
 from pathlib import Path
 import pandas as pd
-from src.features import engineered_features 
-from src.utils import data_utils, hopsworks_utils
+from src.features import engineered_features, feature_plan
+from src.utils import data_utils, hopsworks_utils, instrumentation
 import hsfs
+import json
+import tempfile
+from typing import Tuple
 
 
+# inputs smaller than this are not worth the process pool overhead and are engineered serially
+MIN_ROWS_PER_SHARD = 50000
+
+# high-water mark of the rows already written to the feature store (incremental mode)
+WATERMARK_FILE = Path(config.DATA_DIR, "feature_pipeline_watermark.json")
+
+
+def _engineered_frame(
+    ids: pd.Series,
+    matrix: np.ndarray
+) -> pd.DataFrame:
+    """
+    Returns the engineered feature matrix (see feature_plan.ENGINEERED_FEATURE_PLAN) with the names 
+    and dtypes of the 'engineered' feature group, and the 'id' primary key as first column.
+
+    Args:
+        ids (pd.Series): The 'id' column of the raw data (primary key), whose index is kept.
+        matrix (np.ndarray): The engineered features, computed by feature_plan.ENGINEERED_FEATURE_PLAN.
+
+    Returns:
+        pd.DataFrame: The engineered feature matrix.
+    """
+    df_engineered = feature_plan.ENGINEERED_FEATURE_PLAN.to_frame(matrix, typed=True, index=ids.index)
+    df_engineered.insert(0, 'id', ids)
+    return df_engineered
+
+
+@instrumentation.timed("engineer_features")
 def engineer_features(
     df: pd.DataFrame
 ) -> pd.DataFrame:
@@ -32,67 +66,120 @@ def engineer_features(
         # convert to datetime object
         df['pickup_datetime'] = pd.to_datetime(df.pickup_datetime)
 
-        # separate datetime object into separate columns
-        month_df = engineered_features.extract_month(df.pickup_datetime)
-        week_df = engineered_features.extract_week(df.pickup_datetime)
-        weekday_df = engineered_features.extract_weekday(df.pickup_datetime)
-        hour_df = engineered_features.extract_hour(df.pickup_datetime)
-        minute_df = engineered_features.extract_minute(df.pickup_datetime)
-        minute_of_the_day_df = engineered_features.extract_minute_of_the_day(df.pickup_datetime)
-
-        # get haversine distance as the new feature
-        haversine_distance_df = pd.DataFrame(engineered_features.calculate_haversine_distance(
-            df['pickup_latitude'].values,
-            df['pickup_longitude'].values, 
-            df['dropoff_latitude'].values,
-            df['dropoff_longitude'].values),
-            columns=['haversine_distance_df']
-        )
+        # compute all the features in a single pass into one matrix (compiled feature plan): datetime 
+        # object separated into separate columns, along with the holiday feature (sundays, as the 
+        # model was trained, from the process-wide holiday index), the feature whereby a value of 1 has been assigne to the hours 
+        # between 2:00am and 7:00am and a value of 0 has been assigned to all other hours, and the 
+        # haversine distance and direction
+        matrix = feature_plan.ENGINEERED_FEATURE_PLAN.compute(df)
 
-        # get direction as the new feature
-        direction_df = pd.DataFrame(engineered_features.calculate_direction(
-            df['pickup_latitude'].values,
-            df['pickup_longitude'].values, 
-            df['dropoff_latitude'].values,
-            df['dropoff_longitude'].values),
-            columns=['direction_df']
-        )
+        # name the features and add the id for primary key
+        df_concatenated = _engineered_frame(df['id'], matrix)
+        return df_concatenated
+    except Exception as e:
+        raise Exception("Error during feature engineering: " + str(e))
+    
 
-        #  get public holiday and Sunday as new feature
-        public_holidays = engineered_features.get_us_federal_holiday_calender(
-            min(df.pickup_datetime), 
-            max(df.pickup_datetime)
-        )
-        holiday_df = pd.DataFrame(
-            engineered_features.get_holidays(df.pickup_datetime, public_holidays),
-            columns=['holiday_df']
-        )
+def _engineer_features_shard(
+    buffer_dir: str,
+    start: int,
+    stop: int
+) -> None:
+    """
+    Worker of engineer_features_parallel: engineers the rows [start, stop) of the inputs memory-mapped 
+    from buffer_dir, and writes the results into the output buffers at the same rows.
 
-        # create feature whereby a value of 1 has been assigne to the hours between 2:00am and 7:00am
-        # and a value of 0 has been assigned to all other hours.
-        hour_before7_after7_df = pd.DataFrame(
-            engineered_features.get_hour_before7_after7(df.pickup_datetime),
-            columns=['hour_before7_after7_df']
-        )
+    Args:
+        buffer_dir (str): Directory holding the memory-mapped input and output buffers.
+        start (int): First row of the shard.
+        stop (int): Row after the last row of the shard.
 
-        # concatenate the generated features into one dataframe
-        df_concatenated = data_utils.concat_dataframes(
-            df['id'], # id for primary key
-            minute_df, 
-            minute_of_the_day_df, 
-            hour_df, 
-            hour_before7_after7_df, 
-            weekday_df, 
-            week_df, 
-            month_df, 
-            holiday_df,
-            haversine_distance_df, 
-            direction_df 
-        )
-        return df_concatenated
+    Returns:
+        None
+    """
+    pickup_datetime = np.load(os.path.join(buffer_dir, "pickup_datetime.npy"), mmap_mode="r")
+    coordinates = np.load(os.path.join(buffer_dir, "coordinates.npy"), mmap_mode="r")
+    features_out = np.load(os.path.join(buffer_dir, "features.npy"), mmap_mode="r+")
+
+    # coordinates are stored as pickup latitude/longitude, dropoff latitude/longitude
+    data = dict(zip(['pickup_latitude', 'pickup_longitude', 'dropoff_latitude', 'dropoff_longitude'], coordinates[:, start:stop]))
+    data['pickup_datetime'] = pd.Series(pickup_datetime[start:stop].view("datetime64[ns]"))
+    # the rows of the shard are a contiguous block of the output matrix
+    feature_plan.ENGINEERED_FEATURE_PLAN.compute(data, out=features_out[start:stop])
+    features_out.flush()
+
+
+@instrumentation.timed("engineer_features_parallel")
+def engineer_features_parallel(
+    df: pd.DataFrame,
+    n_workers: int = None
+) -> pd.DataFrame:
+    """
+    Same as engineer_features, but the rows are split into contiguous shards that are engineered on 
+    a pool of processes. Shards are not pickled: the inputs and outputs are exchanged through 
+    memory-mapped buffers (in shared memory, /dev/shm, where available), and the results are 
+    reassembled in the original row (and hence 'id') order.
+
+    Parameters:
+        df (pd.DataFrame): A pandas.DataFrame object that contains raw taxi ride data.
+        n_workers (int, optional): Number of worker processes. Defaults to the number of CPUs.
+
+    Returns:
+        pd.DataFrame: A pandas.DataFrame object that contains engineered features derived from the raw data.
+
+    Raises:
+        TypeError: If df is not a pandas.DataFrame object.
+        ValueError: If n_workers is not a positive integer.
+    """
+    if not isinstance(df, pd.DataFrame):
+        raise TypeError("df must be a pandas.DataFrame object.")
+    n_workers = os.cpu_count() if n_workers is None else n_workers
+    if n_workers < 1:
+        raise ValueError("n_workers must be a positive integer.")
+    n_shards = min(n_workers, len(df) // MIN_ROWS_PER_SHARD)
+    if n_shards <= 1:
+        return engineer_features(df)
+
+    try:
+        # convert to datetime object
+        df['pickup_datetime'] = pd.to_datetime(df.pickup_datetime)
+
+        shm_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+        with tempfile.TemporaryDirectory(dir=shm_dir) as buffer_dir:
+            # write inputs to memory-mapped buffers
+            pickup_datetime = np.lib.format.open_memmap(
+                os.path.join(buffer_dir, "pickup_datetime.npy"), mode="w+", dtype=np.int64, shape=(len(df),)
+            )
+            pickup_datetime[:] = engineered_features.to_epoch_ns(df.pickup_datetime)[0]
+            coordinates = np.lib.format.open_memmap(
+                os.path.join(buffer_dir, "coordinates.npy"), mode="w+", dtype=np.float64, shape=(4, len(df))
+            )
+            for i, column in enumerate(['pickup_latitude', 'pickup_longitude', 'dropoff_latitude', 'dropoff_longitude']):
+                coordinates[i] = df[column].values
+            features_out = np.lib.format.open_memmap(
+                os.path.join(buffer_dir, "features.npy"), mode="w+", dtype=np.float64,
+                shape=(len(df), len(feature_plan.ENGINEERED_FEATURE_PLAN.columns))
+            )
+            for buffer in (pickup_datetime, coordinates):
+                buffer.flush()
+
+            # engineer the shards (contiguous row ranges) in parallel
+            bounds = np.linspace(0, len(df), n_shards + 1).astype(int)
+            with ProcessPoolExecutor(max_workers=n_workers) as executor:
+                futures = [
+                    executor.submit(_engineer_features_shard, buffer_dir, int(start), int(stop))
+                    for start, stop in zip(bounds[:-1], bounds[1:])
+                ]
+                for future in futures:
+                    future.result()
+
+            # name the features (the typed columns are copied out of the buffer before it is removed)
+            df_engineered = _engineered_frame(df['id'], features_out)
+            del pickup_datetime, coordinates, features_out
+        return df_engineered
     except Exception as e:
         raise Exception("Error during feature engineering: " + str(e))
-    
+
 
 def update_to_feature_store(
     feature_store: hsfs.feature_store.FeatureStore, 
@@ -119,6 +206,11 @@ def update_to_feature_store(
      # validate feature group name is alpha-numeric
     if not feature_group_name.isalnum():
         raise ValueError("Feature group name should contain only alphanumeric characters.")
+    # 'processed' data has pickup_datetime as event time, which is always written as a datetime object
+    # (also when inserting into an existing feature group, e.g. for the later chunks in streaming mode)
+    if feature_group_name=="processed":
+        # convert to datetime object
+        df['pickup_datetime'] = pd.to_datetime(df.pickup_datetime)
     try:
         # Check if feature group exists
         feature_group = feature_store.get_feature_group(feature_group_name, version=1)
@@ -127,8 +219,6 @@ def update_to_feature_store(
         try:
             # add event time only in feature group with 'processed' data and not in engineered data
             if feature_group_name=="processed":
-                # convert to datetime object
-                df['pickup_datetime'] = pd.to_datetime(df.pickup_datetime)
                 event_time = "pickup_datetime"
             else:
                 event_time = None 
@@ -145,23 +235,147 @@ def update_to_feature_store(
             raise Exception(f"Error creating feature group {feature_group_name}: {e}")
     try:
         # insert features into feature group
-        feature_group.insert(
-            features=df, 
-            write_options={"wait_for_job" : True}
-        )
+        with instrumentation.timer("feature_group_insert", {"feature_group": feature_group_name}):
+            feature_group.insert(
+                features=df, 
+                write_options={"wait_for_job" : True}
+            )
+        instrumentation.increment("feature_group_insert_rows_total", len(df), {"feature_group": feature_group_name})
     except Exception as e:
         raise Exception(f"Error inserting features into feature group {feature_group_name}: {e}")
 
 
 
+def read_watermark(
+    path: Path = WATERMARK_FILE
+) -> dict:
+    """
+    Reads the high-water mark of the incremental feature pipeline: the latest pickup_datetime 
+    (event time) written to the feature store, and the ids of the rows written with that event time.
+
+    Args:
+        path (Path): The path to the watermark file.
+
+    Returns:
+        dict: Watermark with keys 'event_time' (pd.Timestamp) and 'ids' (list), or None if no 
+        rows have been written yet.
+    """
+    try:
+        with open(path) as f:
+            watermark = json.load(f)
+    except FileNotFoundError:
+        return None
+    return {"event_time": pd.Timestamp(watermark["event_time"]), "ids": watermark["ids"]}
+
+
+def write_watermark(
+    watermark: dict,
+    path: Path = WATERMARK_FILE
+) -> None:
+    """
+    Persists the high-water mark of the incremental feature pipeline (atomically, so that an 
+    interrupted run leaves the previous watermark in place).
+
+    Args:
+        watermark (dict): Watermark with keys 'event_time' (pd.Timestamp) and 'ids' (list).
+        path (Path): The path to the watermark file.
+
+    Returns:
+        None
+    """
+    temp_path = Path(str(path) + ".tmp")
+    with open(temp_path, "w") as f:
+        json.dump({
+            "event_time": watermark["event_time"].strftime('%Y-%m-%d %H:%M:%S.%f'), 
+            "ids": list(watermark["ids"])
+        }, f)
+    os.replace(temp_path, path)
+
+
+def select_rows(
+    df: pd.DataFrame,
+    watermark: dict = None,
+    backfill: Tuple[str, str] = None
+) -> pd.Series:
+    """
+    Selects the rows to write to the feature store in incremental mode: either the rows after the 
+    watermark (later event time, or same event time and an id that was not written yet), or the 
+    rows of a backfill time range.
+
+    Args:
+        df (pd.DataFrame): Processed data, with 'id' and a datetime 'pickup_datetime' column.
+        watermark (dict, optional): Current watermark (see read_watermark). If None, all rows are new.
+        backfill (Tuple[str, str], optional): 
+            Start and end (inclusive) of the pickup_datetime range to select instead of the rows 
+            after the watermark.
+
+    Returns:
+        pd.Series: Boolean mask of the selected rows.
+    """
+    if backfill is not None:
+        start, end = pd.Timestamp(backfill[0]), pd.Timestamp(backfill[1])
+        return (df.pickup_datetime >= start) & (df.pickup_datetime <= end)
+    if watermark is None:
+        return pd.Series(True, index=df.index)
+    return (df.pickup_datetime > watermark["event_time"]) | (
+        (df.pickup_datetime == watermark["event_time"]) & ~df.id.isin(watermark["ids"])
+    )
+
+
+def advance_watermark(
+    watermark: dict,
+    df: pd.DataFrame
+) -> dict:
+    """
+    Returns the watermark moved past the rows of df (which have been written to the feature store).
+
+    Args:
+        watermark (dict): Current watermark (see read_watermark), or None.
+        df (pd.DataFrame): Written processed data, with 'id' and a datetime 'pickup_datetime' column.
+
+    Returns:
+        dict: The new watermark.
+    """
+    if df.empty:
+        return watermark
+    event_time = df.pickup_datetime.max()
+    ids = df.id[df.pickup_datetime == event_time].tolist()
+    if watermark is None or event_time > watermark["event_time"]:
+        return {"event_time": event_time, "ids": ids}
+    if event_time == watermark["event_time"]:
+        return {"event_time": event_time, "ids": list(watermark["ids"]) + ids}
+    return watermark
+
+
 def run(
-    project: str
+    project: str,
+    chunksize: int = None,
+    n_workers: int = 1,
+    incremental: bool = False,
+    backfill: Tuple[str, str] = None
 ) -> None: 
     """
     Login to the Hopsworks project and write processed and engineered dataframes to the Feature Store.
 
+    With chunksize, the processed dataset is streamed: it is read in chunks of rows, and the processed 
+    and engineered rows of each chunk are written to the Feature Store before the next chunk is read, 
+    so that memory usage does not grow with the size of the dataset. The written features are the same 
+    in both modes (the holiday feature comes from the process-wide holiday index and does not depend 
+    on the rows in a chunk).
+
+    In incremental mode, only the rows after a persisted high-water mark (see read_watermark) are 
+    engineered and upserted, and the watermark is advanced once they are written, so that a scheduled 
+    run costs time proportional to the new data. A backfill time range selects the rows to (re)write 
+    instead, and leaves the watermark unchanged.
+
     Args:
         project (str): The name of the Hopsworks project.
+        chunksize (int, optional): Number of rows per chunk. If None, the whole dataset is read at once.
+        n_workers (int, optional): 
+            Number of processes used to engineer features (see engineer_features_parallel). Defaults to 1.
+        incremental (bool, optional): Whether to write only the rows after the watermark. Defaults to False.
+        backfill (Tuple[str, str], optional): 
+            Start and end (inclusive, "%Y-%m-%d %H:%M:%S") of the pickup_datetime range to write.
 
     Returns:
         None
@@ -171,37 +385,85 @@ def run(
     """
     try:
        # login to hopsworks pass the project as arguement
-        project = hopsworks_utils.login_to_hopsworks(project=project)
-        # connect to feature store
-        fs = project.get_feature_store()
+        # connect to feature store (logs in once per process, backend of config.FEATURE_STORE_BACKEND)
+        fs = hopsworks_utils.get_connection(project).get_feature_store()
     except Exception as e:
         raise Exception(f"Error connecting to Feature Store in project {project}: {e}")
     
-    # read in your data from csv file
-    df_processed = data_utils.read_data(Path(config.DATA_DIR, "processed.csv"))
-    # call the engineer_features function on your DataFrame
-    df_engineered = engineer_features(df_processed.copy())
-
-    # write to feature store -> processed
-    fg_name = "processed"
-    fg_description= "Processed (raw) dataset after EDA and required processing."
-    update_to_feature_store(
-        feature_store=fs, 
-        feature_group_name=fg_name, 
-        df=df_processed, 
-        feature_group_description=fg_description
-    )
-    
-    # write to feature store -> engineered
-    fg_name="engineered"
-    fg_description="Engineered features (dataset) from the processed dataset."
-    update_to_feature_store(
-        feature_store=fs, 
-        feature_group_name=fg_name, 
-        df=df_engineered, 
-        feature_group_description=fg_description
-    )
+    # read in your data from csv file (either at once, or as a stream of chunks)
+    path = Path(config.DATA_DIR, "processed.csv")
+    if chunksize is None:
+        # read through the binary columnar cache of the file (built on the first run)
+        chunks = [data_utils.read_data(path, parse_dates=['pickup_datetime'], use_cache=True)]
+    else:
+        chunks = data_utils.read_data_in_chunks(path, chunksize=chunksize)
+
+    watermark = read_watermark() if incremental else None
+    new_watermark = watermark
+    for df_processed in chunks:
+        if incremental or backfill is not None:
+            # keep only the rows after the watermark (or in the backfill range), as a copy since
+            # the chunk is written (and possibly modified) below
+            df_processed['pickup_datetime'] = pd.to_datetime(df_processed.pickup_datetime)
+            df_processed = df_processed[select_rows(df_processed, watermark, backfill)].copy()
+            if df_processed.empty:
+                continue
+
+        # call the engineer_features function on your DataFrame
+        if n_workers == 1:
+            df_engineered = engineer_features(df_processed.copy())
+        else:
+            df_engineered = engineer_features_parallel(df_processed.copy(), n_workers=n_workers)
+
+        # write to feature store -> processed
+        fg_name = "processed"
+        fg_description= "Processed (raw) dataset after EDA and required processing."
+        update_to_feature_store(
+            feature_store=fs, 
+            feature_group_name=fg_name, 
+            df=df_processed, 
+            feature_group_description=fg_description
+        )
+        
+        # write to feature store -> engineered
+        fg_name="engineered"
+        fg_description="Engineered features (dataset) from the processed dataset."
+        update_to_feature_store(
+            feature_store=fs, 
+            feature_group_name=fg_name, 
+            df=df_engineered, 
+            feature_group_description=fg_description
+        )
+
+        if incremental and backfill is None:
+            new_watermark = advance_watermark(new_watermark, df_processed)
+
+        # release the chunk before the next one is read
+        del df_processed, df_engineered
 
+    # persist the watermark once all the new rows are written
+    if new_watermark is not watermark:
+        write_watermark(new_watermark)
 
-# run the file
-run(project="nyc_taxi_trip_duration")
\ No newline at end of file
+
+if __name__ == "__main__":
+    # parse command-line arguments to get the (optional) chunk size
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--chunksize', type=int, default=None, help='Number of rows per chunk (streaming mode)')
+    parser.add_argument('--workers', type=int, default=1, help='Number of processes used for feature engineering')
+    parser.add_argument('--incremental', action='store_true', help='Write only the rows after the watermark')
+    parser.add_argument('--backfill-start', default=None, help='Start of the pickup_datetime range to backfill')
+    parser.add_argument('--backfill-end', default=None, help='End of the pickup_datetime range to backfill')
+    args = parser.parse_args()
+    if (args.backfill_start is None) != (args.backfill_end is None):
+        parser.error("--backfill-start and --backfill-end must be given together")
+    backfill = (args.backfill_start, args.backfill_end) if args.backfill_start is not None else None
+
+    # run the file
+    run(
+        project="nyc_taxi_trip_duration", 
+        chunksize=args.chunksize, 
+        n_workers=args.workers, 
+        incremental=args.incremental,
+        backfill=backfill
+    )
@@ -0,0 +1,201 @@
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from config import config
+from functools import lru_cache
+import json
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from src.features import engineered_features
+from typing import List, Mapping, Tuple
+
+
+# source features a plan can compute: calendar features of pickup_datetime, trip geometry,
+# and raw inputs that are passed through
+DATETIME_SOURCES = engineered_features.DATETIME_FEATURES
+GEOMETRY_SOURCES = ["haversine_distance", "direction"]
+INPUT_SOURCES = [
+    "vendor_id", "passenger_count", "pickup_latitude", "pickup_longitude",
+    "dropoff_latitude", "dropoff_longitude"
+]
+
+# model schema names that differ from the feature names (feature names in hopsworks are lower case
+# and can not start with a digit): schema name -> (feature name, source feature)
+MODEL_SCHEMA_ALIASES = {
+    "2AMto7AM_7AMto2AM": ("h2amto7am_7amto2am", "hour_before7_after7"),
+}
+
+# (column name, source feature, dtype) of the 'engineered' feature group, in feature group order
+ENGINEERED_COLUMNS = [
+    ("minute", "minute", "int64"),
+    ("minute_of_the_day", "minute_of_the_day", "int64"),
+    ("hour", "hour", "int64"),
+    ("hour_before7_after7_df", "hour_before7_after7", "int64"),
+    ("weekday", "weekday", "int64"),
+    ("week", "week", "int64"),
+    ("month", "month", "int64"),
+    ("holiday_df", "holiday", "int64"),
+    ("haversine_distance_df", "haversine_distance", "float64"),
+    ("direction_df", "direction", "float64"),
+]
+
+
+class FeaturePlan(object):
+    """
+    A declarative list of output columns, compiled once into the index arrays needed to write every
+    feature straight into one preallocated C-contiguous float64 matrix (no intermediate DataFrames
+    and no concatenation).
+
+    Attributes
+    ----------
+    columns : list
+        Names of the output columns, in matrix order.
+    sources : list
+        Source feature of every output column.
+    dtypes : list
+        dtype of every output column in the typed DataFrame (see to_frame).
+
+    Methods
+    -------
+    compute(data, out=None):
+        Computes the feature matrix of the rows in data.
+    to_frame(matrix, typed=False, index=None):
+        Returns the feature matrix as a DataFrame.
+    """
+    def __init__(
+        self,
+        columns: List[Tuple[str, str, str]]
+    ):
+        """ Compile the plan from (column name, source feature, dtype) triples """
+        self.columns = [name for name, _, _ in columns]
+        self.sources = [source for _, source, _ in columns]
+        self.dtypes = [np.dtype(dtype) for _, _, dtype in columns]
+        unknown = set(self.sources) - set(DATETIME_SOURCES) - set(GEOMETRY_SOURCES) - set(INPUT_SOURCES)
+        if unknown:
+            raise ValueError(f"Unknown source features: {sorted(unknown)}")
+
+        # (matrix column, position in the source) for every group of sources
+        self._datetime = [
+            (j, DATETIME_SOURCES.index(source)) for j, source in enumerate(self.sources) if source in DATETIME_SOURCES
+        ]
+        self._geometry = {source: j for j, source in enumerate(self.sources) if source in GEOMETRY_SOURCES}
+        self._inputs = [(j, source) for j, source in enumerate(self.sources) if source in INPUT_SOURCES]
+        self.required_inputs = sorted(
+            {source for _, source in self._inputs}
+            | (set(INPUT_SOURCES[2:]) if self._geometry else set())
+            | ({"pickup_datetime"} if self._datetime else set())
+        )
+
+    def compute(
+        self,
+        data: Mapping,
+        out: np.ndarray = None
+    ) -> np.ndarray:
+        """
+        Computes the features of the rows in data.
+
+        Args:
+            data (Mapping):
+                DataFrame or dictionary of equally long arrays with the required inputs
+                (required_inputs): 'pickup_datetime' as datetime values, and the raw features.
+            out (numpy.ndarray, optional):
+                C-contiguous float64 array of shape (number of rows, number of columns) to write into.
+
+        Returns:
+            numpy.ndarray: The C-contiguous float64 feature matrix, with the columns in plan order.
+
+        Raises:
+            ValueError: If out does not have the right shape, dtype or layout.
+        """
+        n_rows = len(data[self.required_inputs[0]]) if self.required_inputs else 0
+        shape = (n_rows, len(self.columns))
+        if out is None:
+            out = np.empty(shape, dtype=np.float64)
+        elif out.shape != shape or out.dtype != np.float64 or not out.flags.c_contiguous:
+            raise ValueError(f"out must be a C-contiguous float64 array of shape {shape}.")
+
+        if self._datetime:
+            datetime = data["pickup_datetime"]
+            if not isinstance(datetime, pd.Series):
+                datetime = pd.Series(datetime)
+            calendar = engineered_features.extract_datetime_features(datetime).to_numpy()
+            for j, k in self._datetime:
+                out[:, j] = calendar[:, k]
+
+        if self._geometry:
+            # write straight into the matrix columns (or a scratch row if only one of the two is needed)
+            scratch = np.empty(n_rows, dtype=np.float64)
+            engineered_features.calculate_distance_and_direction(
+                data["pickup_latitude"],
+                data["pickup_longitude"],
+                data["dropoff_latitude"],
+                data["dropoff_longitude"],
+                out=tuple(
+                    out[:, self._geometry[source]] if source in self._geometry else scratch
+                    for source in GEOMETRY_SOURCES
+                )
+            )
+
+        for j, source in self._inputs:
+            out[:, j] = data[source]
+        return out
+
+    def to_frame(
+        self,
+        matrix: np.ndarray,
+        typed: bool = False,
+        index: pd.Index = None
+    ) -> pd.DataFrame:
+        """
+        Returns a feature matrix computed by this plan as a DataFrame with the plan's column names.
+
+        Args:
+            matrix (numpy.ndarray): Feature matrix returned by compute.
+            typed (bool, optional):
+                If False, the DataFrame is a float64 view of the matrix (no copy). If True, every column
+                is cast to the dtype of the plan (integer columns with missing values stay float64),
+                as needed to write the features to the feature store.
+            index (pd.Index, optional): Index of the DataFrame. Defaults to a RangeIndex.
+
+        Returns:
+            pd.DataFrame: The features.
+        """
+        if not typed:
+            return pd.DataFrame(matrix, columns=self.columns, index=index, copy=False)
+        data = {}
+        for j, (name, dtype) in enumerate(zip(self.columns, self.dtypes)):
+            values = matrix[:, j]
+            if dtype.kind in "iu" and np.isnan(values).any():
+                dtype = np.dtype(np.float64)
+            data[name] = values.astype(dtype)
+        return pd.DataFrame(data, index=index)
+
+
+@lru_cache(maxsize=None)
+def get_model_feature_plan(
+    schema_path: str = str(Path(config.MODEL_DIR, "1", "model_schema.json"))
+) -> FeaturePlan:
+    """
+    Returns the plan of the model's input features, compiled once (per schema file) from the
+    input schema of the model: same column order, integer dtypes for the categorical columns.
+
+    Args:
+        schema_path (str): Path to the model_schema.json file of the model.
+
+    Returns:
+        FeaturePlan: The compiled plan.
+    """
+    with open(schema_path) as f:
+        schema = json.load(f)
+    columns = []
+    for column in schema["input_schema"]["columnar_schema"]:
+        name, source = MODEL_SCHEMA_ALIASES.get(column["name"], (column["name"], column["name"]))
+        dtype = "int64" if column["type"] == "category" else column["type"]
+        columns.append((name, source, dtype))
+    return FeaturePlan(columns)
+
+
+# plan of the 'engineered' feature group (without its 'id' primary key)
+ENGINEERED_FEATURE_PLAN = FeaturePlan(ENGINEERED_COLUMNS)
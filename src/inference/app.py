@@ -3,11 +3,12 @@ import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 
 from config import config
+import copy
 import folium
 import json
 from pathlib import Path
 import pandas as pd
-from src.utils import app_utils, hopsworks_utils
+from src.utils import app_utils, hopsworks_utils, instrumentation, monitoring_utils, prediction_sink, quantile_sketch
 import streamlit as st
 from streamlit_folium import st_folium
 import time
@@ -31,6 +32,33 @@ st.markdown("<h1 style='text-align: center; color: black;'>🚖PREDICTION🚖</h
 st.write(36 * "-")
 
 
+# default pickup and dropoff coordinates of a new session (read once per process)
+@st.cache_data
+def load_default_coordinates():
+    with open(Path(config.CONFIG_DIR, "temp_coordinates.json")) as f:
+        return json.load(f)
+
+
+# warm the process-wide model cache from the local copy of the model (if there is one), so that the
+# first prediction does not wait for the model to load (once per process, not on every rerun; without 
+# a verified local copy, e.g. on a fresh deployment, the first prediction downloads the model)
+@st.cache_resource
+def warm_model_cache():
+    if not app_utils.has_local_model(version=1):
+        print("No verified local copy of the model yet, it is downloaded on the first prediction")
+        return False
+    try:
+        app_utils.get_model(project=None, model_name="final_xgboost", version=1)
+        return True
+    except Exception as err:
+        print(err)
+        instrumentation.increment("app_errors_total", labels={"app": "inference", "error": type(err).__name__})
+        return False
+
+
+warm_model_cache()
+
+
 # get inputs from user
 with st.form(key="user_inputs"):
     # get vendor-id 
@@ -52,7 +80,7 @@ with st.form(key="user_inputs"):
     # get pickup and dropoff locations
     print_fancy_header_center('3️⃣ Enter the Pickup and Dropoff Coordinates using the Map:')
     st.write("Wait for the map to load then follow the steps given below:\n1. Click on the desired pickup point to select.\n2. Click the 'Submit' button.\n3. Repeat these steps again to select the destination point.")
-    st.write("(By default last predicted coordinates will be loaded. Green coloured values are latest updates.)")
+    st.write("(By default last selected coordinates will be loaded. Green coloured values are latest updates.)")
     
     my_map = folium.Map(location=[41, -73.5], zoom_start=8)
     my_map.add_child(folium.LatLngPopup())
@@ -62,9 +90,12 @@ with st.form(key="user_inputs"):
     folium.TileLayer('cartodbpositron').add_to(my_map)
     folium.TileLayer('cartodbdark_matter').add_to(my_map)
     folium.LayerControl().add_to(my_map)
-    temp_coordinates_file = Path(config.CONFIG_DIR, "temp_coordinates.json") # loading coordinates
-    with open(temp_coordinates_file) as f:
-        coordinates = json.load(f)
+    # the clicked coordinates are kept in the state of the session (isolated from the other sessions)
+    if "coordinates" not in st.session_state:
+        st.session_state["coordinates"] = copy.deepcopy(load_default_coordinates())
+    coordinates = st.session_state["coordinates"]
+    pickup_latitude, pickup_longitude = coordinates["c1"]["lat"], coordinates["c1"]["long"]
+    dropoff_latitude, dropoff_longitude = coordinates["c2"]["lat"], coordinates["c2"]["long"]
     res_map = st_folium(my_map, height=300, width=600)
 
     try:
@@ -99,11 +130,9 @@ with st.form(key="user_inputs"):
             else:
                 st.write(f"Latitude: {dropoff_latitude}")
                 st.write(f"Longitude: {dropoff_longitude}")
-        with open(temp_coordinates_file, "w") as f: # updating coordinates
-            json.dump(coordinates, f)
     except Exception as err:
         print(err)
-        pass
+        instrumentation.increment("app_errors_total", labels={"app": "inference", "error": type(err).__name__})
 
     submit_button = st.form_submit_button(label='Update Coordinates', use_container_width=True)
     
@@ -122,14 +151,24 @@ with st.form(key="user_inputs"):
             dropoff_longitude,
             pickup_datetime
         )
-        df_predictor.to_csv(Path(config.CONFIG_DIR, "selected_features.txt"), sep='\t', index=False)
+        st.session_state["df_predictor"] = df_predictor # features of the session
 
 
 try:  
     # feature engineering steps
     print_fancy_header_center('\n🔧 Feature Engineering')
-    # load DataFrame from text file
-    df_loaded = pd.read_csv(Path(config.CONFIG_DIR, "selected_features.txt"), sep='\t')
+    # features of the session (of the default inputs until the coordinates are submitted)
+    if "df_predictor" not in st.session_state:
+        st.session_state["df_predictor"] = app_utils.process_input(
+            vendor_id,
+            passenger_count,
+            pickup_latitude, 
+            pickup_longitude, 
+            dropoff_latitude, 
+            dropoff_longitude,
+            pickup_datetime
+        )
+    df_loaded = st.session_state["df_predictor"]
     st.dataframe(df_loaded) # print all obtained features df
     
     # prediction steps
@@ -137,18 +176,18 @@ try:
     if st.button('📡 PRESS TO PREDICT', use_container_width=True):
         st.write("<p style='text-align: center;'>(wait a little)</p>", unsafe_allow_html=True)
 
-        # load DataFrame from text file
-        df_loaded = pd.read_csv(Path(config.CONFIG_DIR, "selected_features.txt"), sep='\t')
-        
         # login to hopsworks pass the project as arguement
-        project = hopsworks_utils.login_to_hopsworks(project="nyc_taxi_trip_duration", api_key=st.secrets["HOPSWORKS_API_KEY"])
+        # (the process-wide connection logs in on first use, and is shared by every rerun and session)
+        connection = hopsworks_utils.get_connection("nyc_taxi_trip_duration", api_key=st.secrets["HOPSWORKS_API_KEY"])
+        project = connection.get_project()
         # get model
         st.write("<p style='text-align: center;'>(getting model)</p>", unsafe_allow_html=True)
         model = app_utils.get_model(project=project, model_name="final_xgboost", version=1)
         st.write("<p style='text-align: center;'>(model received)</p>", unsafe_allow_html=True)
         
         # make predictions
-        prediction = model.predict(df_loaded) # in seconds
+        with instrumentation.timer("predict"):
+            prediction = model.predict(df_loaded) # in seconds
         minutes = int(prediction // 60) # convert seconds to minutes
         remaining_seconds = int(prediction % 60 // 1) # remaining seconds with no fractional part
         st.markdown("<h3 style='text-align: center;'>Prediction: [{}]minutes[{}]seconds</h3>".format(minutes, remaining_seconds), unsafe_allow_html=True)
@@ -159,21 +198,17 @@ try:
         #update the data to hopsworks feature store
         print_fancy_header_center('\n📡 Saving this Data to a Feature Store')
 
-        # connect to feature store
-        st.write("<p style='text-align: center;'>(connecting to hopsworks)</p>", unsafe_allow_html=True)
-        try:
-            feature_store = project.get_feature_store() 
-        except Exception as e:
-            raise Exception(f"Error connecting to Feature Store at Hopsworks {project}: {e}")
-
-        # get feature group
-        st.write("<p style='text-align: center;'>(inserting to feature store)</p>", unsafe_allow_html=True)
-        feature_group_name = "predictions"
-        prediction_feature_group = feature_store.get_or_create_feature_group(
-            name=feature_group_name, 
-            version=1,
-            primary_key=['pickup_datetime']
-        )
+        # get the (process-wide) write-behind sink of the predictions feature group: rows are spooled
+        # to a local file, and inserted in batches in the background
+        def get_prediction_feature_group():
+            # get feature group (through the cached connection to feature store)
+            feature_group_name = "predictions"
+            return connection.get_or_create_feature_group(
+                name=feature_group_name, 
+                version=1,
+                primary_key=['pickup_datetime']
+            )
+        sink = prediction_sink.get_prediction_sink(get_prediction_feature_group, producer="app")
        
         # create DataFrame from a pickup_datetime
         df_pickup_datetime = pd.DataFrame.from_dict({
@@ -183,12 +218,23 @@ try:
         # concat dataframes
         df_updated = pd.concat([df_pickup_datetime, df_loaded, df_prediction], axis=1)
         
-        # insert to feature group
-        st.write("<p style='text-align: center;'>(wait a little more)</p>", unsafe_allow_html=True)
-        prediction_feature_group.insert(df_updated)
+        # spool for the feature group (inserted in the background)
+        sink.append(df_updated)
+
+        # update the sketches of the monitored features (drift monitoring without scanning the predictions)
+        try:
+            # shared through the project, for the monitoring (see quantile_sketch.SketchStore)
+            sketch_store = quantile_sketch.SketchStore(dataset_api=connection.get_dataset_api())
+            sketch_store.update(df_updated, producer="app", features=monitoring_utils.DRIFT_FEATURES)
+        except Exception as e:
+            print(f"Error updating the sketches of the prediction: {e}")
         st.balloons()
-        st.write("<p style='text-align: center;'>(successfully inserted to feature store)</p>", unsafe_allow_html=True)
+        st.write("<p style='text-align: center;'>(saved, inserted to feature store in the background)</p>", unsafe_allow_html=True)
         st.write("<p style='text-align: center;'>(refresh the app to start again)</p>", unsafe_allow_html=True)
 except Exception as err:
     print(err)
-    pass
\ No newline at end of file
+    instrumentation.increment("app_errors_total", labels={"app": "inference", "error": type(err).__name__})
+
+# export the metrics of the process (every rerun), if enabled
+if instrumentation.is_enabled():
+    instrumentation.export("app")
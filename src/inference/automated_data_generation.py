@@ -14,140 +14,176 @@ import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 
 import argparse
-import pandas as pd
-import random
-from src.utils import app_utils, hopsworks_utils
+from collections import OrderedDict
+from contextlib import contextmanager
+import importlib
+import json
+from src.utils import instrumentation
 import time
-from typing import Tuple
+from typing import Iterator
 
 
-def generate_random_coordinates(
-    min_lat: float, 
-    max_lat: float, 
-    min_lon: float, 
-    max_lon: float
-) -> Tuple[float, float]:
-    """
-    Generates random latitude and longitude coordinates within specified bounds.
-
-    Args:
-        min_lat (float): The minimum latitude value for the region.
-        max_lat (float): The maximum latitude value for the region.
-        min_lon (float): The minimum longitude value for the region.
-        max_lon (float): The maximum longitude value for the region.
+# the heavy modules (pandas, the feature engineering, the feature store client) are imported by run,
+# after the arguments are parsed, and timed as the 'imports' phase of the startup profile
+LAZY_IMPORTS = (
+    "pandas", "src.inference.trip_generator", "src.utils.app_utils", "src.utils.hopsworks_utils", 
+    "src.utils.monitoring_utils", "src.utils.quantile_sketch"
+)
 
-    Returns:
-        tuple: A tuple containing the randomly generated latitude and longitude coordinates.
-    """
-    latitude = random.uniform(min_lat, max_lat)
-    longitude = random.uniform(min_lon, max_lon)
-    return latitude, longitude
+# the job runs every 15 minutes: the pickup times of a run are spread over the last 15 minutes
+PICKUP_WINDOW_SECONDS = 15 * 60
 
 
-def generate_trip_data() -> Tuple[int, int, float, float, float, float, float]:
+class StartupProfile(object):
     """
-    Generates random taxi trip data.
-
-    Args:
-        None
-
-    Returns:
-        Tuple[int, int, float, float, float, float, float]: A tuple containing vendor_id, passenger_count,
-        pickup_latitude, pickup_longitude, dropoff_latitude, dropoff_longitude, and pickup_datetime.
+    Wall time of the phases of a run (imports, login, model load, features, predict, insert, sketch).
+
+    Attributes
+    ----------
+    phases : OrderedDict
+        Seconds spent in every phase, in the order the phases ran (sub-phases are named 'phase: detail').
+
+    Methods
+    -------
+    phase(name):
+        Context manager timing a phase.
+    report():
+        Returns the profile as a dictionary.
+    format():
+        Returns the profile as a table.
     """
-    # generate 'vendor_id' with more weightage given to 'vendor_id=2'
-    # higher weightage is as per the observations from EDA that 'vendor_id=2' has most number of records
-    vendor_id = random.randint(1, 2)
-
-    # generate 'passenger_count' with equal probability
-    passenger_count = random.randint(1, 6)
-
-    # generate current timestamp for 'pickup_datetime'
-    pickup_datetime = time.time()
-
-    # generate random pickup locations
-    pickup_latitude, pickup_longitude = generate_random_coordinates(
-        min_lat=40.5, 
-        max_lat=41.0, 
-        min_lon=-74.25, 
-        max_lon=-73.50
-    )
-
-    # generate random dropoff locations
-    dropoff_latitude, dropoff_longitude = generate_random_coordinates(
-        min_lat=40.5, 
-        max_lat=41.2, 
-        min_lon=-74.5, 
-        max_lon=-73.0
-    )
-
-    return (
-        vendor_id, passenger_count, pickup_latitude,
-        pickup_longitude, dropoff_latitude, dropoff_longitude,
-        pickup_datetime
-    )
+    def __init__(self):
+        """ Start the clock """
+        self.phases = OrderedDict()
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def phase(
+        self,
+        name: str
+    ) -> Iterator[None]:
+        """ Times a phase (the time of a phase run more than once is summed) """
+        self.phases.setdefault(name, 0.0) # phases are listed in the order they start
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def report(self) -> dict:
+        """
+        Returns the profile.
+
+        Returns:
+            dict: Milliseconds of every phase ('phases'), and of the whole run ('total_ms').
+        """
+        return {
+            "phases": OrderedDict((name, 1000 * seconds) for name, seconds in self.phases.items()),
+            "total_ms": 1000 * (time.perf_counter() - self._start),
+        }
+
+    def format(self) -> str:
+        """
+        Returns the profile as a table of milliseconds and share of the whole run per phase.
+
+        Returns:
+            str: The table.
+        """
+        report = self.report()
+        total = report["total_ms"]
+        lines = [f"{'phase':<40}{'ms':>10}{'%':>8}"]
+        for name, ms in report["phases"].items():
+            lines.append(f"{name:<40}{ms:>10.1f}{100 * ms / total:>8.1f}")
+        lines.append(f"{'total':<40}{total:>10.1f}{100.0:>8.1f}")
+        return "\n".join(lines)
+
 
 def run(
-    project: str
+    project: str,
+    api_key: str = None,
+    n_trips: int = 1,
+    seed: int = None,
+    profile: StartupProfile = None
 ) -> None: 
     """
-    Generates random taxi trip data and inserts it into the feature store.
+    Generates random taxi trip data (see trip_generator.generate_trips, with pickup times in the last
+    PICKUP_WINDOW_SECONDS), predicts their durations in one batch, inserts them into the feature store, and
+    updates the sketches of the monitored features.
+
+    The model is loaded from its verified local copy when there is one, without logging in (the login
+    is only needed to download the model, and to insert into the feature store).
 
     Args:
         project (str): The name of the project.
+        api_key (str, optional): Hopsworks API key.
+        n_trips (int, optional): Number of trips. Defaults to 1.
+        seed (int, optional): Seed of the trip generator (None for a random seed).
+        profile (StartupProfile, optional): Profile recording the wall time of every phase.
 
     Returns:
         None.
     """
-    # get random taxi trip data
-    vendor_id, passenger_count, pickup_latitude, \
-    pickup_longitude, dropoff_latitude, dropoff_longitude, \
-    pickup_datetime = generate_trip_data()
+    profile = profile or StartupProfile()
+
+    # import the heavy modules
+    modules = {}
+    with profile.phase("imports"):
+        for name in LAZY_IMPORTS:
+            with profile.phase(f"imports: {name}"):
+                modules[name] = importlib.import_module(name)
+    pd = modules["pandas"]
+    trip_generator = modules["src.inference.trip_generator"]
+    app_utils = modules["src.utils.app_utils"]
+    hopsworks_utils = modules["src.utils.hopsworks_utils"]
+    monitoring_utils = modules["src.utils.monitoring_utils"]
+    quantile_sketch = modules["src.utils.quantile_sketch"]
 
+    # get random taxi trip data
+    with profile.phase("generate"):
+        end_time = time.time()
+        trips = trip_generator.generate_trips(
+            n_trips, 
+            seed=seed, 
+            start_time=end_time - PICKUP_WINDOW_SECONDS, 
+            end_time=end_time
+        )
+
+    # connection to hopsworks pass the project and api key as arguements (logs in on first use)
+    connection = hopsworks_utils.get_connection(project, api_key=api_key)
+
+    # get model: from the verified local copy (no login), or else from the model registry
+    try:
+        with profile.phase("model load"):
+            model = app_utils.get_model(project=None, model_name="final_xgboost", version=1)
+    except ValueError:
+        with profile.phase("login"):
+            project = connection.get_project()
+        with profile.phase("model load"):
+            model = app_utils.get_model(project=project, model_name="final_xgboost", version=1)
 
     # get all features engineered
-    df_predictor = app_utils.process_input(
-        vendor_id,
-        passenger_count,
-        pickup_latitude, 
-        pickup_longitude, 
-        dropoff_latitude, 
-        dropoff_longitude,
-        pickup_datetime
-    )
-
-    # parse command-line arguments to get hopsworks api key
-    parser = argparse.ArgumentParser()
-    parser.add_argument('--api-key', help='Hopsworks API key')
-    args = parser.parse_args()
-    # login to hopsworks pass the project and api key as arguements
-    project = hopsworks_utils.login_to_hopsworks(project="nyc_taxi_trip_duration",  api_key=args.api_key)
-    
-    # get model
-    model = app_utils.get_model(project=project, model_name="final_xgboost", version=1)
+    with profile.phase("features"):
+        df_predictor = app_utils.process_input_batch(trips)
         
-    # make predictions
-    prediction = model.predict(df_predictor) # in seconds
+    # make predictions (of all the trips in one batch)
+    with profile.phase("predict"):
+        with instrumentation.timer("predict"):
+            prediction = model.predict(df_predictor) # in seconds
     df_prediction = pd.DataFrame.from_dict({ # create DataFrame from a prediction
         'prediction': prediction
     })
 
-    # connect to feature store
-    try:
-        feature_store = project.get_feature_store() 
-    except Exception as e:
-        raise Exception(f"Error connecting to Feature Store at Hopsworks {project}: {e}")
-
-    # get feature group
-    feature_group_name = "predictions"
-    prediction_feature_group = feature_store.get_feature_group(
-        name=feature_group_name, 
-        version=1
-    )
+    # connect to feature store, and get feature group
+    with profile.phase("login"):
+        feature_group_name = "predictions"
+        prediction_feature_group = connection.get_feature_group(
+            name=feature_group_name, 
+            version=1
+        )
        
     # create DataFrame from a pickup_datetime
     df_pickup_datetime = pd.DataFrame.from_dict({
-        'pickup_datetime': [pd.to_datetime(pickup_datetime, unit='s').strftime('%Y-%m-%d %H:%M:%S')]
+        'pickup_datetime': pd.to_datetime(trips['pickup_datetime'], unit='s').dt.strftime('%Y-%m-%d %H:%M:%S')
     })
           
     # concat dataframes
@@ -161,9 +197,41 @@ def run(
         'holiday': 'int64'
     })
 
-    # insert to feature group
-    prediction_feature_group.insert(df_updated)
+    # insert to feature group, synchronously: the job runs once on a fresh runner, so nothing spooled 
+    # locally would survive to be retried (a failed insert fails the run, and the next run carries on)
+    with profile.phase("insert"):
+        prediction_feature_group.insert(df_updated)
 
+    # update the sketches of the monitored features, per day of pickup, shared through the project (the 
+    # runner is fresh on every run, so the sketches of a day are downloaded before they are updated, see 
+    # quantile_sketch.SketchStore)
+    with profile.phase("sketch"):
+        sketch_store = quantile_sketch.SketchStore(dataset_api=connection.get_dataset_api())
+        sketch_store.update(df_updated, producer="automated_data_generation", features=monitoring_utils.DRIFT_FEATURES)
 
-# run the file
-run(project="nyc_taxi_trip_duration")
\ No newline at end of file
+
+if __name__ == "__main__":
+    # parse command-line arguments (before importing anything heavy) to get hopsworks api key
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--api-key', help='Hopsworks API key')
+    parser.add_argument('--n-trips', type=int, default=1, help='Number of trips generated and inserted')
+    parser.add_argument('--seed', type=int, help='Seed of the trip generator')
+    parser.add_argument('--profile', action='store_true', help='Print the wall time of every startup phase')
+    parser.add_argument('--profile-output', help='Also write the startup profile to this JSON file')
+    parser.add_argument('--metrics', action='store_true', help='Record the metrics of the run, and export them to config.METRICS_DIR')
+    args = parser.parse_args()
+
+    # run the file
+    profile = StartupProfile()
+    if args.metrics:
+        instrumentation.enable()
+    try:
+        run(project="nyc_taxi_trip_duration", api_key=args.api_key, n_trips=args.n_trips, seed=args.seed, profile=profile)
+    finally:
+        if args.profile:
+            print(profile.format())
+        if args.profile_output:
+            with open(args.profile_output, "w") as f:
+                json.dump(profile.report(), f, indent=2)
+        if instrumentation.is_enabled():
+            instrumentation.export("automated_data_generation")
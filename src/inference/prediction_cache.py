@@ -0,0 +1,259 @@
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from collections import OrderedDict
+import math
+from src.features import engineered_features
+import threading
+import time
+from typing import Any, Callable, Hashable, Optional
+
+
+class PredictionCache(object):
+    """
+    Cache of trip duration predictions, in front of the feature engineering and the model.
+
+    Trips are keyed on a quantized feature tuple: pickup and dropoff coordinates snapped to a grid of
+    grid_degrees, the minute of the day in buckets of minute_bucket minutes, the weekday, the holiday
+    flag, the vendor and the passenger count. Trips with the same key share a prediction, so coarser
+    precision trades accuracy for hit rate. The cache holds at most max_size predictions (least
+    recently used evicted first), each for at most ttl_seconds, and is cleared when the model version
+    changes. It is thread-safe.
+
+    Attributes
+    ----------
+    max_size : int
+        Maximum number of cached predictions.
+    ttl_seconds : float
+        Time to live of a prediction (None for no expiry).
+    grid_degrees : float
+        Grid size of the coordinates, in degrees (0.001 degree is about 100 m; None for exact coordinates).
+    minute_bucket : int
+        Size of the minute-of-the-day buckets, in minutes.
+    model_version : Hashable
+        Version of the model whose predictions are cached.
+
+    Methods
+    -------
+    key(trip):
+        Returns the cache key of a trip.
+    get(trip):
+        Returns the cached prediction of a trip, or None.
+    put(trip, prediction):
+        Caches the prediction of a trip.
+    get_or_compute(trip, compute):
+        Returns the cached prediction of a trip, or computes and caches it.
+    set_model_version(version):
+        Sets the model version, clearing the cache if it changed.
+    stats():
+        Returns the hit rate and latency counters.
+    """
+    def __init__(
+        self,
+        max_size: int = 10000,
+        ttl_seconds: float = 3600.0,
+        grid_degrees: float = 0.001,
+        minute_bucket: int = 5,
+        model_version: Hashable = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """ Set the capacity, the expiry, the precision and the model version """
+        if max_size < 1:
+            raise ValueError("max_size must be a positive integer.")
+        if minute_bucket < 1:
+            raise ValueError("minute_bucket must be a positive integer.")
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.grid_degrees = grid_degrees
+        self.minute_bucket = minute_bucket
+        self.model_version = model_version
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {
+            "hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0,
+            "hit_seconds": 0.0, "miss_seconds": 0.0, "timed_hits": 0, "timed_misses": 0,
+        }
+
+    def _snap(
+        self,
+        coordinate: float
+    ) -> Any:
+        """ Snaps a coordinate to the grid """
+        if not self.grid_degrees:
+            return float(coordinate)
+        return int(round(coordinate / self.grid_degrees))
+
+    def key(
+        self,
+        trip: dict
+    ) -> tuple:
+        """
+        Returns the cache key of a trip.
+
+        Args:
+            trip (dict): The inputs of app_utils.process_input (pickup_datetime in seconds since the epoch).
+
+        Returns:
+            tuple: The quantized feature tuple.
+        """
+        # pickup time truncated to the second, as in app_utils.process_input
+        seconds = math.floor(trip["pickup_datetime"])
+        day, second_of_the_day = divmod(seconds, 86400)
+        start_day, holidays = engineered_features.get_holiday_index(day, day)
+        return (
+            self._snap(trip["pickup_latitude"]),
+            self._snap(trip["pickup_longitude"]),
+            self._snap(trip["dropoff_latitude"]),
+            self._snap(trip["dropoff_longitude"]),
+            second_of_the_day // 60 // self.minute_bucket,
+            (day + 3) % 7, # weekday (1970-01-01 was a thursday, monday=0)
+            int(holidays[day - start_day]),
+            int(trip["vendor_id"]),
+            int(trip["passenger_count"]),
+        )
+
+    def get(
+        self,
+        trip: dict
+    ) -> Optional[float]:
+        """
+        Returns the cached prediction of a trip.
+
+        Args:
+            trip (dict): The inputs of app_utils.process_input.
+
+        Returns:
+            float: The cached prediction, or None if the trip is not cached (or expired).
+        """
+        key = self.key(trip)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl_seconds is not None and entry[1] <= self._clock():
+                del self._entries[key]
+                self._counters["expirations"] += 1
+                entry = None
+            if entry is None:
+                self._counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counters["hits"] += 1
+            return entry[0]
+
+    def put(
+        self,
+        trip: dict,
+        prediction: float
+    ) -> None:
+        """
+        Caches the prediction of a trip (evicting the least recently used predictions beyond max_size).
+
+        Args:
+            trip (dict): The inputs of app_utils.process_input.
+            prediction (float): The prediction of the trip.
+
+        Returns:
+            None
+        """
+        key = self.key(trip)
+        expires = self._clock() + self.ttl_seconds if self.ttl_seconds is not None else None
+        with self._lock:
+            self._entries[key] = (prediction, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    def record_latency(
+        self,
+        hit: bool,
+        seconds: float
+    ) -> None:
+        """
+        Records the latency of a request answered from the cache (hit) or by the model (miss).
+
+        Args:
+            hit (bool): Whether the request was a cache hit.
+            seconds (float): Latency of the request.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            if hit:
+                self._counters["hit_seconds"] += seconds
+                self._counters["timed_hits"] += 1
+            else:
+                self._counters["miss_seconds"] += seconds
+                self._counters["timed_misses"] += 1
+
+    def get_or_compute(
+        self,
+        trip: dict,
+        compute: Callable[[dict], float]
+    ) -> float:
+        """
+        Returns the cached prediction of a trip, or computes (e.g. process_input and model.predict)
+        and caches it.
+
+        Args:
+            trip (dict): The inputs of app_utils.process_input.
+            compute (Callable): Function returning the prediction of a trip.
+
+        Returns:
+            float: The prediction.
+        """
+        start = time.perf_counter()
+        prediction = self.get(trip)
+        hit = prediction is not None
+        if not hit:
+            prediction = compute(trip)
+            self.put(trip, prediction)
+        self.record_latency(hit, time.perf_counter() - start)
+        return prediction
+
+    def set_model_version(
+        self,
+        version: Hashable
+    ) -> None:
+        """
+        Sets the version of the model whose predictions are cached, clearing the cache if it changed.
+
+        Args:
+            version (Hashable): The model version.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            if version != self.model_version:
+                if self._entries:
+                    self._counters["invalidations"] += 1
+                self._entries.clear()
+                self.model_version = version
+
+    def stats(self) -> dict:
+        """
+        Returns the counters of the cache.
+
+        Returns:
+            dict:
+                Number of cached predictions ('size'), 'hits', 'misses', 'evictions', 'expirations',
+                'invalidations', 'hit_rate', and mean latencies of hits and misses in milliseconds.
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            size = len(self._entries)
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            "size": size,
+            "hits": counters["hits"],
+            "misses": counters["misses"],
+            "evictions": counters["evictions"],
+            "expirations": counters["expirations"],
+            "invalidations": counters["invalidations"],
+            "hit_rate": counters["hits"] / lookups if lookups else 0.0,
+            "mean_hit_ms": 1000 * counters["hit_seconds"] / counters["timed_hits"] if counters["timed_hits"] else None,
+            "mean_miss_ms": 1000 * counters["miss_seconds"] / counters["timed_misses"] if counters["timed_misses"] else None,
+        }
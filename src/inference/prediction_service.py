@@ -0,0 +1,547 @@
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import argparse
+import asyncio
+import json
+from numbers import Real
+from src.inference.prediction_cache import PredictionCache
+from src.inference.predictor import Predict
+from src.inference.tree_ensemble import TreeEnsemble
+from src.utils import app_utils, hopsworks_utils, instrumentation, monitoring_utils
+from src.utils.quantile_sketch import SketchStore
+import time
+from typing import Any, Callable, List, Tuple
+
+
+# Standalone HTTP service (asyncio, standard library only) that serves trip duration predictions.
+# Concurrent requests are collected into micro-batches, whose features are engineered in one pass
+# (app_utils.process_input_batch) and scored in one model.predict call, and every request is
+# answered with its own prediction. Endpoints:
+#   POST /predict   body: one trip as JSON object with the inputs of app_utils.process_input
+#                   answer: {"prediction": <trip duration in seconds>}
+#   GET  /health    liveness, always 200
+#   GET  /ready     readiness, 200 once the model is loaded (503 before)
+#   GET  /metrics   metrics of the instrumented code in the Prometheus text format (?format=json for a 
+#                   JSON snapshot), recorded with --metrics (see instrumentation)
+# Optionally, predictions are cached on a quantized feature tuple (see prediction_cache.PredictionCache),
+# and the sketches of the monitored features are updated with every batch (see quantile_sketch.SketchStore).
+# Runs locally with no external services, e.g.:
+#   python src/inference/prediction_service.py --port 8080 --max-batch-size 64 --max-wait-ms 5 [--engine numpy]
+
+
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+                413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+# largest request body read (a trip is about 200 bytes), larger bodies are answered with a 413
+MAX_BODY_BYTES = 64 * 1024
+
+
+class LocalPredict(Predict):
+    """
+    Predict for a model that is already loaded (e.g. from the local model directory with
+    app_utils.get_model), instead of the artifact of a Hopsworks deployment.
+    """
+    def __init__(self, model: Any):
+        """ Use the given model """
+        self.model = model
+
+
+class MicroBatcher(object):
+    """
+    Collects concurrent prediction requests into micro-batches scored by one predictor call.
+
+    A batch is closed when it holds max_batch_size trips, or max_wait_ms after its first trip arrived,
+    whichever comes first. The predictor runs in a worker thread, so that requests keep being
+    accepted (into the next batch) while a batch is scored.
+
+    Attributes
+    ----------
+    predictor : Predict
+        Object whose predict(inputs) method returns the list of predictions of a feature DataFrame.
+    max_batch_size : int
+        Maximum number of trips in a batch.
+    max_wait_ms : float
+        Maximum time (milliseconds) a trip waits for the batch to fill.
+    stats : dict
+        Number of 'requests' and 'batches' scored, and the largest batch ('max_batch_size_seen').
+    sketch_store : SketchStore
+        Store of the sketches of the monitored features, updated after every batch is answered, or None.
+
+    Methods
+    -------
+    start():
+        Starts collecting batches (in the running event loop).
+    stop():
+        Stops collecting batches.
+    submit(trip):
+        Returns the prediction of one trip, once its batch has been scored.
+    """
+    def __init__(
+        self,
+        predictor: Predict,
+        max_batch_size: int = 64,
+        max_wait_ms: float = 5.0,
+        sketch_store: SketchStore = None
+    ):
+        """ Set the predictor, the batching limits and the sketch store """
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be a positive integer.")
+        if max_wait_ms < 0:
+            raise ValueError("max_wait_ms must not be negative.")
+        self.predictor = predictor
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.sketch_store = sketch_store
+        self.stats = {"requests": 0, "batches": 0, "max_batch_size_seen": 0}
+        self._queue = None
+        self._task = None
+
+    async def start(self) -> None:
+        """ Starts collecting batches in the running event loop """
+        self._queue = asyncio.Queue()
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> None:
+        """ Stops collecting batches (pending requests are cancelled) """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def submit(
+        self,
+        trip: dict
+    ) -> float:
+        """
+        Queues one trip for the next batch.
+
+        Args:
+            trip (dict): The inputs of app_utils.process_input (see app_utils.INPUT_COLUMNS).
+
+        Returns:
+            float: The predicted trip duration (in seconds).
+        """
+        future = asyncio.get_event_loop().create_future()
+        await self._queue.put((trip, future))
+        return await future
+
+    def _predict(
+        self,
+        trips: List[dict]
+    ) -> Tuple[Any, List[float]]:
+        """ Engineers the features of a batch of trips and scores them in one call (returns both) """
+        df_predictor = app_utils.process_input_batch(
+            {column: [trip[column] for trip in trips] for column in app_utils.INPUT_COLUMNS}
+        )
+        with instrumentation.timer("predict"):
+            predictions = self.predictor.predict(df_predictor)
+        return df_predictor, predictions
+
+    def _update_sketches(
+        self,
+        trips: List[dict],
+        df_predictor: Any,
+        predictions: List[float]
+    ) -> None:
+        """ Adds a scored batch to the sketches of the monitored features """
+        try:
+            self.sketch_store.update(
+                df_predictor.assign(
+                    prediction=predictions, 
+                    pickup_datetime=[trip['pickup_datetime'] for trip in trips]
+                ),
+                producer="prediction_service",
+                features=monitoring_utils.DRIFT_FEATURES
+            )
+        except Exception as e:
+            print(f"Error updating the sketches of a batch: {e}")
+
+    async def _run(self) -> None:
+        """ Collects, scores and answers batches until cancelled """
+        loop = asyncio.get_event_loop()
+        getter = None
+        try:
+            while True:
+                if getter is None:
+                    getter = asyncio.ensure_future(self._queue.get())
+                batch = [await getter]
+                getter = None
+                deadline = loop.time() + self.max_wait_ms / 1000
+                while len(batch) < self.max_batch_size:
+                    if not self._queue.empty():
+                        batch.append(self._queue.get_nowait())
+                        continue
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    # (a pending get is kept for the next batch rather than cancelled, so no trip is lost)
+                    getter = asyncio.ensure_future(self._queue.get())
+                    done, _ = await asyncio.wait({getter}, timeout=timeout)
+                    if not done:
+                        break
+                    batch.append(getter.result())
+                    getter = None
+
+                self.stats["requests"] += len(batch)
+                self.stats["batches"] += 1
+                self.stats["max_batch_size_seen"] = max(self.stats["max_batch_size_seen"], len(batch))
+                try:
+                    df_predictor, predictions = await loop.run_in_executor(None, self._predict, [trip for trip, _ in batch])
+                except Exception as e:
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                else:
+                    for (_, future), prediction in zip(batch, predictions):
+                        if not future.done():
+                            future.set_result(prediction)
+                    if self.sketch_store is not None:
+                        # after the batch is answered, off the latency of its requests
+                        loop.run_in_executor(None, self._update_sketches, [trip for trip, _ in batch], df_predictor, predictions)
+        finally:
+            if getter is not None:
+                getter.cancel()
+
+
+def parse_trip(
+    body: bytes
+) -> dict:
+    """
+    Parses and validates the JSON body of a prediction request.
+
+    Args:
+        body (bytes): The request body, a JSON object with the inputs of app_utils.process_input.
+
+    Returns:
+        dict: The trip inputs.
+
+    Raises:
+        ValueError: If the body is not a JSON object with a number for every input.
+    """
+    trip = json.loads(body.decode("utf-8"))
+    if not isinstance(trip, dict):
+        raise ValueError("The request body must be a JSON object.")
+    missing = [column for column in app_utils.INPUT_COLUMNS if column not in trip]
+    if missing:
+        raise ValueError(f"Missing inputs: {missing}")
+    for column in app_utils.INPUT_COLUMNS:
+        if isinstance(trip[column], bool) or not isinstance(trip[column], Real):
+            raise ValueError(f"Input {column} must be a number.")
+    return {column: trip[column] for column in app_utils.INPUT_COLUMNS}
+
+
+class PredictionService(object):
+    """
+    The HTTP service: routes requests to the health and readiness checks and to the micro-batcher.
+
+    Attributes
+    ----------
+    load_predictor : Callable
+        Function that loads and returns the predictor (called once, in a worker thread, at start).
+    max_batch_size : int
+        Maximum number of trips scored in one call.
+    max_wait_ms : float
+        Maximum time (milliseconds) a trip waits for its batch to fill.
+    batcher : MicroBatcher
+        The micro-batcher, once the predictor is loaded (None before: the service is not ready).
+    cache : PredictionCache
+        Cache of the predictions in front of the micro-batcher, or None.
+    sketch_store : SketchStore
+        Store of the sketches of the monitored features, updated with every batch, or None.
+
+    Methods
+    -------
+    start(host, port):
+        Starts loading the predictor and listening, and returns the asyncio server.
+    stop():
+        Stops the micro-batcher.
+    handle(method, path, body):
+        Returns the status code and JSON payload of a request.
+    """
+    def __init__(
+        self,
+        load_predictor: Callable[[], Predict],
+        max_batch_size: int = 64,
+        max_wait_ms: float = 5.0,
+        cache: PredictionCache = None,
+        sketch_store: SketchStore = None
+    ):
+        """ Set the predictor loader, the batching limits, the prediction cache and the sketch store """
+        self.load_predictor = load_predictor
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.cache = cache
+        self.sketch_store = sketch_store
+        self.batcher = None
+        self.load_error = None
+        self._loading = None
+
+    async def _load(self) -> None:
+        """ Loads the predictor (in a worker thread) and starts the micro-batcher """
+        try:
+            predictor = await asyncio.get_event_loop().run_in_executor(None, self.load_predictor)
+        except Exception as e:
+            self.load_error = str(e)
+            print(f"Error loading the model: {e}")
+            return
+        if self.cache is not None:
+            # predictions of another model version are not served from the cache
+            self.cache.set_model_version(getattr(predictor, "version", id(predictor)))
+        batcher = MicroBatcher(predictor, self.max_batch_size, self.max_wait_ms, self.sketch_store)
+        await batcher.start()
+        self.batcher = batcher
+
+    async def start(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8080
+    ) -> asyncio.AbstractServer:
+        """
+        Starts loading the predictor and listening for requests (the service answers /health at once,
+        and becomes ready once the predictor is loaded).
+
+        Args:
+            host (str): Address to listen on.
+            port (int): Port to listen on (0 for any free port).
+
+        Returns:
+            asyncio.AbstractServer: The server.
+        """
+        self._loading = asyncio.ensure_future(self._load())
+        return await asyncio.start_server(self._handle_connection, host, port)
+
+    async def stop(self) -> None:
+        """ Stops the micro-batcher """
+        if self._loading is not None:
+            await self._loading
+        if self.batcher is not None:
+            await self.batcher.stop()
+
+    async def handle(
+        self,
+        method: str,
+        path: str,
+        body: bytes
+    ) -> Tuple[int, Any]:
+        """
+        Serves one request.
+
+        Args:
+            method (str): HTTP method.
+            path (str): Request path (a query string is ignored).
+            body (bytes): Request body.
+
+        Returns:
+            Tuple[int, dict]: HTTP status code and JSON payload of the answer (text for the Prometheus metrics).
+        """
+        path, _, query = path.partition("?")
+        routes = {"/health": "GET", "/ready": "GET", "/metrics": "GET", "/predict": "POST"}
+        if path not in routes:
+            return 404, {"error": f"Unknown path {path}"}
+        if method != routes[path]:
+            return 405, {"error": f"{path} only accepts {routes[path]}"}
+
+        if path == "/health":
+            return 200, {"status": "ok"}
+        if path == "/metrics":
+            if "format=json" in query.split("&"):
+                return 200, instrumentation.snapshot()
+            return 200, instrumentation.to_prometheus()
+        if path == "/ready":
+            if self.batcher is None:
+                return 503, {"status": "loading" if self.load_error is None else "failed", "error": self.load_error}
+            payload = {"status": "ready", **self.batcher.stats}
+            if self.cache is not None:
+                payload["cache"] = self.cache.stats()
+            return 200, payload
+
+        if self.batcher is None:
+            return 503, {"error": "The model is not loaded yet."}
+        try:
+            trip = parse_trip(body)
+        except ValueError as e:
+            return 400, {"error": str(e)}
+        start = time.perf_counter()
+        if self.cache is not None:
+            prediction = self.cache.get(trip)
+            if prediction is not None:
+                self.cache.record_latency(True, time.perf_counter() - start)
+                return 200, {"prediction": prediction}
+        try:
+            prediction = await self.batcher.submit(trip)
+        except Exception as e:
+            return 500, {"error": f"Error during prediction: {e}"}
+        if self.cache is not None:
+            self.cache.put(trip, prediction)
+            self.cache.record_latency(False, time.perf_counter() - start)
+        return 200, {"prediction": prediction}
+
+    @staticmethod
+    async def _respond(
+        writer: asyncio.StreamWriter,
+        status: int,
+        payload: Any,
+        keep_alive: bool
+    ) -> None:
+        """ Writes an answer (JSON, or text for the Prometheus metrics) """
+        if isinstance(payload, str):
+            content, content_type = payload.encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            content, content_type = json.dumps(payload).encode("utf-8"), "application/json"
+        writer.write(
+            (f"HTTP/1.1 {status} {HTTP_REASONS[status]}\r\n"
+             f"Content-Type: {content_type}\r\n"
+             f"Content-Length: {len(content)}\r\n"
+             f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode("latin-1") + content
+        )
+        await writer.drain()
+
+    async def _handle_connection(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter
+    ) -> None:
+        """ Serves the HTTP/1.1 requests of one connection (kept alive unless the client closes it) """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    content_length = int(headers.get("content-length", 0))
+                except ValueError:
+                    await self._respond(writer, 400, {"error": "Invalid Content-Length"}, keep_alive=False)
+                    break
+                if not 0 <= content_length <= MAX_BODY_BYTES:
+                    # the body is not read: answer, and drop the connection
+                    await self._respond(writer, 413, {"error": f"The body is limited to {MAX_BODY_BYTES} bytes"}, keep_alive=False)
+                    break
+                body = await reader.readexactly(content_length)
+
+                try:
+                    status, payload = await self.handle(method, path, body)
+                except Exception as e:
+                    # an unexpected error is answered, and does not drop the connection
+                    print(f"Error serving {method} {path}: {e!r}")
+                    instrumentation.increment("service_errors_total", labels={"error": type(e).__name__})
+                    status, payload = 500, {"error": "Internal server error"}
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            # malformed request or client gone: drop the connection
+            pass
+        finally:
+            writer.close()
+
+
+def load_local_predictor(
+    engine: str = "xgboost"
+) -> Predict:
+    """
+    Loads the predictor of the service: the Hopsworks deployment artifact if ARTIFACT_FILES_PATH is
+    set (as in the deployment), otherwise the verified local copy of the model (see app_utils.get_model).
+
+    Args:
+        engine (str): 
+            "xgboost" to score with the model itself, or "numpy" to score with its conversion to a 
+            NumPy tree ensemble (lower latency for small batches, see tree_ensemble.TreeEnsemble).
+
+    Returns:
+        Predict: The predictor.
+    """
+    predictor = Predict() if "ARTIFACT_FILES_PATH" in os.environ else LocalPredict(
+        app_utils.get_model(project=None, model_name="final_xgboost", version=1)
+    )
+    if engine == "numpy":
+        predictor.model = TreeEnsemble.from_model(predictor.model)
+    # version of the predictions (for the prediction cache)
+    predictor.version = ("final_xgboost", 1, engine)
+    return predictor
+
+
+async def serve(
+    host: str,
+    port: int,
+    max_batch_size: int,
+    max_wait_ms: float,
+    engine: str = "xgboost",
+    cache: PredictionCache = None,
+    sketch_store: SketchStore = None
+) -> None:
+    """
+    Runs the prediction service until it is interrupted.
+
+    Args:
+        host (str): Address to listen on.
+        port (int): Port to listen on.
+        max_batch_size (int): Maximum number of trips scored in one call.
+        max_wait_ms (float): Maximum time (milliseconds) a trip waits for its batch to fill.
+        engine (str): Scoring engine of the model (see load_local_predictor).
+        cache (PredictionCache, optional): Cache of the predictions.
+        sketch_store (SketchStore, optional): Store of the sketches of the monitored features.
+
+    Returns:
+        None
+    """
+    service = PredictionService(lambda: load_local_predictor(engine), max_batch_size, max_wait_ms, cache, sketch_store)
+    server = await service.start(host, port)
+    print(f"Serving predictions on http://{host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+
+
+if __name__ == "__main__":
+    # parse command-line arguments to get the address and the batching limits
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default="127.0.0.1", help='Address to listen on')
+    parser.add_argument('--port', type=int, default=8080, help='Port to listen on')
+    parser.add_argument('--max-batch-size', type=int, default=64, help='Maximum number of trips per batch')
+    parser.add_argument('--max-wait-ms', type=float, default=5.0, help='Maximum time a trip waits for its batch to fill')
+    parser.add_argument('--engine', choices=["xgboost", "numpy"], default="xgboost", help='Scoring engine of the model')
+    parser.add_argument('--cache-size', type=int, default=0, help='Number of cached predictions (0 disables the cache)')
+    parser.add_argument('--cache-ttl', type=float, default=3600.0, help='Time to live of a cached prediction (seconds)')
+    parser.add_argument('--cache-grid', type=float, default=0.001, help='Grid size of the cached coordinates (degrees)')
+    parser.add_argument('--cache-minutes', type=int, default=5, help='Size of the cached minute-of-the-day buckets')
+    parser.add_argument('--sketches', action='store_true', help='Update the sketches of the monitored features with every batch')
+    parser.add_argument('--share-sketches', action='store_true', help='Also share the sketches through the Hopsworks project, for the monitoring')
+    parser.add_argument('--api-key', help='Hopsworks API key (to share the sketches)')
+    parser.add_argument('--metrics', action='store_true', help='Record the metrics of the instrumented code (served on /metrics)')
+    args = parser.parse_args()
+    cache = PredictionCache(
+        max_size=args.cache_size, 
+        ttl_seconds=args.cache_ttl, 
+        grid_degrees=args.cache_grid, 
+        minute_bucket=args.cache_minutes
+    ) if args.cache_size > 0 else None
+    sketch_store = None
+    if args.sketches or args.share_sketches:
+        dataset_api = None
+        if args.share_sketches:
+            dataset_api = hopsworks_utils.get_connection("nyc_taxi_trip_duration", api_key=args.api_key).get_dataset_api()
+        sketch_store = SketchStore(dataset_api=dataset_api)
+    if args.metrics:
+        instrumentation.enable()
+
+    # run the service
+    try:
+        asyncio.run(serve(args.host, args.port, args.max_batch_size, args.max_wait_ms, args.engine, cache, sketch_store))
+    except KeyboardInterrupt:
+        pass
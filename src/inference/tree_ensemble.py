@@ -0,0 +1,281 @@
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import json
+import numpy as np
+import pandas as pd
+import tempfile
+from typing import Any, Callable, List
+
+
+# Optional inference engine for the trained XGBoost model: the trees are converted once into flat
+# NumPy arrays (feature index, threshold, children, default direction, leaf value, categorical split
+# sets), and all the trees are evaluated for a batch of rows with a vectorized level-by-level
+# traversal. This avoids the per-call overhead of XGBoost (DMatrix construction, categorical
+# handling, thread dispatch), which dominates the latency of small batches.
+
+
+# objectives whose prediction is the raw margin
+IDENTITY_OBJECTIVES = {
+    "reg:squarederror", "reg:linear", "reg:squaredlogerror", "reg:pseudohubererror", "reg:absoluteerror"
+}
+
+# number of (row, tree) pairs traversed at once (bounds the memory of large batches)
+BLOCK_SIZE = 1 << 20
+
+# the category set of a split is a bit set of 32-bit words in XGBoost
+_BITS_PER_WORD = 32
+
+
+class TreeEnsemble(object):
+    """
+    A tree ensemble (gbtree booster) evaluated with NumPy.
+
+    Predictions follow XGBoost: features are compared as float32 (go left if value < threshold),
+    missing values (NaN) follow the default direction, a categorical split sends the categories of
+    its set right and every other category of its table left, and leaf values are summed in float32
+    in tree order, starting from the base score. As in XGBoost 1.6 (the version of the trained model),
+    the table of a categorical split holds the categories below its largest category rounded up to a
+    multiple of 32 (the size of its bit set), and invalid categories (negative, or beyond the table,
+    e.g. values unseen in training) follow the default direction, as missing values.
+
+    Attributes
+    ----------
+    feature_names : list
+        Names of the features (used to select the columns of a DataFrame), or None.
+    n_trees : int
+        Number of trees evaluated.
+    max_depth : int
+        Depth of the deepest tree.
+    output_transform : Callable
+        Function applied to the predictions (e.g. the inverse target transform), or None.
+
+    Methods
+    -------
+    from_json(model, output_transform=None):
+        Converts an XGBoost model in JSON format.
+    from_model(model):
+        Converts a Booster, XGBRegressor, or TransformedTargetRegressor around an XGBRegressor.
+    predict(inputs):
+        Predicts the target of a batch of rows.
+    """
+    def __init__(
+        self,
+        trees: List[dict],
+        base_score: float,
+        feature_names: List[str] = None,
+        output_transform: Callable = None
+    ):
+        """ Flatten the trees (in the format of the XGBoost JSON model) into global node arrays """
+        self.feature_names = feature_names
+        self.output_transform = output_transform
+        self.n_trees = len(trees)
+        self.base_score = np.float32(base_score)
+
+        offsets = np.cumsum([0] + [len(tree["left_children"]) for tree in trees])
+        self._roots = offsets[:-1].astype(np.intp)
+        n_nodes = int(offsets[-1])
+        self._feature = np.zeros(n_nodes, dtype=np.intp)
+        self._threshold = np.zeros(n_nodes, dtype=np.float32)
+        self._left = np.arange(n_nodes, dtype=np.intp)
+        self._right = np.arange(n_nodes, dtype=np.intp)
+        self._default_left = np.zeros(n_nodes, dtype=bool)
+        self._leaf_value = np.zeros(n_nodes, dtype=np.float32)
+        # categorical nodes: row of the node in the category table (-1 for numerical nodes)
+        self._category_row = np.full(n_nodes, -1, dtype=np.intp)
+        # number of categories in the table of every row (the size of the bit set of the split in XGBoost)
+        category_sizes = []
+        category_sets = []
+
+        self.max_depth = 0
+        for offset, tree in zip(offsets[:-1], trees):
+            left = np.asarray(tree["left_children"], dtype=np.intp)
+            right = np.asarray(tree["right_children"], dtype=np.intp)
+            conditions = np.asarray(tree["split_conditions"], dtype=np.float32)
+            nodes = slice(offset, offset + len(left))
+            is_leaf = left == -1
+            # leaves point to themselves, so that traversing past them is a no-op
+            self._left[nodes] = np.where(is_leaf, np.arange(len(left)), left) + offset
+            self._right[nodes] = np.where(is_leaf, np.arange(len(left)), right) + offset
+            self._feature[nodes] = np.where(is_leaf, 0, tree["split_indices"])
+            self._threshold[nodes] = conditions
+            self._default_left[nodes] = np.asarray(tree["default_left"], dtype=bool)
+            self._leaf_value[nodes] = np.where(is_leaf, conditions, 0)
+            for node, start, size in zip(
+                tree.get("categories_nodes", []), tree.get("categories_segments", []), tree.get("categories_sizes", [])
+            ):
+                self._category_row[offset + node] = len(category_sets)
+                categories = tree["categories"][start:start + size]
+                category_sets.append(categories)
+                # whole words of bits, up to the largest category of the set
+                category_sizes.append((max(categories) // _BITS_PER_WORD + 1) * _BITS_PER_WORD if categories else 0)
+            self.max_depth = max(self.max_depth, _tree_depth(left, right))
+
+        # children of node i at 2 * i (left) and 2 * i + 1 (right)
+        self._children = np.stack([self._left, self._right], axis=1).ravel()
+
+        # category table: is category c in the split set of the categorical node of row r
+        self._category_sizes = np.asarray(category_sizes, dtype=np.float32)
+        self._categories = np.zeros((len(category_sets), max(category_sizes, default=0)), dtype=bool)
+        for row, categories in enumerate(category_sets):
+            self._categories[row, categories] = True
+
+    @classmethod
+    def from_json(
+        cls,
+        model: dict,
+        output_transform: Callable = None
+    ) -> "TreeEnsemble":
+        """
+        Converts an XGBoost model saved in JSON format (Booster.save_model("<file>.json")).
+
+        Args:
+            model (dict): The parsed JSON model.
+            output_transform (Callable, optional): Function applied to the predictions.
+
+        Returns:
+            TreeEnsemble: The converted model.
+
+        Raises:
+            ValueError: If the booster or the objective is not supported.
+        """
+        learner = model["learner"]
+        booster = learner["gradient_booster"]
+        if booster["name"] != "gbtree":
+            raise ValueError(f"Unsupported booster {booster['name']} (only gbtree is supported).")
+        objective = learner["objective"]["name"]
+        if objective not in IDENTITY_OBJECTIVES:
+            raise ValueError(f"Unsupported objective {objective}.")
+        trees = booster["model"]["trees"]
+        # models trained with early stopping predict with the trees up to the best iteration
+        best_iteration = learner.get("attributes", {}).get("best_iteration")
+        if best_iteration is not None:
+            parallel_trees = int(booster["model"]["gbtree_model_param"].get("num_parallel_tree", 1))
+            trees = trees[:(int(best_iteration) + 1) * parallel_trees]
+        return cls(
+            trees,
+            float(learner["learner_model_param"]["base_score"]),
+            feature_names=learner.get("feature_names") or None,
+            output_transform=output_transform
+        )
+
+    @classmethod
+    def from_model(
+        cls,
+        model: Any
+    ) -> "TreeEnsemble":
+        """
+        Converts a trained model: an xgboost.Booster, an xgboost.XGBRegressor, or a
+        sklearn TransformedTargetRegressor around an XGBRegressor (whose inverse_func is then
+        applied to the predictions, e.g. np.expm1 for the final model).
+
+        Args:
+            model (Any): The trained model.
+
+        Returns:
+            TreeEnsemble: The converted model.
+        """
+        output_transform = None
+        if hasattr(model, "regressor_"):
+            output_transform = model.inverse_func
+            model = model.regressor_
+        if hasattr(model, "get_booster"):
+            model = model.get_booster()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "model.json")
+            model.save_model(path)
+            with open(path) as f:
+                return cls.from_json(json.load(f), output_transform=output_transform)
+
+    def _to_matrix(
+        self,
+        inputs: Any
+    ) -> np.ndarray:
+        """ Returns the float32 feature matrix of a DataFrame (columns in model order) or array """
+        if not isinstance(inputs, pd.DataFrame):
+            return np.ascontiguousarray(inputs, dtype=np.float32).reshape(len(inputs), -1)
+        if self.feature_names is not None:
+            inputs = inputs[self.feature_names]
+        matrix = np.empty(inputs.shape, dtype=np.float32)
+        for j, (_, column) in enumerate(inputs.items()):
+            if isinstance(column.dtype, pd.CategoricalDtype):
+                # as in XGBoost, categorical columns are encoded by their category codes
+                codes = column.cat.codes.to_numpy()
+                matrix[:, j] = np.where(codes < 0, np.nan, codes)
+            else:
+                matrix[:, j] = column.to_numpy(dtype=np.float32, na_value=np.nan)
+        return matrix
+
+    def _leaves(
+        self,
+        matrix: np.ndarray
+    ) -> np.ndarray:
+        """ Returns the leaf node reached by every row (axis 0) in every tree (axis 1) """
+        n_rows, n_features = matrix.shape
+        flat_matrix = matrix.ravel()
+        # offset of the row of every (row, tree) pair in the flat matrix
+        row_offsets = np.repeat(np.arange(n_rows, dtype=np.intp) * n_features, self.n_trees)
+        nodes = np.tile(self._roots, n_rows)
+        has_missing = bool(np.isnan(flat_matrix).any())
+        has_categorical = len(self._categories) > 0
+        for _ in range(self.max_depth):
+            values = flat_matrix[row_offsets + self._feature[nodes]]
+            go_right = values >= self._threshold[nodes]
+            if has_categorical:
+                category_row = self._category_row[nodes]
+                categorical = category_row >= 0
+                categories, category_row = values[categorical], category_row[categorical]
+                # invalid categories (negative, or beyond the table of the split) follow the default direction
+                valid = (categories >= 0) & (categories < self._category_sizes[category_row])
+                in_set = ~self._default_left[nodes[categorical]]
+                in_set[valid] = self._categories[category_row[valid], categories[valid].astype(np.intp)]
+                go_right[categorical] = in_set
+            if has_missing:
+                missing = np.isnan(values)
+                go_right[missing] = ~self._default_left[nodes[missing]]
+            nodes = self._children[2 * nodes + go_right]
+        return nodes.reshape(n_rows, self.n_trees)
+
+    def predict(
+        self,
+        inputs: Any
+    ) -> np.ndarray:
+        """
+        Predicts the target of a batch of rows.
+
+        Args:
+            inputs (pd.DataFrame or numpy.ndarray):
+                The features, as a DataFrame (with the model's feature names, if the model has any) or
+                a 2-D array with the columns in the model's feature order.
+
+        Returns:
+            numpy.ndarray: The float32 predictions, one per row.
+        """
+        matrix = self._to_matrix(inputs)
+        margins = np.empty(len(matrix), dtype=np.float32)
+        rows_per_block = max(1, BLOCK_SIZE // max(self.n_trees, 1))
+        for start in range(0, len(matrix), rows_per_block):
+            block = matrix[start:start + rows_per_block]
+            # sequential float32 sum in tree order, starting from the base score (as XGBoost)
+            values = np.empty((len(block), self.n_trees + 1), dtype=np.float32)
+            values[:, 0] = self.base_score
+            values[:, 1:] = self._leaf_value[self._leaves(block)]
+            margins[start:start + len(block)] = np.cumsum(values, axis=1, dtype=np.float32)[:, -1]
+        if self.output_transform is not None:
+            return self.output_transform(margins)
+        return margins
+
+
+def _tree_depth(
+    left: np.ndarray,
+    right: np.ndarray
+) -> int:
+    """ Returns the depth of a tree (number of splits on its longest path) """
+    depth = 0
+    level = [0]
+    while True:
+        level = [child for node in level if left[node] != -1 for child in (left[node], right[node])]
+        if not level:
+            return depth
+        depth += 1
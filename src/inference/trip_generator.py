@@ -0,0 +1,171 @@
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import argparse
+import numpy as np
+import pandas as pd
+import time
+from typing import Mapping
+
+
+# This file generates synthetic taxi trips (the inputs of app_utils.process_input_batch) in bulk, from
+# distributions derived from the EDA of the training data (see notebooks/data_analysis_and_processing.ipynb).
+# It is used by the scheduled data generation job, as a load generator, and as fixture data for
+# offline benchmarks.
+
+
+# default distributions of the trips
+DEFAULT_DISTRIBUTION = {
+    # number of training records per vendor_id and per passenger_count (EDA)
+    "vendor_weights": {1: 678278, 2: 780263},
+    "passenger_weights": {1: 1033510, 2: 210303, 3: 59893, 4: 28401, 5: 78087, 6: 48333},
+    # mixtures of hotspot Gaussians: (weight, latitude, longitude, latitude std, longitude std)
+    "pickup_hotspots": [
+        (0.40, 40.7580, -73.9855, 0.0150, 0.0120), # midtown manhattan
+        (0.20, 40.7230, -73.9980, 0.0120, 0.0100), # lower manhattan
+        (0.18, 40.7790, -73.9600, 0.0120, 0.0100), # upper east and west side
+        (0.08, 40.7740, -73.8720, 0.0030, 0.0040), # laguardia airport
+        (0.06, 40.6450, -73.7850, 0.0050, 0.0070), # jfk airport
+        (0.08, 40.6900, -73.9600, 0.0300, 0.0300), # brooklyn and queens
+    ],
+    "dropoff_hotspots": [
+        (0.35, 40.7580, -73.9855, 0.0180, 0.0150), # midtown manhattan
+        (0.20, 40.7230, -73.9980, 0.0150, 0.0120), # lower manhattan
+        (0.20, 40.7790, -73.9600, 0.0150, 0.0120), # upper east and west side
+        (0.04, 40.7740, -73.8720, 0.0030, 0.0040), # laguardia airport
+        (0.04, 40.6450, -73.7850, 0.0050, 0.0070), # jfk airport
+        (0.17, 40.7000, -73.9400, 0.0500, 0.0500), # brooklyn, queens and the bronx
+    ],
+    # (min latitude, max latitude, min longitude, max longitude) the coordinates are clipped to
+    "pickup_bounds": (40.5, 41.0, -74.25, -73.5),
+    "dropoff_bounds": (40.5, 41.2, -74.5, -73.0),
+    # relative number of pickups per hour of the day (0 to 23): low at night, peak in the evening
+    "hourly_weights": [
+        3.7, 2.7, 2.0, 1.5, 1.1, 1.0, 2.3, 3.8, 4.6, 4.6, 4.4, 4.6,
+        4.9, 4.9, 5.1, 4.9, 4.4, 5.0, 6.0, 6.2, 5.6, 5.5, 5.3, 4.5,
+    ],
+}
+
+
+def _sample_categories(
+    rng: np.random.Generator,
+    weights: Mapping[int, float],
+    n_trips: int
+) -> np.ndarray:
+    """ Samples n_trips categories with probabilities proportional to weights """
+    values = np.array(list(weights.keys()), dtype=np.int64)
+    p = np.array(list(weights.values()), dtype=np.float64)
+    return rng.choice(values, size=n_trips, p=p / p.sum())
+
+
+def _sample_coordinates(
+    rng: np.random.Generator,
+    hotspots: list,
+    bounds: tuple,
+    n_trips: int
+) -> tuple:
+    """ Samples n_trips (latitude, longitude) from a mixture of hotspot Gaussians, clipped to bounds """
+    hotspots = np.asarray(hotspots, dtype=np.float64)
+    weights = hotspots[:, 0]
+    component = rng.choice(len(hotspots), size=n_trips, p=weights / weights.sum())
+    normal = rng.standard_normal((2, n_trips))
+    latitude = hotspots[component, 1] + hotspots[component, 3] * normal[0]
+    longitude = hotspots[component, 2] + hotspots[component, 4] * normal[1]
+    min_lat, max_lat, min_lon, max_lon = bounds
+    return np.clip(latitude, min_lat, max_lat), np.clip(longitude, min_lon, max_lon)
+
+
+def _sample_times(
+    rng: np.random.Generator,
+    hourly_weights: list,
+    start_time: float,
+    end_time: float,
+    n_trips: int
+) -> np.ndarray:
+    """ Samples n_trips times in [start_time, end_time) following the time-of-day profile """
+    # every (clock) hour of the window is a bucket, weighted by its hour of the day and its overlap
+    # with the window, and the time is uniform within the bucket
+    first_hour = np.floor(start_time / 3600)
+    bucket_starts = np.maximum(np.arange(first_hour, np.ceil(end_time / 3600)) * 3600, start_time)
+    bucket_ends = np.minimum(bucket_starts - bucket_starts % 3600 + 3600, end_time)
+    hours = (bucket_starts // 3600 % 24).astype(np.int64)
+    p = np.asarray(hourly_weights, dtype=np.float64)[hours] * (bucket_ends - bucket_starts)
+    bucket = rng.choice(len(p), size=n_trips, p=p / p.sum())
+    return bucket_starts[bucket] + rng.random(n_trips) * (bucket_ends - bucket_starts)[bucket]
+
+
+def generate_trips(
+    n_trips: int,
+    seed: int = None,
+    start_time: float = None,
+    end_time: float = None,
+    distribution: Mapping = None
+) -> pd.DataFrame:
+    """
+    Generates random taxi trips, vectorized (one NumPy call per input column).
+
+    The vendor and the passenger count follow their weights, the pickup and dropoff coordinates
+    mixtures of hotspot Gaussians, and the pickup time the time-of-day profile of hourly_weights
+    (on the clock the features are computed on, i.e. UTC) within [start_time, end_time). The same
+    seed generates the same trips.
+
+    Args:
+        n_trips (int): Number of trips.
+        seed (int, optional): Seed of the random generator (None for a random seed).
+        start_time (float, optional):
+            First pickup time, in seconds since the epoch. Defaults to one day before end_time.
+        end_time (float, optional):
+            End of the pickup times, in seconds since the epoch. Defaults to now.
+        distribution (Mapping, optional):
+            Distributions overriding those of DEFAULT_DISTRIBUTION (same keys).
+
+    Returns:
+        pd.DataFrame: The trips, with the columns of app_utils.INPUT_COLUMNS.
+
+    Raises:
+        ValueError: If the time window is empty.
+    """
+    distribution = dict(DEFAULT_DISTRIBUTION, **(distribution or {}))
+    end_time = time.time() if end_time is None else float(end_time)
+    start_time = end_time - 86400 if start_time is None else float(start_time)
+    if end_time <= start_time:
+        raise ValueError("end_time must be after start_time.")
+
+    rng = np.random.default_rng(seed)
+    vendor_id = _sample_categories(rng, distribution["vendor_weights"], n_trips)
+    passenger_count = _sample_categories(rng, distribution["passenger_weights"], n_trips)
+    pickup_latitude, pickup_longitude = _sample_coordinates(
+        rng, distribution["pickup_hotspots"], distribution["pickup_bounds"], n_trips
+    )
+    dropoff_latitude, dropoff_longitude = _sample_coordinates(
+        rng, distribution["dropoff_hotspots"], distribution["dropoff_bounds"], n_trips
+    )
+    pickup_datetime = _sample_times(rng, distribution["hourly_weights"], start_time, end_time, n_trips)
+    return pd.DataFrame({
+        'vendor_id': vendor_id,
+        'passenger_count': passenger_count,
+        'pickup_latitude': pickup_latitude,
+        'pickup_longitude': pickup_longitude,
+        'dropoff_latitude': dropoff_latitude,
+        'dropoff_longitude': dropoff_longitude,
+        'pickup_datetime': pickup_datetime,
+    })
+
+
+if __name__ == "__main__":
+    # parse command-line arguments to get the number of trips and the time window
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n-trips', type=int, default=1000000, help='Number of trips')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the random generator')
+    parser.add_argument('--start', help='First pickup time ("%%Y-%%m-%%d %%H:%%M:%%S", UTC)')
+    parser.add_argument('--end', help='End of the pickup times ("%%Y-%%m-%%d %%H:%%M:%%S", UTC)')
+    parser.add_argument('--output', required=True, help='CSV file to write the trips to')
+    args = parser.parse_args()
+    to_seconds = lambda value: None if value is None else pd.Timestamp(value).value / 1e9
+
+    # generate and write the trips
+    start = time.perf_counter()
+    trips = generate_trips(args.n_trips, seed=args.seed, start_time=to_seconds(args.start), end_time=to_seconds(args.end))
+    print(f"Generated {len(trips)} trips in {time.perf_counter() - start:.2f}s")
+    trips.to_csv(args.output, index=False)
@@ -2,16 +2,14 @@ import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 
-from alibi_detect.cd import TabularDrift
-import pandas as pd
 import streamlit as st
-from src.utils import hopsworks_utils, monitoring_utils
+from src.utils import hopsworks_utils, instrumentation, monitoring_utils, quantile_sketch
 
 #This file is a script that performs drift detection on the NYC Taxi Trip Duration prediction model. 
 #It uses the streamlit library to display the results in a web application. Specifically, 
 #the script calculates the Target Drift and Feature-wise Drift by comparing the distributions of two 
-#sets of observations. The two-sample Kolmogorov-Smirnov test is used to detect any drift in these 
-#variables.
+#sets of observations. The two-sample Kolmogorov-Smirnov test is used to detect any drift in the 
+#continuous variables, and the chi-square test in the categorical variables.
 
 
 # function to make header fancy across the app (center aligned)
@@ -20,83 +18,109 @@ def print_fancy_header_center(text, font_size=24, color="#ff5f27"):
     st.markdown(res, unsafe_allow_html=True)
 
 
+# sketches of the predictions: downloaded from the project at most every 10 minutes (see quantile_sketch.SketchStore.sync)
+@st.cache_data(ttl=600)
+def sync_sketches(_sketch_store):
+    return _sketch_store.sync()
+
+
+# reference window in compact form: read once per process (from the local cache of monitoring_utils)
+@st.cache_resource
+def load_reference(_feature_store, feature_view_name, feature_view_version, training_dataset_version, features):
+    return monitoring_utils.get_reference(
+        _feature_store, 
+        feature_view_name, 
+        feature_view_version, 
+        training_dataset_version,
+        features=list(features)
+    )
+
+
 # display title
 st.markdown("<h1 style='text-align: center; color: black;'>NYC Taxi Trip Duration</h1>", unsafe_allow_html=True)
 st.markdown("<h1 style='text-align: center; color: black;'>🚖MONITORING🚖</h1>", unsafe_allow_html=True)
 st.write(36 * "-")
 
-st.write("We calculate Target Drift and Feature-wise Drift and use the two-sample Kolmogorov-Smirnov test (at P-value: 0.05) to detect any drift in these variables by comparing the distributions of two sets of observations - reference and test window.", unsafe_allow_html=True)
+st.write("We calculate Target Drift and Feature-wise Drift over all the model features, and use the two-sample Kolmogorov-Smirnov test for the continuous features and the chi-square test for the categorical features (at P-value: 0.05, after the Benjamini-Hochberg correction for the number of tests) to detect any drift in these variables by comparing the distributions of two sets of observations - reference and test window.", unsafe_allow_html=True)
+st.write("The test window is summarized by mergeable quantile sketches of the predictions and their features, updated by every producer of predictions and shared through the project, so the tests are approximate and the predictions are never scanned.", unsafe_allow_html=True)
 st.write("Due to the limited number of predictions made so far, the detected drifts may not be entirely reliable, and there may also be discrepancies in the reference window. However, this still provides us with insights into how the system is currently performing (a good starting point).", unsafe_allow_html=True)
 
 try:  
     st.write("<p style='text-align: center;'>(connecting to feature store)</p>", unsafe_allow_html=True)
     try:
        # login to hopsworks pass the project as arguement
-        project = hopsworks_utils.login_to_hopsworks(project='nyc_taxi_trip_duration', api_key=st.secrets["HOPSWORKS_API_KEY"])
-        # connect to feature store
-        fs = project.get_feature_store()
+        project = 'nyc_taxi_trip_duration'
+        # connect to feature store (logs in once per process, reused by every page load)
+        connection = hopsworks_utils.get_connection(project, api_key=st.secrets["HOPSWORKS_API_KEY"])
+        fs = connection.get_feature_store()
     except Exception as e:
         raise Exception(f"Error connecting to Feature Store in project {project}: {e}")
 
-    # getting data
+    # getting data: the reference window (test dataframe, which is training_dataset_version=2 in feature 
+    # view) never changes, and is read from its local cache (built on the first page load), and the 
+    # test window is the merged sketches of the producers (downloaded from the project)
     st.write("<p style='text-align: center;'>(getting data)</p>", unsafe_allow_html=True)
-    st.write("<p style='text-align: center;'>(wait a little)</p>", unsafe_allow_html=True)
-    st.write("<p style='text-align: center;'>(this may take a few seconds)</p>", unsafe_allow_html=True)
-    test_df = monitoring_utils.get_df(
-        feature_store=fs,
+    reference = load_reference(
+        fs,
         feature_view_name='combined_features',
         feature_view_version=1,
-        training_dataset_version=2 # get test dataframe (which is training_dataset_version=2 in feature view)
-    )
-    st.write("<p style='text-align: center;'>(wait a little more)</p>", unsafe_allow_html=True)
-    prediction_df = monitoring_utils.get_df(
-        feature_store=fs,
-        feature_view_name='prediction',
-        feature_view_version=1,
-        training_dataset_version=1 
-    )
-
-    test_df_selected_columns, prediction_df_selected_columns, selected_features = monitoring_utils.get_specific_features(
-        test_df=test_df, 
-        prediction_df=prediction_df
+        training_dataset_version=2,
+        features=tuple(monitoring_utils.DRIFT_FEATURES)
     )
-
-    st.write("<p style='text-align: center;'>(calculating drift)</p>", unsafe_allow_html=True)
-    # define drift detector with custom categories_per_feature parameter (ref=test_df)
-    cd = TabularDrift(test_df_selected_columns, p_val=.05, categories_per_feature={})
-
-    # define dataframes for output
-    results_df_pred = pd.DataFrame(columns=['Feature', 'Drift', 'Stat Value', 'P-Value'])
-    results_df_rest = pd.DataFrame(columns=['Feature', 'Drift', 'Stat Value', 'P-Value'])
-
-    # predict drift
-    fpreds = cd.predict(prediction_df_selected_columns, drift_type='feature')
-    labels = ['No', 'Yes'] # 'is drift' label
-    for f in range(cd.n_features):
-        fname = selected_features[f]
-        is_drift = labels[fpreds['data']['is_drift'][f]]
-        stat_val = fpreds['data']['distance'][f]
-        p_val = fpreds['data']['p_val'][f]
-        if fname == 'prediction':
-            results_df_pred = results_df_pred.append({'Feature': fname, 'Drift': is_drift, 'Stat Value': stat_val, 'P-Value': p_val}, ignore_index=True)
-        else:
-            results_df_rest = results_df_rest.append({'Feature': fname, 'Drift': is_drift, 'Stat Value': stat_val, 'P-Value': p_val}, ignore_index=True)
-
-    # target drift
-    print_fancy_header_center('\n🔧 Target Drift')
-     # format the dataframe to display 20 decimal points
-    st.dataframe(results_df_pred, use_container_width=True)
-
-    # other features drift
-    print_fancy_header_center('\n🔧 Prominent Features Drift')
-    st.dataframe(results_df_rest, use_container_width=True)
-
-    st.write("NOTE: If the p-value is zero, it is not exactly zero but rather a very small value.", unsafe_allow_html=True)
+    sketch_store = quantile_sketch.SketchStore(dataset_api=connection.get_dataset_api())
+    sync_sketches(sketch_store)
+    partitions = sketch_store.partitions()
+    if partitions:
+        start, end = st.select_slider(label='Days', options=partitions, value=(partitions[0], partitions[-1]))
+        end = f"{end} 23:59:59"
+
+        st.write("<p style='text-align: center;'>(calculating drift)</p>", unsafe_allow_html=True)
+        # feature-wise tests of all the model features against the reference (ref=test_df) on the merged 
+        # sketches of the days: chi-square tests for the categorical features, two-sample KS tests for the 
+        # others, with the Benjamini-Hochberg correction
+        sketches = sketch_store.load(start=start, end=end, features=monitoring_utils.DRIFT_FEATURES)
+        results_df = monitoring_utils.sketch_drift(reference, sketches, p_val=.05, correction="bh")
+        results_df_pred = results_df[results_df['Feature'] == 'prediction'].reset_index(drop=True)
+        results_df_rest = results_df[results_df['Feature'] != 'prediction'].reset_index(drop=True)
+
+        # target drift
+        print_fancy_header_center('\n🔧 Target Drift')
+         # format the dataframe to display 20 decimal points
+        st.dataframe(results_df_pred, use_container_width=True)
+
+        # other features drift
+        print_fancy_header_center('\n🔧 Prominent Features Drift')
+        st.dataframe(results_df_rest, use_container_width=True)
+
+        st.write("NOTE: If the p-value is zero, it is not exactly zero but rather a very small value.", unsafe_allow_html=True)
+        st.write(f"NOTE: The KS statistics are within {100 * quantile_sketch.rank_error(quantile_sketch.DEFAULT_K):.2f}% of the exact statistics (99% confidence).", unsafe_allow_html=True)
+
+        # drift timeline: the same tests for every day or week of pickup_datetime (to see when drift started)
+        print_fancy_header_center('\n🔧 Drift Timeline')
+        freq = st.selectbox(label='Window', options=('day', 'week'))
+        selected_reference = {feature: reference[feature] for feature in monitoring_utils.SELECTED_FEATURES}
+        timeline_df = monitoring_utils.sketch_drift_timeline(
+            selected_reference, 
+            sketch_store.load_partitions(start=start, end=end, features=monitoring_utils.SELECTED_FEATURES), 
+            freq=freq, 
+            p_val=.05
+        )
+        st.line_chart(timeline_df.pivot(index='Window', columns='Feature', values='Stat Value'))
+        drift_start_df = timeline_df[timeline_df['Drift'] == 'Yes'].groupby('Feature', sort=False)['Window'].min()
+        st.write("First window with drift per feature:", unsafe_allow_html=True)
+        st.dataframe(drift_start_df.rename('First Drift Window').reset_index(), use_container_width=True)
+    else:
+        st.write("No predictions sketched yet.", unsafe_allow_html=True)
 
     # show balloons as success
     st.balloons()
 
 except Exception as err:
     print(err)
-    pass
+    instrumentation.increment("app_errors_total", labels={"app": "monitoring", "error": type(err).__name__})
+
+# export the metrics of the process (every rerun), if enabled
+if instrumentation.is_enabled():
+    instrumentation.export("monitoring")
+
 
@@ -138,9 +138,8 @@ def run(
     """
     try:
        # login to hopsworks pass the project as arguement
-        project = hopsworks_utils.login_to_hopsworks(project=project)
-        # connect to feature store
-        fs = project.get_feature_store()
+        # connect to feature store (logs in once per process, backend of config.FEATURE_STORE_BACKEND)
+        fs = hopsworks_utils.get_connection(project).get_feature_store()
     except Exception as e:
         raise Exception(f"Error connecting to Feature Store in project {project}: {e}")
 
@@ -9,6 +9,18 @@ from src.utils import data_utils, hopsworks_utils
 from hsfs.feature_view import FeatureView
 
 
+# feature view names of the engineered features -> names the model is trained with (see the model schema)
+TRAINING_COLUMN_NAMES = {
+    'hour_before7_after7_df': '2AMto7AM_7AMto2AM',
+    'holiday_df': 'holiday',
+    'haversine_distance_df': 'haversine_distance',
+    'direction_df': 'direction'
+}
+
+# columns of the training datasets stored as categorical (dictionary-encoded) columns, with the training names
+CATEGORICAL_COLUMNS = ['vendor_id', 'passenger_count', 'store_and_fwd_flag', '2AMto7AM_7AMto2AM', 'holiday']
+
+
 def get_training_data(
     feature_view: FeatureView, 
     training_dataset_version: int
@@ -28,13 +40,21 @@ def get_training_data(
 
 
 def run(
-    project: str
+    project: str,
+    write_csv: bool = False
 ) -> None: 
     """
     Retrieves the feature view instance from the feature store and extracts training and testing data.
+
+    The datasets are written as Parquet datasets partitioned by month of pickup_datetime, sorted by 
+    pickup_datetime, with the columns renamed as the model is trained (TRAINING_COLUMN_NAMES) and the 
+    categorical columns dictionary-encoded (data/training_datasets/train and test, see 
+    data_utils.write_partitioned_parquet), so that the training code reads only the columns and time 
+    range it needs, already typed and sorted (see data_utils.read_partitioned_parquet).
   
     Parameters:
         project (str): The name of the Hopsworks project to connect to.
+        write_csv (bool, optional): Whether to also write the flat CSV files (train.csv and test.csv). Defaults to False.
 
     Returns:
         None.
@@ -42,12 +62,12 @@ def run(
     Raises:
         Exception: If there is an error connecting to the Hopsworks feature store or 
         retrieving featureviews.
+        KeyError: If a column of CATEGORICAL_COLUMNS is not in the training data.
     """
     try:
        # login to hopsworks pass the project as arguement
-        project = hopsworks_utils.login_to_hopsworks(project=project)
-        # connect to feature store
-        fs = project.get_feature_store()
+        # connect to feature store (logs in once per process, backend of config.FEATURE_STORE_BACKEND)
+        fs = hopsworks_utils.get_connection(project).get_feature_store()
     except Exception as e:
         raise Exception(f"Error connecting to Feature Store in project {project}: {e}")
 
@@ -69,8 +89,18 @@ def run(
     # write train and test datasets to file
     if not os.path.exists(Path(config.DATA_DIR, "training_datasets")):
         os.makedirs(Path(config.DATA_DIR, "training_datasets")) # make dir if it doesn't exist
-    data_utils.write_data(train_df, Path(config.DATA_DIR, "training_datasets", "train.csv"))
-    data_utils.write_data(test_df, Path(config.DATA_DIR, "training_datasets", "test.csv"))
+    for name, df in (("train", train_df), ("test", test_df)):
+        df = df.rename(columns=TRAINING_COLUMN_NAMES)
+        # month-partitioned parquet datasets, sorted by pickup_datetime (raises if a categorical column is missing)
+        data_utils.write_partitioned_parquet(
+            df,
+            Path(config.DATA_DIR, "training_datasets", name),
+            time_column="pickup_datetime",
+            categorical_columns=CATEGORICAL_COLUMNS
+        )
+        if write_csv:
+            # along with their binary columnar caches, for fast reads with data_utils.read_data(..., use_cache=True)
+            data_utils.write_data(df, Path(config.DATA_DIR, "training_datasets", f"{name}.csv"), use_cache=True)
 
 
 # run the file
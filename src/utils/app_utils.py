@@ -3,15 +3,66 @@ import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 
 
+from collections import OrderedDict
 from config import config
-import hopsworks
-import joblib
+import hashlib
+import numpy as np
 from pathlib import Path
 import pandas as pd
 import shutil
-from src.features import engineered_features
-from src.utils import data_utils
-from typing import Any
+from src.features import feature_plan
+from src.utils import instrumentation
+import threading
+import time
+from typing import Any, Mapping, Tuple, Union
+
+
+# inputs of process_input_batch
+INPUT_COLUMNS = [
+    'vendor_id', 'passenger_count', 'pickup_latitude', 'pickup_longitude', 
+    'dropoff_latitude', 'dropoff_longitude', 'pickup_datetime'
+]
+
+
+@instrumentation.timed("process_input")
+def process_input_batch(
+    trips: Union[pd.DataFrame, Mapping]
+) -> pd.DataFrame:
+    """
+    Vectorized process_input: generates the features of many trips in one pass.
+
+    Args:
+        trips (pd.DataFrame or Mapping): 
+            DataFrame or dictionary of equally long arrays with the columns of INPUT_COLUMNS (the same 
+            inputs as process_input, pickup_datetime in seconds since the epoch).
+
+    Returns:
+        pd.DataFrame: 
+            A DataFrame containing the engineered features as columns (in the model's column order), 
+            one row per trip.
+
+    Raises:
+        KeyError: If an input column is missing.
+    """
+    missing = [column for column in INPUT_COLUMNS if column not in trips]
+    if missing:
+        raise KeyError(f"Missing input columns: {missing}")
+    data = {column: np.asarray(trips[column]) for column in INPUT_COLUMNS}
+    instrumentation.increment("process_input_rows_total", len(data['pickup_datetime']))
+
+    # pickup time truncated to the second (without a round trip through strings)
+    seconds = np.floor(np.asarray(data['pickup_datetime'], dtype=np.float64)).astype(np.int64)
+    data['pickup_datetime'] = pd.Series(seconds.astype('datetime64[s]').astype('datetime64[ns]'))
+
+    # compute the model's features in the model's column order (compiled feature plan): datetime 
+    # object separated into separate columns, haversine distance and direction, the holiday feature 
+    # (sundays, as the model was trained, from the process-wide holiday index), and the feature whereby a value of 1 has been 
+    # assigne to the hours between 2:00am and 7:00am and a value of 0 has been assigned to all other hours
+    plan = feature_plan.get_model_feature_plan()
+    matrix = plan.compute(data)
+
+    # name the features, with the dtypes of the feature store
+    return plan.to_frame(matrix, typed=True)
 
 
 def process_input(
@@ -39,82 +90,142 @@ def process_input(
     Returns:
         df_concatenated (Pandas DataFrame): A DataFrame containing the engineered features as columns.
     """
-    # create a DataFrame from the dictionary created from the inputs
-    df_input = pd.DataFrame.from_dict({
+    # a batch of one trip
+    df_concatenated = process_input_batch({
         'vendor_id': [vendor_id],
         'passenger_count': [passenger_count],
         'pickup_latitude': [pickup_latitude],
         'pickup_longitude': [pickup_longitude],
         'dropoff_latitude': [dropoff_latitude],
         'dropoff_longitude': [dropoff_longitude],
-        'pickup_datetime': [pd.to_datetime(pickup_datetime, unit='s').strftime('%Y-%m-%d %H:%M:%S')]
+        'pickup_datetime': [pickup_datetime]
     })
-
-    # separate datetime object into separate columns
-    pickup_dt_object = pd.to_datetime(df_input.pickup_datetime) # convert to datetime object
-    month = engineered_features.extract_month(pickup_dt_object)
-    week = engineered_features.extract_week(pickup_dt_object)
-    weekday = engineered_features.extract_weekday(pickup_dt_object)
-    minute_of_the_day = engineered_features.extract_minute_of_the_day(pickup_dt_object)
-
-    # get haversine distance as the new feature
-    haversine_distance = pd.DataFrame(engineered_features.calculate_haversine_distance(
-        df_input['pickup_latitude'].values,
-        df_input['pickup_longitude'].values, 
-        df_input['dropoff_latitude'].values,
-        df_input['dropoff_longitude'].values),
-        columns=['haversine_distance']
-    )
-
-    # get direction as the new feature
-    direction = pd.DataFrame(engineered_features.calculate_direction(
-        df_input['pickup_latitude'].values,
-        df_input['pickup_longitude'].values, 
-        df_input['dropoff_latitude'].values,
-        df_input['dropoff_longitude'].values),
-        columns=['direction']
-    )
-
-    #  get public holiday and Sunday as new feature
-    public_holidays = engineered_features.get_us_federal_holiday_calender(
-        min(pickup_dt_object), 
-        max(pickup_dt_object)
-    )
-    holiday = pd.DataFrame(
-        engineered_features.get_holidays(pickup_dt_object, public_holidays),
-        columns=['holiday']
-    )
-
-    # create feature whereby a value of 1 has been assigne to the hours between 2:00am and 7:00am
-    # and a value of 0 has been assigned to all other hours.
-    h2AMto7AM_7AMto2AM = pd.DataFrame(
-        engineered_features.get_hour_before7_after7(pickup_dt_object),
-        columns=['h2amto7am_7amto2am']
-    )
-
-    # concatenate the generated features into one dataframe
-    df_concatenated = data_utils.concat_dataframes(
-        h2AMto7AM_7AMto2AM,
-        direction,
-        df_input['dropoff_latitude'],
-        df_input['dropoff_longitude'],
-        haversine_distance,
-        holiday,
-        minute_of_the_day,
-        month,
-        df_input['passenger_count'],
-        df_input['pickup_latitude'],
-        df_input['pickup_longitude'],
-        df_input['vendor_id'],
-        week,
-        weekday
-    )
    
     return df_concatenated
 
 
+# file name of the trained model in the model directory
+MODEL_FILE = "final_xgb_model.bin"
+
+# number of models (name and version) kept loaded by get_model
+MODEL_CACHE_CAPACITY = 2
+
+# process-wide cache of the loaded models, keyed by (model name, version), least recently used first
+# (_model_cache_lock guards the cache and its metrics, and is never held while a model is loaded)
+_model_cache = OrderedDict()
+_model_cache_lock = threading.Lock()
+_model_cache_stats = {"hits": 0, "misses": 0, "evictions": 0, "loads": []}
+
+# lock of every (model name, version), held while the model is loaded, so that concurrent callers do 
+# not load the same model twice, without blocking the callers of the other models
+_model_load_locks = {}
+
+
+def _file_digest(
+    path: Path
+) -> str:
+    """ Returns the sha256 hex digest of a file """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _verify_local_model(
+    model_path: Path
+) -> bool:
+    """
+    Checks the local copy of a model: the file must exist, and match the checksum recorded next to it 
+    (<model file>.sha256) when it was downloaded. A copy without a recorded checksum is not trusted.
+
+    Args:
+        model_path (Path): Path to the model file.
+
+    Returns:
+        bool: Whether the local copy can be loaded without going to the model registry.
+    """
+    if not os.path.isfile(model_path) or os.path.getsize(model_path) == 0:
+        return False
+    checksum_path = Path(str(model_path) + ".sha256")
+    if not os.path.exists(checksum_path):
+        return False
+    with open(checksum_path) as f:
+        return f.read().strip() == _file_digest(model_path)
+
+
+def has_local_model(
+    version: int
+) -> bool:
+    """
+    Returns whether a verified local copy of a model version exists (see _verify_local_model), i.e. 
+    whether get_model can load it without a project.
+
+    Args:
+        version (int): The version number of the trained model.
+
+    Returns:
+        bool: Whether the local copy can be loaded without going to the model registry.
+    """
+    return _verify_local_model(Path(config.MODEL_DIR, str(version), MODEL_FILE))
+
+
+def _load_model(
+    project: "hopsworks.project", 
+    model_name: str, 
+    version: int
+) -> Tuple[Any, dict]:
+    """
+    Loads a model from its local copy, after downloading it from the Hopsworks Model Registry if 
+    there is no verified local copy.
+
+    Args:
+        project (hopsworks.project): The Hopsworks project object (only used to download the model).
+        model_name (str): The name of the trained model in the Hopsworks Model Registry.
+        version (int): The version number of the trained model.
+
+    Returns:
+        Tuple[Any, dict]: The trained model object, and the metrics of the load.
+
+    Raises:
+        ValueError: If the model has to be downloaded and no project is given.
+    """
+    model_path = Path(config.MODEL_DIR, str(version), MODEL_FILE)
+    checksum_path = Path(str(model_path) + ".sha256")
+    metrics = {"model_name": model_name, "version": version, "source": "local", "download_seconds": 0.0}
+    if not _verify_local_model(model_path):
+        if project is None:
+            raise ValueError(f"No verified local copy of model {model_name} (version {version}), and no project to download it from.")
+        start = time.perf_counter()
+        # get model registry
+        mr = project.get_model_registry()
+        # download model
+        model = mr.get_model(model_name, version)
+        model_dir = model.download()
+        if os.path.exists(model_path.parent):
+            # replace the (invalid) model file of the existing model directory
+            shutil.copyfile(Path(model_dir, MODEL_FILE), model_path)
+        else:
+            # move the downloaded model directory to the model directory
+            shutil.move(model_dir, Path(config.MODEL_DIR))
+        metrics["source"] = "registry"
+        metrics["download_seconds"] = time.perf_counter() - start
+
+    # load model (joblib is imported here, so that importing this module stays light)
+    start = time.perf_counter()
+    import joblib
+    model = joblib.load(model_path)
+    metrics["load_seconds"] = time.perf_counter() - start
+    if metrics["source"] == "registry":
+        # record the checksum of the downloaded copy, to verify it the next time
+        with open(checksum_path, "w") as f:
+            f.write(_file_digest(model_path))
+    return model, metrics
+
+
+@instrumentation.timed("get_model")
 def get_model(
-    project: hopsworks.project, 
+    project: "hopsworks.project", 
     model_name: str, 
     version: int
 ) -> Any:
@@ -123,6 +234,12 @@ def get_model(
     directory, it will be loaded from that directory. Otherwise, the model will be downloaded from 
     the Hopsworks Model Registry, and then saved to the specified directory before being loaded.
 
+    Loaded models are kept in a process-wide cache (shared by all the callers in the process, e.g. 
+    all the Streamlit sessions), keyed by (model_name, version), which holds the MODEL_CACHE_CAPACITY 
+    most recently used models. A model is loaded by one caller at a time, without blocking the callers 
+    of the other models. The registry is not contacted when a verified local copy of the model exists 
+    (see _verify_local_model), in which case project can be None.
+
     Args:
         project (hopsworks.project): The Hopsworks project object.
         model_name (str): The name of the trained model in the Hopsworks Model Registry.
@@ -131,16 +248,63 @@ def get_model(
     Returns:
         The trained model object.
     """
-    if os.path.exists(Path(config.MODEL_DIR, "1", "final_xgb_model.bin")):
-        pass
-    else:
-        # get model registry
-        mr = project.get_model_registry()
-        # download model
-        model = mr.get_model(model_name, version)
-        model_dir = model.download()
-        # move the downloaded model directory to the model directory
-        shutil.move(model_dir, Path(config.MODEL_DIR))
-    # load and return model
-    model = joblib.load(Path(config.MODEL_DIR, "1" ,"final_xgb_model.bin"))
-    return model
\ No newline at end of file
+    key = (model_name, version)
+    with _model_cache_lock:
+        if key in _model_cache:
+            return _cache_hit(key)
+        load_lock = _model_load_locks.setdefault(key, threading.Lock())
+
+    # load while holding the lock of the model only, so that concurrent callers do not load the same 
+    # model twice, and the callers of the other models are not blocked
+    with load_lock:
+        with _model_cache_lock:
+            if key in _model_cache:
+                # loaded by a concurrent caller
+                return _cache_hit(key)
+            _model_cache_stats["misses"] += 1
+        instrumentation.increment("model_cache_misses_total")
+        model, metrics = _load_model(project, model_name, version)
+        with _model_cache_lock:
+            _model_cache_stats["loads"].append(metrics)
+            _model_cache[key] = model
+            while len(_model_cache) > MODEL_CACHE_CAPACITY:
+                _model_cache.popitem(last=False)
+                _model_cache_stats["evictions"] += 1
+        return model
+
+
+def _cache_hit(
+    key: Tuple[str, int]
+) -> Any:
+    """ Returns a cached model, as the most recently used (with _model_cache_lock held) """
+    _model_cache_stats["hits"] += 1
+    instrumentation.increment("model_cache_hits_total")
+    _model_cache.move_to_end(key)
+    return _model_cache[key]
+
+
+def get_model_cache_info() -> dict:
+    """
+    Returns the metrics of the model cache of get_model.
+
+    Returns:
+        dict: 
+            Number of cache 'hits', 'misses' and 'evictions', the 'resident' (model name, version) 
+            keys from least to most recently used, and the metrics of every model 'loads' (model 
+            name, version, source, download and load times in seconds).
+    """
+    with _model_cache_lock:
+        return {
+            "hits": _model_cache_stats["hits"],
+            "misses": _model_cache_stats["misses"],
+            "evictions": _model_cache_stats["evictions"],
+            "resident": list(_model_cache),
+            "loads": [dict(metrics) for metrics in _model_cache_stats["loads"]],
+        }
+
+
+def clear_model_cache() -> None:
+    """ Removes all the models from the model cache of get_model, and resets its metrics """
+    with _model_cache_lock:
+        _model_cache.clear()
+        _model_cache_stats.update({"hits": 0, "misses": 0, "evictions": 0, "loads": []})
@@ -1,14 +1,204 @@
+import json
+import numpy as np
+import os
 import pandas as pd
+from pathlib import Path
+import shutil
+import tempfile
+from typing import Dict, Iterator, List
 
 
-def read_data(
+# version of the on-disk layout of the binary columnar cache (see read_data)
+CACHE_FORMAT_VERSION = 1
+
+# version of the on-disk layout of the month-partitioned Parquet datasets (see write_partitioned_parquet)
+PARQUET_FORMAT_VERSION = 1
+
+# name of the metadata file of a month-partitioned Parquet dataset
+PARQUET_METADATA_FILE = "_dataset.json"
+
+
+def _cache_dir(
+    path: str
+) -> Path:
+    """
+    Returns the directory of the binary columnar cache of a CSV file (next to the file).
+    """
+    return Path(str(path) + ".cache")
+
+
+def _source_signature(
+    path: str
+) -> dict:
+    """
+    Returns the size and modification time of a file, used to detect changes of a cached CSV file.
+    """
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _write_json(
+    data: dict,
+    path: Path
+) -> None:
+    """
+    Writes a dictionary to a JSON file atomically (readers see either the old or the new file).
+    """
+    temp_path = Path(str(path) + ".tmp")
+    with open(temp_path, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(temp_path, path)
+
+
+def _read_cache_schema(
+    path: str
+) -> dict:
+    """
+    Returns the schema of the binary columnar cache of a CSV file, or None if there is no cache 
+    or if the CSV file changed since the cache was built.
+    """
+    schema_path = Path(_cache_dir(path), "schema.json")
+    try:
+        with open(schema_path) as f:
+            schema = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    if schema.get("version") != CACHE_FORMAT_VERSION or schema.get("source") != _source_signature(path):
+        return None
+    return schema
+
+
+def _write_cache(
+    df: pd.DataFrame,
     path: str
+) -> dict:
+    """
+    Writes the columns of df (the contents of the CSV file at path, as read by pd.read_csv) to the 
+    binary columnar cache of that file: one .npy file per column, and a schema.json sidecar with the 
+    column names and dtypes and the signature of the CSV file. Numeric and boolean columns are stored 
+    as they are, and string columns as fixed-width unicode arrays. The cache is built in a temporary 
+    directory, which then replaces the previous cache.
+
+    Returns:
+        dict: The schema of the cache, or None if df has columns that can not be cached 
+        (e.g. strings with missing values), in which case no cache is written.
+    """
+    columns, arrays = [], []
+    for i, name in enumerate(df.columns):
+        values = df[name].to_numpy()
+        if values.dtype == object:
+            if pd.api.types.infer_dtype(values, skipna=False) != "string":
+                return None
+            values = values.astype(str)
+        elif values.dtype.kind not in "biuf":
+            return None
+        columns.append({"name": name, "file": f"col_{i}.npy", "dtype": values.dtype.str})
+        arrays.append(values)
+
+    # written to a temporary directory first, which then replaces the cache
+    cache_dir = _cache_dir(path)
+    temp_dir = Path(tempfile.mkdtemp(dir=cache_dir.parent, prefix=f".{cache_dir.name}."))
+    for column, values in zip(columns, arrays):
+        np.save(Path(temp_dir, column["file"]), values, allow_pickle=False)
+    schema = {
+        "version": CACHE_FORMAT_VERSION,
+        "source": _source_signature(path),
+        "n_rows": len(df),
+        "columns": columns,
+        "datetime_files": {}
+    }
+    _write_json(schema, Path(temp_dir, "schema.json")) # written last, marks the cache as complete
+    if cache_dir.exists():
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    try:
+        os.replace(temp_dir, cache_dir)
+    except OSError:
+        # the cache was rebuilt by another process at the same time: keep that one
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        return _read_cache_schema(path)
+    return schema
+
+
+def read_columns(
+    path: str,
+    columns: list = None,
+    parse_dates: list = None
+) -> Dict[str, np.ndarray]:
+    """
+    Returns the columns of a CSV file as NumPy arrays memory-mapped (zero-copy) from its binary 
+    columnar cache. The cache is built from the CSV file if it does not exist yet, and rebuilt if 
+    the CSV file changed since it was built. Only the requested columns are loaded.
+
+    Parameters:
+        path (str): The path to the CSV file.
+        columns (list, optional): Names of the columns to load (in file order). Defaults to all columns.
+        parse_dates (list, optional): 
+            Names of string columns to return as datetime64[ns] arrays. The parsed values are 
+            added to the cache the first time they are requested.
+
+    Returns:
+        Dict[str, np.ndarray]: The requested columns, by name. Numeric columns are read-only memmaps.
+
+    Raises:
+        FileNotFoundError: If the specified file does not exist.
+        KeyError: If one of the requested columns is not in the file.
+        ValueError: If the contents of the file can not be cached.
+    """
+    schema = _read_cache_schema(path)
+    if schema is None:
+        schema = _write_cache(pd.read_csv(path), path)
+        if schema is None:
+            raise ValueError(f"File {path} has columns that can not be cached.")
+
+    cache_dir = _cache_dir(path)
+    names = [column["name"] for column in schema["columns"]]
+    if columns is not None:
+        missing = [name for name in columns if name not in names]
+        if missing:
+            raise KeyError(f"Columns {missing} not found in {path}.")
+    parse_dates = parse_dates or []
+
+    arrays = {}
+    for column in schema["columns"]:
+        name = column["name"]
+        if columns is not None and name not in columns:
+            continue
+        if name in parse_dates:
+            if name not in schema["datetime_files"]:
+                # parse once, and keep the parsed values as int64 nanoseconds in the cache
+                values = np.load(Path(cache_dir, column["file"]), mmap_mode="r")
+                parsed = pd.to_datetime(pd.Series(values.astype(object)))
+                datetime_file = column["file"].replace(".npy", ".datetime.npy")
+                np.save(Path(cache_dir, datetime_file), parsed.to_numpy().view("i8"), allow_pickle=False)
+                schema["datetime_files"][name] = datetime_file
+                _write_json(schema, Path(cache_dir, "schema.json"))
+            arrays[name] = np.load(
+                Path(cache_dir, schema["datetime_files"][name]), mmap_mode="r"
+            ).view("datetime64[ns]")
+        else:
+            arrays[name] = np.load(Path(cache_dir, column["file"]), mmap_mode="r")
+    return arrays
+
+
+def read_data(
+    path: str,
+    columns: list = None,
+    parse_dates: list = None,
+    use_cache: bool = False
 ) -> pd.DataFrame:
     """
     Reads a CSV file from disk and returns its contents as a pandas.DataFrame object.
+
+    With use_cache, the contents are loaded from a binary columnar cache of the file instead (see 
+    read_columns), which is built from the CSV file on the first read and rebuilt whenever the file 
+    changes. The returned DataFrame is the same as when the CSV file is parsed, without the cost of 
+    parsing it (and of parsing the parse_dates columns) again.
     
     Parameters:
         path (str): The path to the CSV file to be read.
+        columns (list, optional): Names of the columns to read (in file order). Defaults to all columns.
+        parse_dates (list, optional): Names of the columns to parse as datetime values.
+        use_cache (bool, optional): Whether to read through the binary columnar cache. Defaults to False.
     
     Returns:
         pd.DataFrame: The contents of the CSV file as a pandas.DataFrame object.
@@ -19,7 +209,17 @@ def read_data(
         pd.errors.ParserError: If the CSV file has an invalid format.
     """
     try:
-        return pd.read_csv(path)
+        if use_cache:
+            try:
+                arrays = read_columns(path, columns=columns, parse_dates=parse_dates)
+            except ValueError:
+                pass # contents that can not be cached are read from the CSV file
+            else:
+                return pd.DataFrame({
+                    name: values.astype(object) if values.dtype.kind == "U" else values
+                    for name, values in arrays.items()
+                })
+        return pd.read_csv(path, usecols=columns, parse_dates=parse_dates or False)
     except FileNotFoundError:
         print(f"File {path} not found.")
         raise
@@ -31,17 +231,60 @@ def read_data(
         raise
 
 
+def read_data_in_chunks(
+    path: str,
+    chunksize: int
+) -> Iterator[pd.DataFrame]:
+    """
+    Reads a CSV file from disk lazily, as a stream of pandas.DataFrame objects with at most 
+    chunksize rows each. Only one chunk is held in memory at a time.
+
+    Parameters:
+        path (str): The path to the CSV file to be read.
+        chunksize (int): The maximum number of rows per chunk.
+
+    Yields:
+        pd.DataFrame: The next chunk of rows of the CSV file.
+
+    Raises:
+        ValueError: If chunksize is not a positive integer.
+        FileNotFoundError: If the specified file does not exist.
+        pd.errors.EmptyDataError: If the specified file is empty.
+        pd.errors.ParserError: If the CSV file has an invalid format.
+    """
+    if chunksize is None or chunksize < 1:
+        raise ValueError("chunksize must be a positive integer.")
+    try:
+        with pd.read_csv(path, chunksize=chunksize) as reader:
+            for chunk in reader:
+                yield chunk
+    except FileNotFoundError:
+        print(f"File {path} not found.")
+        raise
+    except pd.errors.EmptyDataError:
+        print(f"File {path} is empty.")
+        raise
+    except pd.errors.ParserError:
+        print(f"File {path} has an invalid format.")
+        raise
+
 
 def write_data(
     df: pd.DataFrame, 
-    path: str
+    path: str,
+    use_cache: bool = False
 ) -> None:
     """
     Writes a pandas DataFrame to a CSV file on disk.
 
+    With use_cache, the binary columnar cache of the file (see read_data) is built along with it, from 
+    the written file as pd.read_csv reads it back (so that e.g. numeric-looking strings such as "001" 
+    are cached as the numbers a parse returns), unless it has columns that can not be cached.
+
     Parameters:
         df (pd.DataFrame): The pandas DataFrame to write to disk.
         path (str): The path to write the CSV file to.
+        use_cache (bool, optional): Whether to also write the binary columnar cache. Defaults to False.
 
     Raises:
         FileNotFoundError: If the specified file path cannot be found.
@@ -51,6 +294,169 @@ def write_data(
     except FileNotFoundError:
         print(f"File path {path} not found.")
         raise
+    if use_cache:
+        # the dtypes of a parse of the written file, not those of df
+        _write_cache(pd.read_csv(path), path)
+
+
+def write_partitioned_parquet(
+    df: pd.DataFrame,
+    path: str,
+    time_column: str = "pickup_datetime",
+    categorical_columns: List[str] = None,
+    row_group_size: int = 100000
+) -> dict:
+    """
+    Writes a pandas DataFrame as a Parquet dataset partitioned by month of time_column: one directory 
+    per month (year_month=YYYY-MM/part-0.parquet), with the rows sorted by time_column, and a metadata 
+    file (_dataset.json) with the time range and number of rows of every partition, the dtypes, and the 
+    categories of the categorical columns. The categorical columns are stored dictionary-encoded, and 
+    the row groups (with their min/max statistics) let readers skip the rows outside a time range 
+    (see read_partitioned_parquet). An existing dataset at path is replaced.
+
+    Parameters:
+        df (pd.DataFrame): The pandas DataFrame to write.
+        path (str): The directory of the dataset.
+        time_column (str, optional): The column of the event time. Defaults to "pickup_datetime".
+        categorical_columns (List[str], optional): Columns stored as categorical (dictionary-encoded) columns.
+        row_group_size (int, optional): Maximum number of rows per row group. Defaults to 100000.
+
+    Returns:
+        dict: The metadata of the dataset.
+
+    Raises:
+        KeyError: If time_column or a categorical column is not in df.
+    """
+    categorical_columns = list(categorical_columns or [])
+    missing = [name for name in [time_column] + categorical_columns if name not in df.columns]
+    if missing:
+        raise KeyError(f"Columns {missing} not found in the DataFrame.")
+    df = df.assign(**{time_column: pd.to_datetime(df[time_column])})
+    df = df.sort_values(time_column, kind="mergesort").reset_index(drop=True)
+    categories = {}
+    for name in categorical_columns:
+        df[name] = df[name].astype("category")
+        categories[name] = df[name].cat.categories.tolist()
+
+    # written to a temporary directory first, which then replaces the dataset
+    path = Path(path)
+    temp_path = Path(str(path) + ".tmp")
+    if temp_path.exists():
+        shutil.rmtree(temp_path)
+    temp_path.mkdir(parents=True)
+    partitions = []
+    months = (df[time_column].dt.year * 100 + df[time_column].dt.month).to_numpy() # YYYYMM
+    # the rows are sorted, so every month is a contiguous block of rows
+    boundaries = np.flatnonzero(months[1:] != months[:-1]) + 1 if len(df) else np.array([], dtype=int)
+    for start, stop in zip(np.concatenate([[0], boundaries]), np.concatenate([boundaries, [len(df)]])):
+        if start == stop:
+            continue
+        name = f"year_month={months[start] // 100:04d}-{months[start] % 100:02d}"
+        Path(temp_path, name).mkdir()
+        file = f"{name}/part-0.parquet"
+        df.iloc[start:stop].to_parquet(
+            Path(temp_path, file), 
+            engine="pyarrow", 
+            index=False, 
+            row_group_size=row_group_size, 
+            use_dictionary=categorical_columns or False
+        )
+        partitions.append({
+            "name": name,
+            "file": file,
+            "n_rows": int(stop - start),
+            "min_time": str(df[time_column].iloc[start]),
+            "max_time": str(df[time_column].iloc[stop - 1]),
+        })
+    metadata = {
+        "version": PARQUET_FORMAT_VERSION,
+        "time_column": time_column,
+        "n_rows": len(df),
+        "columns": [{"name": name, "dtype": str(dtype)} for name, dtype in df.dtypes.items()],
+        "categories": categories,
+        "partitions": partitions,
+    }
+    _write_json(metadata, Path(temp_path, PARQUET_METADATA_FILE)) # written last, marks the dataset as complete
+    if path.exists():
+        shutil.rmtree(path)
+    os.replace(temp_path, path)
+    return metadata
+
+
+def read_partitioned_parquet(
+    path: str,
+    columns: list = None,
+    start: str = None,
+    end: str = None,
+    exclude: list = None
+) -> pd.DataFrame:
+    """
+    Reads a month-partitioned Parquet dataset (see write_partitioned_parquet), with the rows sorted by 
+    their event time and the categorical columns as pandas categoricals (with the categories of the 
+    whole dataset, whatever the rows read).
+
+    Only the requested columns are read, and only the rows in the time range [start, end): the 
+    partitions (months) outside the range are not opened, and within a partition the row groups 
+    outside the range are skipped from their statistics (predicate pushdown).
+
+    Parameters:
+        path (str): The directory of the dataset.
+        columns (list, optional): Names of the columns to read. Defaults to all columns.
+        start (str, optional): The first event time read (inclusive). Defaults to the first row.
+        end (str, optional): The end of the event times read (exclusive). Defaults to after the last row.
+        exclude (list, optional): Names of columns not to read, e.g. the columns unused by a model. Defaults to none.
+
+    Returns:
+        pd.DataFrame: The rows in the time range, with the requested columns.
+
+    Raises:
+        FileNotFoundError: If there is no dataset at path.
+        KeyError: If one of the requested columns is not in the dataset.
+    """
+    try:
+        with open(Path(path, PARQUET_METADATA_FILE)) as f:
+            metadata = json.load(f)
+    except FileNotFoundError:
+        print(f"Parquet dataset {path} not found.")
+        raise
+    time_column = metadata["time_column"]
+    dtypes = {column["name"]: column["dtype"] for column in metadata["columns"]}
+    columns = list(dtypes) if columns is None else list(columns)
+    missing = [name for name in columns + list(exclude or []) if name not in dtypes]
+    if missing:
+        raise KeyError(f"Columns {missing} not found in {path}.")
+    if exclude:
+        columns = [name for name in columns if name not in exclude]
+
+    start = None if start is None else pd.Timestamp(start)
+    end = None if end is None else pd.Timestamp(end)
+    filters = []
+    if start is not None:
+        filters.append((time_column, ">=", start))
+    if end is not None:
+        filters.append((time_column, "<", end))
+    frames = []
+    for partition in metadata["partitions"]:
+        # partition pruning on the time range of the partition
+        if start is not None and pd.Timestamp(partition["max_time"]) < start:
+            continue
+        if end is not None and pd.Timestamp(partition["min_time"]) >= end:
+            continue
+        frames.append(pd.read_parquet(
+            Path(path, partition["file"]), 
+            engine="pyarrow", 
+            columns=columns, 
+            filters=filters or None
+        ))
+    if frames:
+        df = pd.concat(frames, ignore_index=True)
+    else:
+        df = pd.DataFrame({name: pd.Series(dtype=dtypes[name] if name not in metadata["categories"] else object) for name in columns})
+    # the same categories in every partition and every read
+    for name in columns:
+        if name in metadata["categories"]:
+            df[name] = df[name].astype(pd.CategoricalDtype(metadata["categories"][name]))
+    return df
 
 
 def concat_dataframes(
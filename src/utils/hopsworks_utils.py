@@ -1,13 +1,28 @@
+import sys
 import os
-import hopsworks
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 
+from config import config
+from pathlib import Path
+from src.utils import instrumentation, local_feature_store
+import threading
+import time
+from typing import Any, Callable
 
+
+# process-wide connections (see get_connection)
+_connections = {}
+_connections_lock = threading.Lock()
+
+
+@instrumentation.timed("login_to_hopsworks")
 def login_to_hopsworks(
     project: str,
     api_key: str = None
-) -> hopsworks.project:
+) -> "hopsworks.project":
     """
-    Logs in to Hopsworks using the API key stored in a file.
+    Logs in to Hopsworks using the API key stored in a file (the hopsworks client library is imported
+    on the first login, so that importing this module, e.g. for the local backend, stays light).
 
     Parameters:
         project (str): Project name.
@@ -19,6 +34,7 @@ def login_to_hopsworks(
     Raises:
         HopsworksRestAPIError: If unable to connect to hopsworks.
     """
+    import hopsworks
     try:
         # login to hopsworks
         project = hopsworks.login(
@@ -27,4 +43,300 @@ def login_to_hopsworks(
         )
         return project
     except hopsworks.exceptions.HopsworksRestAPIError as e:
+        # raised with its response, so that the caller can tell a permanent error (e.g. 401) from a transient one
         print(f"Unable to login to Hopsworks: {e}")
+        raise
+
+
+def is_transient_error(
+    error: Exception
+) -> bool:
+    """
+    Returns whether a feature store error is transient, i.e. worth retrying: a connection error or a
+    timeout (including those of requests, subclasses of OSError), or a REST error with a status of
+    429 (too many requests) or 5xx (server error). Errors such as a missing feature group or feature
+    view, or a REST error with a 4xx status, are permanent.
+
+    Parameters:
+        error (Exception): The error.
+
+    Returns:
+        bool: Whether the error is transient.
+    """
+    if isinstance(error, local_feature_store.FeatureStoreException):
+        return False
+    # REST errors of hopsworks, hsfs and requests carry the response
+    status_code = getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status_code, int):
+        return status_code == 429 or status_code >= 500
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    # connection errors and timeouts of requests, and socket.timeout before python 3.10
+    return isinstance(error, OSError) and any(
+        cls.__name__ in ("ConnectionError", "Timeout", "timeout") for cls in type(error).__mro__
+    )
+
+
+class FeatureStoreConnection(object):
+    """
+    Lazy connection to the feature store of a project.
+
+    Logs in on first use (once), and caches the project, the feature store, and the feature group and
+    feature view handles. A login or lookup failing with a transient error (see is_transient_error)
+    drops the cached handles and is retried (logging in again) after a backoff of backoff_seconds,
+    doubled after every failed attempt, at most max_retries times; other errors are raised at once. The backend is Hopsworks, or a local file-backed feature store (local_feature_store) for
+    offline runs and benchmarks. It is thread-safe.
+
+    Attributes
+    ----------
+    project_name : str
+        Name of the project.
+    backend : str
+        "hopsworks" or "local".
+    max_retries : int
+        Number of retries of a failed login or lookup.
+    backoff_seconds : float
+        Wait before the first retry.
+    stats : dict
+        Number of 'logins' and 'failed_attempts'.
+
+    Methods
+    -------
+    get_project():
+        Returns the project (logging in if needed).
+    get_feature_store():
+        Returns the feature store of the project.
+    get_feature_group(name, version=1):
+        Returns a feature group.
+    get_or_create_feature_group(name, version=1, **kwargs):
+        Returns a feature group, creating it if it does not exist.
+    get_feature_view(name, version=1):
+        Returns a feature view.
+    get_dataset_api():
+        Returns the dataset api of the project (its files).
+    reset():
+        Drops the project and the cached handles (the next call logs in again).
+    """
+    def __init__(
+        self,
+        project_name: str,
+        api_key: str = None,
+        backend: str = None,
+        local_dir: Path = None,
+        max_retries: int = 3,
+        backoff_seconds: float = 1.0,
+        sleep: Callable[[float], None] = time.sleep
+    ):
+        """ Set the project, the backend and the retry policy (nothing is connected yet) """
+        backend = backend or config.FEATURE_STORE_BACKEND
+        if backend not in ("hopsworks", "local"):
+            raise ValueError(f"Unknown feature store backend: {backend}")
+        self.project_name = project_name
+        self.api_key = api_key
+        self.backend = backend
+        self.local_dir = Path(local_dir or config.LOCAL_FEATURE_STORE_DIR)
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.stats = {"logins": 0, "failed_attempts": 0}
+        self._sleep = sleep
+        self._lock = threading.RLock()
+        self._project = None
+        self._feature_store = None
+        self._handles = {}
+
+    def _login(self) -> Any:
+        """ Logs in to the backend, and returns the project """
+        if self.backend == "local":
+            return local_feature_store.LocalProject(self.project_name, Path(self.local_dir, self.project_name))
+        return login_to_hopsworks(project=self.project_name, api_key=self.api_key)
+
+    def reset(self) -> None:
+        """ Drops the project and the cached handles (the next call logs in again) """
+        with self._lock:
+            self._project = None
+            self._feature_store = None
+            self._handles.clear()
+
+    def _retrying(
+        self,
+        operation: Callable[[], Any]
+    ) -> Any:
+        """
+        Calls operation with the lock held, reconnecting and retrying with exponential backoff when it
+        fails with a transient error (see is_transient_error). The lock is released during the backoff,
+        so that the other threads are not blocked by the retries (e.g. on cached handles).
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self._lock:
+                    return operation()
+            except Exception as e:
+                if not is_transient_error(e):
+                    # e.g. a missing feature group or feature view: nothing to retry
+                    raise
+                with self._lock:
+                    self.stats["failed_attempts"] += 1
+                if attempt == self.max_retries:
+                    raise
+                delay = self.backoff_seconds * 2 ** attempt
+                print(f"Error connecting to the feature store of {self.project_name} (retrying in {delay}s): {e}")
+                self.reset()
+                self._sleep(delay)
+
+    def _connect_project(self) -> Any:
+        """ Returns the project, logging in if needed (with the lock held) """
+        if self._project is None:
+            self._project = self._login()
+            self.stats["logins"] += 1
+        return self._project
+
+    def _connect(self) -> Any:
+        """ Returns the feature store, logging in if needed (with the lock held) """
+        if self._feature_store is None:
+            self._feature_store = self._connect_project().get_feature_store()
+        return self._feature_store
+
+    def get_project(self) -> Any:
+        """
+        Returns the project, logging in on first use.
+
+        Returns:
+            hopsworks.project: The project (local_feature_store.LocalProject with the local backend).
+
+        Raises:
+            Exception: If the login still fails after max_retries retries.
+        """
+        return self._retrying(self._connect_project)
+
+    def get_feature_store(self) -> Any:
+        """
+        Returns the feature store of the project, logging in on first use.
+
+        Returns:
+            hsfs.feature_store.FeatureStore: The feature store (local_feature_store.LocalFeatureStore with
+            the local backend).
+
+        Raises:
+            Exception: If the connection still fails after max_retries retries.
+        """
+        return self._retrying(self._connect)
+
+    def get_dataset_api(self) -> Any:
+        """
+        Returns the dataset api of the project (upload, download and exists of its files), logging in on 
+        first use.
+
+        Returns:
+            hopsworks.core.dataset_api.DatasetApi: The dataset api (local_feature_store.LocalDatasetApi 
+            with the local backend).
+
+        Raises:
+            Exception: If the login still fails after max_retries retries.
+        """
+        return self._retrying(lambda: self._connect_project().get_dataset_api())
+
+    def _get_handle(
+        self,
+        key: tuple,
+        lookup: Callable[[Any], Any]
+    ) -> Any:
+        """ Returns a cached handle, or looks it up in the feature store and caches it """
+        with self._lock:
+            if key in self._handles:
+                return self._handles[key]
+
+        def lookup_and_cache() -> Any:
+            if key not in self._handles:
+                self._handles[key] = lookup(self._connect())
+            return self._handles[key]
+
+        return self._retrying(lookup_and_cache)
+
+    def get_feature_group(
+        self,
+        name: str,
+        version: int = 1
+    ) -> Any:
+        """
+        Returns a feature group (looked up once).
+
+        Args:
+            name (str): Name of the feature group.
+            version (int, optional): Version of the feature group. Defaults to 1.
+
+        Returns:
+            hsfs.feature_group.FeatureGroup: The feature group.
+        """
+        return self._get_handle(
+            ("feature_group", name, version),
+            lambda fs: fs.get_feature_group(name=name, version=version)
+        )
+
+    def get_or_create_feature_group(
+        self,
+        name: str,
+        version: int = 1,
+        **kwargs
+    ) -> Any:
+        """
+        Returns a feature group, creating it if it does not exist (looked up once).
+
+        Args:
+            name (str): Name of the feature group.
+            version (int, optional): Version of the feature group. Defaults to 1.
+            **kwargs: Other arguments of get_or_create_feature_group (primary_key, description, ...).
+
+        Returns:
+            hsfs.feature_group.FeatureGroup: The feature group.
+        """
+        return self._get_handle(
+            ("feature_group", name, version),
+            lambda fs: fs.get_or_create_feature_group(name=name, version=version, **kwargs)
+        )
+
+    def get_feature_view(
+        self,
+        name: str,
+        version: int = 1
+    ) -> Any:
+        """
+        Returns a feature view (looked up once).
+
+        Args:
+            name (str): Name of the feature view.
+            version (int, optional): Version of the feature view. Defaults to 1.
+
+        Returns:
+            hsfs.feature_view.FeatureView: The feature view.
+        """
+        return self._get_handle(
+            ("feature_view", name, version),
+            lambda fs: fs.get_feature_view(name=name, version=version)
+        )
+
+
+def get_connection(
+    project: str,
+    api_key: str = None,
+    backend: str = None,
+    **kwargs
+) -> FeatureStoreConnection:
+    """
+    Returns the process-wide connection to the feature store of a project (one per project and
+    backend), creating it on first use. Nothing is connected until a handle is requested.
+
+    Args:
+        project (str): Project name.
+        api_key (str, optional): Hopsworks API key (used when the connection is created).
+        backend (str, optional): "hopsworks" or "local". Defaults to config.FEATURE_STORE_BACKEND.
+        **kwargs: Other arguments of FeatureStoreConnection (used when the connection is created).
+
+    Returns:
+        FeatureStoreConnection: The connection.
+    """
+    backend = backend or config.FEATURE_STORE_BACKEND
+    with _connections_lock:
+        key = (project, backend)
+        if key not in _connections:
+            _connections[key] = FeatureStoreConnection(project, api_key=api_key, backend=backend, **kwargs)
+        return _connections[key]
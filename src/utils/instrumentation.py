@@ -0,0 +1,367 @@
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from bisect import bisect_left
+from config import config
+import functools
+import json
+from pathlib import Path
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, Tuple
+
+
+# Instrumentation of the hot paths (feature engineering, model load and predict, feature store login and
+# inserts, drift computations): counters, and histograms of the durations of timed operations, kept in
+# a process-wide registry and exported in the Prometheus text format or as JSON snapshots.
+#
+# It is disabled unless METRICS_ENABLED=1 (or enable() is called): a disabled timer or counter is a
+# single flag check, so the instrumented functions run at full speed.
+
+
+# prefix of the exported metric names
+METRICS_PREFIX = "nyc_taxi_"
+
+# upper bounds (seconds) of the buckets of the duration histograms
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+
+# whether metrics are recorded (see enable)
+_enabled = config.METRICS_ENABLED
+
+
+def _label_key(
+    labels: Dict[str, str]
+) -> Tuple[Tuple[str, str], ...]:
+    """ Returns labels as a hashable key, sorted by label name """
+    return tuple(sorted((str(name), str(value)) for name, value in labels.items())) if labels else ()
+
+
+def _format_labels(
+    labels: Tuple[Tuple[str, str], ...]
+) -> str:
+    """ Returns labels in the Prometheus text format ('' if there are none) """
+    if not labels:
+        return ""
+    escape = lambda value: value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in labels) + "}"
+
+
+def _format_value(
+    value: float
+) -> str:
+    """ Returns a sample value in the Prometheus text format """
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class MetricsRegistry(object):
+    """
+    Counters and histograms, keyed by metric name and labels. It is thread-safe.
+
+    Attributes
+    ----------
+    buckets : tuple
+        Upper bounds of the buckets of the histograms.
+    counters : dict
+        Value of every counter, keyed by (name, labels).
+    histograms : dict
+        Bucket counts (not cumulative, the last one is +Inf), sum and count of every histogram, keyed by (name, labels).
+
+    Methods
+    -------
+    increment(name, value=1, labels=None):
+        Adds value to a counter.
+    observe(name, value, labels=None):
+        Adds an observation to a histogram.
+    snapshot():
+        Returns all the metrics as a JSON-serializable dictionary.
+    to_prometheus():
+        Returns all the metrics in the Prometheus text format.
+    reset():
+        Removes all the metrics.
+    """
+    def __init__(
+        self,
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    ):
+        """ Set the buckets of the histograms """
+        self.buckets = tuple(sorted(buckets))
+        self.counters = {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def increment(
+        self,
+        name: str,
+        value: float = 1,
+        labels: Dict[str, str] = None
+    ) -> None:
+        """ Adds value to a counter (created at 0) """
+        key = (name, _label_key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(
+        self,
+        name: str,
+        value: float,
+        labels: Dict[str, str] = None
+    ) -> None:
+        """ Adds an observation to a histogram (created empty) """
+        key = (name, _label_key(labels))
+        bucket = bisect_left(self.buckets, value)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+            histogram["counts"][bucket] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    def reset(self) -> None:
+        """ Removes all the metrics """
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def snapshot(self) -> dict:
+        """
+        Returns all the metrics.
+
+        Returns:
+            dict:
+                The time of the snapshot ('timestamp', seconds since the epoch), the 'counters' (name,
+                labels and value), and the 'histograms' (name, labels, count, sum, mean, and the
+                cumulative count of every bucket, keyed by its upper bound).
+        """
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted((key, dict(histogram, counts=list(histogram["counts"]))) for key, histogram in self.histograms.items())
+        bounds = [str(bound) for bound in self.buckets] + ["+Inf"]
+        return {
+            "timestamp": time.time(),
+            "counters": [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in counters
+            ],
+            "histograms": [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": histogram["count"],
+                    "sum": histogram["sum"],
+                    "mean": histogram["sum"] / histogram["count"] if histogram["count"] else None,
+                    "buckets": dict(zip(bounds, _cumulative(histogram["counts"]))),
+                }
+                for (name, labels), histogram in histograms
+            ],
+        }
+
+    def to_prometheus(self) -> str:
+        """
+        Returns all the metrics in the Prometheus text exposition format (names prefixed by METRICS_PREFIX).
+
+        Returns:
+            str: The metrics, one sample per line.
+        """
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted((key, dict(histogram, counts=list(histogram["counts"]))) for key, histogram in self.histograms.items())
+        lines = []
+        typed = set()
+        for (name, labels), value in counters:
+            name = METRICS_PREFIX + name
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        bounds = [_format_value(bound) for bound in self.buckets] + ["+Inf"]
+        for (name, labels), histogram in histograms:
+            name = METRICS_PREFIX + name
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} histogram")
+            for bound, count in zip(bounds, _cumulative(histogram["counts"])):
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', bound),))} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(histogram['sum'])}")
+            lines.append(f"{name}_count{_format_labels(labels)} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+
+def _cumulative(
+    counts: list
+) -> list:
+    """ Returns the cumulative counts of the buckets """
+    total, cumulative = 0, []
+    for count in counts:
+        total += count
+        cumulative.append(total)
+    return cumulative
+
+
+# process-wide registry of the instrumented code
+_registry = MetricsRegistry()
+
+# serializes the exports of the process (e.g. concurrent streamlit sessions, which are threads)
+_export_lock = threading.Lock()
+
+
+def get_registry() -> MetricsRegistry:
+    """ Returns the process-wide registry """
+    return _registry
+
+
+def enable(
+    enabled: bool = True
+) -> None:
+    """ Enables (or disables) the recording of metrics, in the whole process """
+    global _enabled
+    _enabled = enabled
+
+
+def is_enabled() -> bool:
+    """ Returns whether metrics are recorded """
+    return _enabled
+
+
+def increment(
+    name: str,
+    value: float = 1,
+    labels: Dict[str, str] = None
+) -> None:
+    """
+    Adds value to a counter of the process-wide registry (nothing if metrics are disabled).
+
+    Args:
+        name (str): Name of the counter (by convention ending with '_total').
+        value (float, optional): Increment. Defaults to 1.
+        labels (Dict[str, str], optional): Labels of the counter.
+
+    Returns:
+        None
+    """
+    if _enabled:
+        _registry.increment(name, value, labels)
+
+
+class _Timer(object):
+    """ Context manager recording its duration in the histogram '<name>_seconds', and its failures in '<name>_errors_total' """
+    __slots__ = ("name", "labels", "start")
+
+    def __init__(
+        self,
+        name: str,
+        labels: Dict[str, str]
+    ):
+        """ Set the operation """
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self) -> "_Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> bool:
+        _registry.observe(f"{self.name}_seconds", time.perf_counter() - self.start, self.labels)
+        if exc_type is not None:
+            _registry.increment(f"{self.name}_errors_total", 1, self.labels)
+        return False
+
+
+class _NullTimer(object):
+    """ Context manager doing nothing (the timer of disabled metrics) """
+    __slots__ = ()
+
+    def __enter__(self) -> "_NullTimer":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> bool:
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def timer(
+    name: str,
+    labels: Dict[str, str] = None
+) -> Any:
+    """
+    Returns a context manager timing an operation: its duration is added to the histogram
+    '<name>_seconds', and an exception raised inside it to the counter '<name>_errors_total'.
+
+    Args:
+        name (str): Name of the operation.
+        labels (Dict[str, str], optional): Labels of the metrics.
+
+    Returns:
+        The context manager (doing nothing if metrics are disabled).
+    """
+    return _Timer(name, labels) if _enabled else _NULL_TIMER
+
+
+def timed(
+    name: str,
+    labels: Dict[str, str] = None
+) -> Callable[[Callable], Callable]:
+    """
+    Decorator timing every call of a function (see timer).
+
+    Args:
+        name (str): Name of the operation.
+        labels (Dict[str, str], optional): Labels of the metrics.
+
+    Returns:
+        Callable: The decorator.
+    """
+    def decorator(function: Callable) -> Callable:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            with _Timer(name, labels):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def snapshot() -> dict:
+    """ Returns the metrics of the process-wide registry (see MetricsRegistry.snapshot) """
+    return _registry.snapshot()
+
+
+def to_prometheus() -> str:
+    """ Returns the metrics of the process-wide registry in the Prometheus text format """
+    return _registry.to_prometheus()
+
+
+def export(
+    name: str,
+    metrics_dir: Path = None
+) -> None:
+    """
+    Writes the metrics of the process-wide registry to <metrics_dir>/<name>.json (JSON snapshot) and
+    <metrics_dir>/<name>.prom (Prometheus text format, e.g. for the textfile collector of the node
+    exporter), through temporary files so that readers never see a partial file. Exports of the
+    process are serialized, so that the two files hold the same snapshot of the last export.
+
+    Args:
+        name (str): Name of the files, e.g. the name of the process.
+        metrics_dir (Path, optional): Directory of the files. Defaults to config.METRICS_DIR.
+
+    Returns:
+        None
+    """
+    metrics_dir = Path(metrics_dir or config.METRICS_DIR)
+    os.makedirs(metrics_dir, exist_ok=True)
+    with _export_lock:
+        for suffix, content in ((".json", json.dumps(snapshot(), indent=2)), (".prom", to_prometheus())):
+            path = Path(metrics_dir, name + suffix)
+            # a unique temporary file, as other processes may export under the same name
+            fd, temp_path = tempfile.mkstemp(dir=metrics_dir, prefix=f".{path.name}.")
+            with os.fdopen(fd, "w") as f:
+                f.write(content)
+            os.replace(temp_path, path)
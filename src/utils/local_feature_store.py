@@ -0,0 +1,517 @@
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import datetime
+import fcntl
+import glob
+import json
+import pandas as pd
+from pathlib import Path
+import shutil
+import tempfile
+import threading
+from typing import List, Tuple
+
+
+# Local, file-backed stand-in for the subset of the Hopsworks project and feature store (hsfs) API
+# used by this project, so that the pipelines can run (and be benchmarked) offline:
+#   project.get_feature_store()
+#   feature_store.get_feature_group / create_feature_group / get_or_create_feature_group
+#   feature_group.insert / read / select_all,  query.join / read
+#   feature_store.get_feature_view / create_feature_view
+#   feature_view.create_training_data / get_training_data
+#   project.get_dataset_api(),  dataset_api.upload / download / exists
+# A feature group is a directory with its metadata and one pickled DataFrame per insert (rows are
+# upserted on the primary key when read), a feature view stores its query, and a training dataset
+# is the result of the query, filtered on the event time, materialized at creation. The datasets of 
+# the project (files, e.g. the sketches of quantile_sketch.SketchStore) are stored in a directory.
+
+
+class FeatureStoreException(Exception):
+    """ Raised when a feature group, feature view or training dataset does not exist """
+
+
+def _write_json(
+    path: Path,
+    content: dict
+) -> None:
+    """ Writes a JSON file atomically """
+    temp_path = Path(str(path) + ".tmp")
+    with open(temp_path, "w") as f:
+        json.dump(content, f)
+    os.replace(temp_path, path)
+
+
+class LocalQuery(object):
+    """
+    Query over local feature groups: all the features of a feature group, joined with other queries.
+
+    Methods
+    -------
+    join(query, on):
+        Returns the query joined with another query on the given features.
+    read():
+        Returns the result of the query as a DataFrame.
+    """
+    def __init__(
+        self,
+        feature_group: "LocalFeatureGroup",
+        joins: List[Tuple["LocalQuery", List[str]]] = None
+    ):
+        """ Set the (left-most) feature group and the joined queries """
+        self.feature_group = feature_group
+        self.joins = joins or []
+
+    def join(
+        self,
+        query: "LocalQuery",
+        on: List[str]
+    ) -> "LocalQuery":
+        """ Returns the query (inner) joined with another query on the features of on """
+        return LocalQuery(self.feature_group, self.joins + [(query, list(on))])
+
+    def read(self) -> pd.DataFrame:
+        """ Returns the result of the query """
+        df = self.feature_group.read()
+        for query, on in self.joins:
+            df = df.merge(query.read(), on=on, how="inner")
+        return df
+
+    def to_dict(self) -> dict:
+        """ Returns the query as a JSON-serializable dictionary """
+        return {
+            "feature_group": [self.feature_group.name, self.feature_group.version],
+            "joins": [{"query": query.to_dict(), "on": on} for query, on in self.joins],
+        }
+
+    @classmethod
+    def from_dict(
+        cls,
+        feature_store: "LocalFeatureStore",
+        query: dict
+    ) -> "LocalQuery":
+        """ Returns the query of a dictionary created by to_dict """
+        name, version = query["feature_group"]
+        return cls(
+            feature_store.get_feature_group(name, version),
+            [(cls.from_dict(feature_store, join["query"]), join["on"]) for join in query["joins"]]
+        )
+
+
+class LocalFeatureGroup(object):
+    """
+    Feature group stored in a local directory.
+
+    Attributes
+    ----------
+    name : str
+        Name of the feature group.
+    version : int
+        Version of the feature group.
+    primary_key : list
+        Features whose values identify a row (later inserts overwrite earlier rows with the same key).
+    event_time : str
+        Feature with the event time of the rows, or None.
+
+    Methods
+    -------
+    insert(features, write_options=None):
+        Inserts (upserts) rows.
+    read():
+        Returns all the rows.
+    select_all():
+        Returns a query of all the features.
+    """
+    def __init__(
+        self,
+        path: Path,
+        metadata: dict
+    ):
+        """ Set the directory and the metadata of the feature group """
+        self.path = Path(path)
+        self.name = metadata["name"]
+        self.version = metadata["version"]
+        self.description = metadata.get("description", "")
+        self.primary_key = metadata.get("primary_key") or []
+        self.event_time = metadata.get("event_time")
+
+    def insert(
+        self,
+        features: pd.DataFrame,
+        write_options: dict = None
+    ) -> Tuple[None, None]:
+        """
+        Inserts rows into the feature group (upserted on the primary key).
+
+        Args:
+            features (pd.DataFrame): The rows.
+            write_options (dict, optional): Ignored (for compatibility with hsfs).
+
+        Returns:
+            Tuple[None, None]: No job and no validation report (as hsfs without a job).
+        """
+        # the next part number is taken under an exclusive lock of the group, so that concurrent inserts
+        # (threads or processes) never write the same part, and the part is written to a temporary file 
+        # first, so that readers never see a partial part
+        with open(Path(self.path, ".insert.lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            parts = glob.glob(os.path.join(self.path, "part-*.pkl"))
+            n_parts = max((int(os.path.basename(part)[5:-4]) + 1 for part in parts), default=0)
+            path = Path(self.path, f"part-{n_parts:06d}.pkl")
+            temp_path = Path(self.path, f".{path.name}.tmp")
+            features.reset_index(drop=True).to_pickle(temp_path)
+            os.replace(temp_path, path)
+        return None, None
+
+    def read(self) -> pd.DataFrame:
+        """ Returns all the rows of the feature group (the last inserted row of every primary key) """
+        parts = sorted(glob.glob(os.path.join(self.path, "part-*.pkl")))
+        if not parts:
+            return pd.DataFrame()
+        df = pd.concat([pd.read_pickle(part) for part in parts], ignore_index=True)
+        if self.primary_key and len(parts) > 1:
+            df = df.drop_duplicates(subset=self.primary_key, keep="last").reset_index(drop=True)
+        return df
+
+    def select_all(self) -> LocalQuery:
+        """ Returns a query of all the features of the feature group """
+        return LocalQuery(self)
+
+
+class LocalFeatureView(object):
+    """
+    Feature view (query) over local feature groups, with its training datasets.
+
+    Methods
+    -------
+    create_training_data(start_time=None, end_time=None, description="", **kwargs):
+        Materializes a training dataset, and returns its version.
+    get_training_data(training_dataset_version):
+        Returns a training dataset.
+    """
+    def __init__(
+        self,
+        feature_store: "LocalFeatureStore",
+        path: Path,
+        metadata: dict
+    ):
+        """ Set the directory and the metadata of the feature view """
+        self.feature_store = feature_store
+        self.path = Path(path)
+        self.name = metadata["name"]
+        self.version = metadata["version"]
+        self.description = metadata.get("description", "")
+        self.query = LocalQuery.from_dict(feature_store, metadata["query"])
+
+    def create_training_data(
+        self,
+        start_time: datetime.datetime = None,
+        end_time: datetime.datetime = None,
+        description: str = "",
+        **kwargs
+    ) -> Tuple[int, None]:
+        """
+        Materializes the rows of the query whose event time (of the left-most feature group) is between
+        start_time and end_time (both included) as a new training dataset.
+
+        Args:
+            start_time (datetime.datetime, optional): First event time.
+            end_time (datetime.datetime, optional): Last event time.
+            description (str, optional): Description of the training dataset.
+            **kwargs: Ignored (data_format, write_options, ... for compatibility with hsfs).
+
+        Returns:
+            Tuple[int, None]: The version of the training dataset, and no job.
+        """
+        df = self.query.read()
+        event_time = self.query.feature_group.event_time
+        if event_time is not None and (start_time is not None or end_time is not None):
+            times = pd.to_datetime(df[event_time])
+            mask = pd.Series(True, index=df.index)
+            if start_time is not None:
+                mask &= times >= pd.Timestamp(start_time)
+            if end_time is not None:
+                mask &= times <= pd.Timestamp(end_time)
+            df = df[mask].reset_index(drop=True)
+        version = len(glob.glob(os.path.join(self.path, "training_dataset_*.pkl"))) + 1
+        df.to_pickle(Path(self.path, f"training_dataset_{version}.pkl"))
+        _write_json(Path(self.path, f"training_dataset_{version}.json"), {
+            "version": version,
+            "description": description,
+            "start_time": None if start_time is None else str(start_time),
+            "end_time": None if end_time is None else str(end_time),
+        })
+        return version, None
+
+    def get_training_data(
+        self,
+        training_dataset_version: int
+    ) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Returns a training dataset.
+
+        Args:
+            training_dataset_version (int): Version of the training dataset.
+
+        Returns:
+            Tuple[pd.DataFrame, pd.DataFrame]: The features, and the labels (None: no label is defined).
+
+        Raises:
+            FeatureStoreException: If the training dataset does not exist.
+        """
+        path = Path(self.path, f"training_dataset_{training_dataset_version}.pkl")
+        if not os.path.exists(path):
+            raise FeatureStoreException(
+                f"Training dataset version {training_dataset_version} of feature view {self.name} does not exist."
+            )
+        return pd.read_pickle(path), None
+
+
+class LocalFeatureStore(object):
+    """
+    Feature store in a local directory (feature_groups/<name>_<version>, feature_views/<name>_<version>).
+
+    Methods
+    -------
+    get_feature_group(name, version=None):
+        Returns a feature group.
+    create_feature_group(name, version=None, description="", online_enabled=False, primary_key=None, event_time=None, **kwargs):
+        Creates a feature group.
+    get_or_create_feature_group(name, version, ...):
+        Returns a feature group, creating it if it does not exist.
+    get_feature_view(name, version=None):
+        Returns a feature view.
+    create_feature_view(name, query, description="", version=None, **kwargs):
+        Creates a feature view.
+    """
+    def __init__(
+        self,
+        path: Path
+    ):
+        """ Set the directory of the feature store """
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def _entity_path(
+        self,
+        kind: str,
+        name: str,
+        version: int
+    ) -> Path:
+        """ Returns the directory of a feature group or feature view """
+        return Path(self.path, kind, f"{name}_{int(version or 1)}")
+
+    def get_feature_group(
+        self,
+        name: str,
+        version: int = None
+    ) -> LocalFeatureGroup:
+        """
+        Returns a feature group.
+
+        Raises:
+            FeatureStoreException: If the feature group does not exist.
+        """
+        path = self._entity_path("feature_groups", name, version)
+        try:
+            with open(Path(path, "metadata.json")) as f:
+                return LocalFeatureGroup(path, json.load(f))
+        except FileNotFoundError:
+            raise FeatureStoreException(f"Feature group {name} (version {version}) does not exist.")
+
+    def create_feature_group(
+        self,
+        name: str,
+        version: int = None,
+        description: str = "",
+        online_enabled: bool = False,
+        primary_key: List[str] = None,
+        event_time: str = None,
+        **kwargs
+    ) -> LocalFeatureGroup:
+        """ Creates a feature group (the metadata of an existing feature group is kept) """
+        path = self._entity_path("feature_groups", name, version)
+        with self._lock:
+            if not os.path.exists(Path(path, "metadata.json")):
+                os.makedirs(path, exist_ok=True)
+                _write_json(Path(path, "metadata.json"), {
+                    "name": name,
+                    "version": int(version or 1),
+                    "description": description,
+                    "online_enabled": online_enabled,
+                    "primary_key": list(primary_key or []),
+                    "event_time": event_time,
+                })
+        return self.get_feature_group(name, version)
+
+    def get_or_create_feature_group(
+        self,
+        name: str,
+        version: int,
+        **kwargs
+    ) -> LocalFeatureGroup:
+        """ Returns a feature group, creating it (see create_feature_group) if it does not exist """
+        try:
+            return self.get_feature_group(name, version)
+        except FeatureStoreException:
+            return self.create_feature_group(name, version, **kwargs)
+
+    def get_feature_view(
+        self,
+        name: str,
+        version: int = None
+    ) -> LocalFeatureView:
+        """
+        Returns a feature view.
+
+        Raises:
+            FeatureStoreException: If the feature view does not exist.
+        """
+        path = self._entity_path("feature_views", name, version)
+        try:
+            with open(Path(path, "metadata.json")) as f:
+                return LocalFeatureView(self, path, json.load(f))
+        except FileNotFoundError:
+            raise FeatureStoreException(f"Feature view {name} (version {version}) does not exist.")
+
+    def create_feature_view(
+        self,
+        name: str,
+        query: LocalQuery,
+        description: str = "",
+        version: int = None,
+        **kwargs
+    ) -> LocalFeatureView:
+        """ Creates a feature view of a query (an existing feature view is returned as is) """
+        path = self._entity_path("feature_views", name, version)
+        with self._lock:
+            if not os.path.exists(Path(path, "metadata.json")):
+                os.makedirs(path, exist_ok=True)
+                _write_json(Path(path, "metadata.json"), {
+                    "name": name,
+                    "version": int(version or 1),
+                    "description": description,
+                    "query": query.to_dict(),
+                })
+        return self.get_feature_view(name, version)
+
+
+class LocalDatasetApi(object):
+    """
+    Datasets (files) of a project stored in a local directory, as the dataset api of Hopsworks.
+
+    Methods
+    -------
+    upload(local_path, upload_path, overwrite=False):
+        Uploads a file to a dataset directory.
+    download(path, local_path=None, overwrite=False):
+        Downloads a file to a local directory.
+    exists(path):
+        Returns whether a file exists.
+    """
+    def __init__(
+        self,
+        path: Path
+    ):
+        """ Set the directory of the datasets """
+        self.path = Path(path)
+
+    def upload(
+        self,
+        local_path: str,
+        upload_path: str,
+        overwrite: bool = False
+    ) -> str:
+        """
+        Uploads a file to a dataset directory (atomically: readers never see a partial file).
+
+        Args:
+            local_path (str): The file.
+            upload_path (str): The dataset directory, e.g. "Resources".
+            overwrite (bool, optional): Whether to overwrite an existing file. Defaults to False.
+
+        Returns:
+            str: The path of the uploaded file.
+
+        Raises:
+            FileExistsError: If the file exists and overwrite is False.
+        """
+        path = f"{upload_path}/{os.path.basename(local_path)}"
+        target = Path(self.path, path)
+        if target.exists() and not overwrite:
+            raise FileExistsError(f"{path} already exists.")
+        os.makedirs(target.parent, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=target.parent, prefix=f".{target.name}.")
+        os.close(fd)
+        shutil.copyfile(local_path, temp_path)
+        os.replace(temp_path, target)
+        return path
+
+    def download(
+        self,
+        path: str,
+        local_path: str = None,
+        overwrite: bool = False
+    ) -> str:
+        """
+        Downloads a file to a local directory.
+
+        Args:
+            path (str): The path of the file in the datasets.
+            local_path (str, optional): The local directory. Defaults to the working directory.
+            overwrite (bool, optional): Whether to overwrite an existing local file. Defaults to False.
+
+        Returns:
+            str: The path of the downloaded file.
+
+        Raises:
+            FileNotFoundError: If the file does not exist.
+            FileExistsError: If the local file exists and overwrite is False.
+        """
+        source = Path(self.path, path)
+        if not source.is_file():
+            raise FileNotFoundError(f"{path} not found.")
+        target = os.path.join(local_path or os.getcwd(), os.path.basename(path))
+        if os.path.exists(target) and not overwrite:
+            raise FileExistsError(f"{target} already exists.")
+        shutil.copyfile(source, target)
+        return target
+
+    def exists(
+        self,
+        path: str
+    ) -> bool:
+        """ Returns whether a file (or directory) exists in the datasets """
+        return Path(self.path, path).exists()
+
+
+class LocalProject(object):
+    """
+    Project whose feature store and datasets are stored in a local directory.
+
+    Methods
+    -------
+    get_feature_store():
+        Returns the feature store of the project.
+    get_dataset_api():
+        Returns the datasets of the project.
+    """
+    def __init__(
+        self,
+        name: str,
+        path: Path
+    ):
+        """ Set the name and the directory of the project """
+        self.name = name
+        self.path = Path(path)
+        self._feature_store = LocalFeatureStore(Path(self.path, "feature_store"))
+        self._dataset_api = LocalDatasetApi(Path(self.path, "datasets"))
+
+    def get_feature_store(self) -> LocalFeatureStore:
+        """ Returns the feature store of the project """
+        return self._feature_store
+
+    def get_dataset_api(self) -> LocalDatasetApi:
+        """ Returns the datasets of the project """
+        return self._dataset_api
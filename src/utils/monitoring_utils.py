@@ -2,13 +2,54 @@ import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 
-import hsfs
+from concurrent.futures import ProcessPoolExecutor
+from config import config
+import math
+import numpy as np
 import pandas as pd
-from typing import Tuple
+from pathlib import Path
+from scipy import stats
+from src.utils import instrumentation, quantile_sketch
+import tempfile
+from typing import Dict, List, Tuple
+
+
+# directory of the cached reference windows (see get_reference)
+REFERENCE_CACHE_DIR = Path(config.DATA_DIR, "monitoring_cache")
+
+# features monitored for drift, with the names of the prediction feature view
+SELECTED_FEATURES = [
+    'direction', 'dropoff_latitude', 'dropoff_longitude', 'minute_of_the_day', 
+    'pickup_latitude', 'pickup_longitude', 'prediction'
+]
+
+# categorical model features (tested with chi-square tests, see full_drift)
+CATEGORICAL_FEATURES = [
+    'h2amto7am_7amto2am', 'holiday', 'month', 'passenger_count', 'vendor_id', 'weekday'
+]
+
+# all the model features and the prediction, with the names of the prediction feature view (see full_drift)
+DRIFT_FEATURES = [
+    'h2amto7am_7amto2am', 'direction', 'dropoff_latitude', 'dropoff_longitude', 'haversine_distance', 
+    'holiday', 'minute_of_the_day', 'month', 'passenger_count', 'pickup_latitude', 'pickup_longitude', 
+    'vendor_id', 'week', 'weekday', 'prediction'
+]
+
+# there is mismatch in feature names of the reference (test) dataset and the predictions
+REFERENCE_COLUMN_NAMES = {
+    'direction_df': 'direction',
+    'haversine_distance_df': 'haversine_distance',
+    'holiday_df': 'holiday',
+    'hour_before7_after7_df': 'h2amto7am_7amto2am',
+    'trip_duration': 'prediction'
+}
+
+# samples smaller than this (rows of all the features) are tested serially by full_drift
+MIN_ROWS_PARALLEL_DRIFT = 200000
 
 
 def get_df(
-    feature_store: hsfs.feature_store.FeatureStore, 
+    feature_store: "hsfs.feature_store.FeatureStore", 
     feature_view_name: str,
     feature_view_version: int,
     training_dataset_version: int
@@ -41,7 +82,8 @@ def get_df(
 
 def get_specific_features(
     test_df: pd.DataFrame, 
-    prediction_df: pd.DataFrame
+    prediction_df: pd.DataFrame,
+    features: List[str] = SELECTED_FEATURES
 ) -> Tuple[pd.DataFrame, pd.DataFrame, list]:
     """
     Returns two dataframes: one containing the specific features required for prediction, 
@@ -50,6 +92,7 @@ def get_specific_features(
     Args:
         test_df (pd.DataFrame): The test dataset.
         prediction_df (pd.DataFrame): The predictions dataset.
+        features (List[str], optional): The features. Defaults to SELECTED_FEATURES.
         
     Returns:
         Tuple[pd.DataFrame, pd.DataFrame]: A tuple of two dataframes. The first dataframe contains 
@@ -58,17 +101,635 @@ def get_specific_features(
     """
     # there is mismatch in feature names of test_df and prediction_df
     # rename the columns of test_df using a dictionary
-    test_df = test_df.rename(
-        columns={
-            'direction_df': 'direction',
-            'trip_duration': 'prediction'
-        }
-    )
+    test_df = test_df.rename(columns=REFERENCE_COLUMN_NAMES)
 
     # selecting specific columns
-    selected_features = ['direction', 'dropoff_latitude', 'dropoff_longitude', 'minute_of_the_day', 
-        'pickup_latitude', 'pickup_longitude', 'prediction']
+    selected_features = list(features)
     prediction_df = prediction_df.loc[:, selected_features]
     test_df = test_df.loc[:, selected_features]
 
     return test_df.to_numpy(), prediction_df.to_numpy(), selected_features
+
+
+def build_reference(
+    df: pd.DataFrame,
+    features: List[str]
+) -> Dict[str, np.ndarray]:
+    """
+    Returns the compact form of a reference window: the sorted values of every feature (missing 
+    values dropped), which is all the two-sample KS test needs from the reference.
+
+    Args:
+        df (pd.DataFrame): The reference dataset (with the feature names of the predictions).
+        features (List[str]): The features.
+
+    Returns:
+        Dict[str, np.ndarray]: The sorted float64 values of every feature.
+    """
+    reference = {}
+    for feature in features:
+        values = df[feature].to_numpy(dtype=np.float64, na_value=np.nan)
+        reference[feature] = np.sort(values[~np.isnan(values)])
+    return reference
+
+
+@instrumentation.timed("drift", {"computation": "get_reference"})
+def get_reference(
+    feature_store: "hsfs.feature_store.FeatureStore", 
+    feature_view_name: str,
+    feature_view_version: int,
+    training_dataset_version: int,
+    features: List[str] = SELECTED_FEATURES,
+    cache_dir: Path = REFERENCE_CACHE_DIR
+) -> Dict[str, np.ndarray]:
+    """
+    Returns the reference window of a training dataset in compact form (see build_reference). The 
+    training dataset never changes, so its reference is computed once, and persisted in cache_dir 
+    (one file per feature view and training dataset version); later calls only read that file, and 
+    the feature store is only contacted when the file does not have all the features.
+
+    Args:
+        feature_store (hsfs.feature_store.FeatureStore): The feature store (only used on a cache miss).
+        feature_view_name (str): The name of the feature view.
+        feature_view_version (int): The version of the feature view.
+        training_dataset_version (int): The version of the training dataset.
+        features (List[str], optional): The features (with the names of the predictions). Defaults to SELECTED_FEATURES.
+        cache_dir (Path, optional): Directory of the cached references. Defaults to REFERENCE_CACHE_DIR.
+
+    Returns:
+        Dict[str, np.ndarray]: The sorted float64 values of every feature.
+    """
+    path = Path(cache_dir, f"{feature_view_name}_v{feature_view_version}_td{training_dataset_version}.npz")
+    if os.path.exists(path):
+        with np.load(path) as cached:
+            if all(feature in cached.files for feature in features):
+                return {feature: cached[feature] for feature in features}
+
+    df = get_df(feature_store, feature_view_name, feature_view_version, training_dataset_version)
+    reference = build_reference(df.rename(columns=REFERENCE_COLUMN_NAMES), features)
+    # written to a temporary file first, so that a concurrent reader never sees a partial file
+    os.makedirs(cache_dir, exist_ok=True)
+    temp_path = Path(cache_dir, f".{os.getpid()}_{path.name}")
+    with open(temp_path, "wb") as f:
+        np.savez(f, **reference)
+    os.replace(temp_path, path)
+    return reference
+
+
+def ks_p_value(
+    distance: np.ndarray,
+    n: np.ndarray,
+    m: np.ndarray
+) -> np.ndarray:
+    """
+    Returns the p-value of two-sided two-sample KS statistics, vectorized, as scipy's ks_2samp in its 
+    'asymp' mode (the mode of the feature-wise tests of TabularDrift): the survival function of the 
+    one-sample Kolmogorov distribution of size round(n * m / (n + m)) at the statistic.
+
+    Args:
+        distance (np.ndarray): The KS statistics.
+        n (np.ndarray): Sizes of the first samples (e.g. of the reference).
+        m (np.ndarray): Sizes of the second samples.
+
+    Returns:
+        np.ndarray: The p-values (nan for an empty sample).
+    """
+    n, m = np.asarray(n, dtype=np.float64), np.asarray(m, dtype=np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        effective_size = np.round(n * m / (n + m))
+        p_values = stats.kstwo.sf(distance, np.where(effective_size > 0, effective_size, 1))
+    return np.where((n > 0) & (m > 0), np.clip(p_values, 0.0, 1.0), np.nan)
+
+
+def _ks_statistics(
+    reference: np.ndarray,
+    values: np.ndarray,
+    buckets: np.ndarray,
+    n_buckets: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the two-sample KS statistic of every bucket of a sample against a sorted reference, in 
+    one vectorized pass.
+
+    The empirical CDF of a bucket only steps at its own values, so the largest distance to the 
+    reference CDF is reached at those values: F_bucket - F_ref right at a value, and F_ref - F_bucket
+    right before it. Both only need the reference CDF at the values (searchsorted on the reference), 
+    and the rank of every value within its bucket (one sort of the sample by value, then by bucket).
+
+    Args:
+        reference (np.ndarray): The sorted reference values (no missing values).
+        values (np.ndarray): The values of the sample (no missing values).
+        buckets (np.ndarray): The bucket (0 to n_buckets - 1) of every value.
+        n_buckets (int): Number of buckets.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The KS statistic (nan for an empty bucket) and the size of every bucket.
+    """
+    n = len(reference)
+    # values in increasing order (searchsorted is much faster on sorted queries), and the stable 
+    # permutation grouping them by bucket (a radix sort for small bucket codes)
+    order = np.argsort(values)
+    values, buckets = values[order], buckets[order]
+    code_dtype = np.int16 if n_buckets <= np.iinfo(np.int16).max else np.int64
+    by_bucket = np.argsort(buckets.astype(code_dtype), kind="stable")
+    counts = np.bincount(buckets, minlength=n_buckets)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    # rank of every value within its bucket (0-based)
+    ranks = np.empty(len(values), dtype=np.int64)
+    ranks[by_bucket] = np.arange(len(values)) - starts[buckets[by_bucket]]
+    sizes = counts[buckets].astype(np.float64)
+    distances = np.maximum(
+        (ranks + 1) / sizes - np.searchsorted(reference, values, side="right") / n,
+        np.searchsorted(reference, values, side="left") / n - ranks / sizes
+    )
+    statistics = np.full(n_buckets, np.nan)
+    non_empty = counts > 0
+    if len(values):
+        statistics[non_empty] = np.maximum.reduceat(distances[by_bucket], starts[non_empty])
+    return statistics, counts
+
+
+def ks_test(
+    reference: np.ndarray,
+    sample: np.ndarray
+) -> Tuple[float, float]:
+    """
+    Two-sample Kolmogorov-Smirnov test of a sample against a sorted reference (two-sided, with the 
+    p-value of ks_p_value), as the feature-wise tests of TabularDrift.
+
+    Args:
+        reference (np.ndarray): The sorted reference values (see build_reference).
+        sample (np.ndarray): The values of the sample.
+
+    Returns:
+        Tuple[float, float]: The KS statistic (distance) and the p-value (nan for an empty sample).
+    """
+    sample = np.asarray(sample, dtype=np.float64)
+    sample = sample[~np.isnan(sample)]
+    n, m = len(reference), len(sample)
+    if n == 0 or m == 0:
+        return np.nan, np.nan
+    statistics, _ = _ks_statistics(reference, sample, np.zeros(m, dtype=np.intp), 1)
+    distance = statistics[0]
+    return float(distance), float(ks_p_value(distance, n, m))
+
+
+@instrumentation.timed("drift", {"computation": "feature_drift"})
+def feature_drift(
+    reference: Dict[str, np.ndarray],
+    df: pd.DataFrame,
+    p_val: float = 0.05
+) -> pd.DataFrame:
+    """
+    Tests every feature of a reference window for drift in a DataFrame (two-sample KS tests).
+
+    Args:
+        reference (Dict[str, np.ndarray]): The reference window in compact form (see get_reference).
+        df (pd.DataFrame): The data to test, e.g. the predictions.
+        p_val (float, optional): The p-value threshold of a drift. Defaults to 0.05.
+
+    Returns:
+        pd.DataFrame: One row per feature: 'Feature', 'Drift' ('Yes' or 'No'), 'Stat Value' and 'P-Value'.
+    """
+    rows = []
+    for feature, reference_values in reference.items():
+        distance, p_value = ks_test(reference_values, df[feature].to_numpy(dtype=np.float64, na_value=np.nan))
+        rows.append({
+            'Feature': feature, 
+            'Drift': 'Yes' if p_value < p_val else 'No', 
+            'Stat Value': distance, 
+            'P-Value': p_value
+        })
+    return pd.DataFrame(rows, columns=['Feature', 'Drift', 'Stat Value', 'P-Value'])
+
+
+# window sizes of the drift timeline, in nanoseconds
+TIMELINE_FREQUENCIES = {"hour": 3600 * 10 ** 9, "day": 86400 * 10 ** 9, "week": 7 * 86400 * 10 ** 9}
+
+# offset of the weekly windows, so that they start on mondays (1970-01-01 was a thursday)
+_WEEK_OFFSET_NS = 3 * 86400 * 10 ** 9
+
+
+@instrumentation.timed("drift", {"computation": "drift_timeline"})
+def drift_timeline(
+    reference: Dict[str, np.ndarray],
+    df: pd.DataFrame,
+    freq: str = "day",
+    time_column: str = "pickup_datetime",
+    p_val: float = 0.05
+) -> pd.DataFrame:
+    """
+    Tests every feature of a reference window for drift in every hour, day or week of a DataFrame 
+    (two-sample KS tests). All the windows of a feature are tested in one vectorized pass against 
+    the shared sorted reference (see _ks_statistics), so the cost grows with the number of rows, 
+    not with the number of windows.
+
+    Args:
+        reference (Dict[str, np.ndarray]): The reference window in compact form (see get_reference).
+        df (pd.DataFrame): The data to test, e.g. the predictions.
+        freq (str, optional): Size of the windows: "hour", "day" or "week" (starting on monday). Defaults to "day".
+        time_column (str, optional): The column of the time of the rows. Defaults to "pickup_datetime".
+        p_val (float, optional): The p-value threshold of a drift. Defaults to 0.05.
+
+    Returns:
+        pd.DataFrame: 
+            One row per window (with rows) and feature: 'Window' (start time), 'Feature', 'Rows', 
+            'Stat Value', 'P-Value' and 'Drift' ('Yes' or 'No'), sorted by window and feature.
+
+    Raises:
+        ValueError: If freq is unknown.
+    """
+    if freq not in TIMELINE_FREQUENCIES:
+        raise ValueError(f"Unknown frequency {freq}, expected one of {list(TIMELINE_FREQUENCIES)}.")
+    # window of every row: its time in nanoseconds, floored to the window size (integer arithmetic)
+    ns = pd.to_datetime(df[time_column]).to_numpy(dtype="datetime64[ns]").view("i8")
+    valid_times = ns != np.iinfo(np.int64).min
+    size = TIMELINE_FREQUENCIES[freq]
+    offset = _WEEK_OFFSET_NS if freq == "week" else 0
+    windows = (ns[valid_times] + offset) // size
+    window_ids, window_codes = np.unique(windows, return_inverse=True)
+    window_starts = (window_ids * size - offset).astype("datetime64[ns]")
+    n_windows = len(window_ids)
+
+    frames = []
+    for feature, reference_values in reference.items():
+        values = df[feature].to_numpy(dtype=np.float64, na_value=np.nan)[valid_times]
+        valid = ~np.isnan(values)
+        statistics, counts = _ks_statistics(reference_values, values[valid], window_codes[valid], n_windows)
+        n = len(reference_values)
+        p_values = ks_p_value(statistics, n, counts)
+        frames.append(pd.DataFrame({
+            'Window': window_starts,
+            'Feature': feature,
+            'Rows': counts,
+            'Stat Value': statistics,
+            'P-Value': p_values,
+            'Drift': np.where(p_values < p_val, 'Yes', 'No'),
+        }))
+    columns = ['Window', 'Feature', 'Rows', 'Stat Value', 'P-Value', 'Drift']
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    timeline = pd.concat(frames, ignore_index=True)
+    timeline = timeline[timeline['Rows'] > 0]
+    order = {feature: i for i, feature in enumerate(reference)}
+    return timeline.sort_values(
+        ['Window', 'Feature'], key=lambda column: column.map(order) if column.name == 'Feature' else column
+    ).reset_index(drop=True)[columns]
+
+
+def sketch_test(
+    reference: np.ndarray,
+    sketch: "quantile_sketch.KLLSketch",
+    categorical: bool = False
+) -> Tuple[float, float]:
+    """
+    Approximate drift test of a sketched sample against a sorted reference: a chi-square test on the 
+    approximate category counts of the sketch (see quantile_sketch.category_counts) for a categorical 
+    feature, and a two-sample KS test (see quantile_sketch.ks_distance) otherwise.
+
+    Args:
+        reference (np.ndarray): The sorted reference values (see build_reference).
+        sketch (quantile_sketch.KLLSketch): The sketch of the sample.
+        categorical (bool, optional): Whether the feature is categorical. Defaults to False.
+
+    Returns:
+        Tuple[float, float]: The statistic and the p-value (nan for an empty sample).
+    """
+    if len(reference) == 0 or sketch.n == 0:
+        return np.nan, np.nan
+    if categorical:
+        categories, sample_counts = quantile_sketch.category_counts(sketch, np.unique(reference))
+        reference_counts = np.bincount(np.searchsorted(categories, reference), minlength=len(categories))
+        return _chi2_test_counts(np.stack([reference_counts, sample_counts]).astype(np.float64))
+    distance = quantile_sketch.ks_distance(reference, sketch)
+    return distance, float(ks_p_value(distance, len(reference), sketch.n))
+
+
+@instrumentation.timed("drift", {"computation": "sketch_drift"})
+def sketch_drift(
+    reference: Dict[str, np.ndarray],
+    sketches: Dict[str, "quantile_sketch.KLLSketch"],
+    categorical_features: List[str] = CATEGORICAL_FEATURES,
+    p_val: float = 0.05,
+    correction: str = "bh"
+) -> pd.DataFrame:
+    """
+    Tests every feature of a reference window for drift in sketched data, without the raw rows (see 
+    sketch_test): approximate chi-square tests for the categorical features, and approximate two-sample 
+    KS tests for the others (within quantile_sketch.rank_error(k) of the exact statistic), along with 
+    the population stability index over the deciles of the reference. As in full_drift, a drift is 
+    detected where the p-value, corrected for the number of tests (see adjust_p_values), is below p_val.
+
+    Args:
+        reference (Dict[str, np.ndarray]): The reference window in compact form (see get_reference).
+        sketches (Dict[str, quantile_sketch.KLLSketch]): The sketch of every feature (see quantile_sketch.SketchStore.load).
+        categorical_features (List[str], optional): The categorical features. Defaults to CATEGORICAL_FEATURES.
+        p_val (float, optional): The threshold of the corrected p-value of a drift. Defaults to 0.05.
+        correction (str, optional): Multiple testing correction: "bh", "bonferroni" or "none". Defaults to "bh".
+
+    Returns:
+        pd.DataFrame: 
+            One row per sketched feature: 'Feature', 'Test' ('KS' or 'Chi-Square'), 'Drift' ('Yes' or 
+            'No'), 'Stat Value', 'P-Value', 'Adjusted P-Value', 'PSI' and 'Rows' (number of values sketched).
+    """
+    rows = []
+    for feature, reference_values in reference.items():
+        if feature not in sketches:
+            continue
+        sketch = sketches[feature]
+        categorical = feature in categorical_features
+        statistic, p_value = sketch_test(reference_values, sketch, categorical)
+        rows.append({
+            'Feature': feature, 
+            'Test': 'Chi-Square' if categorical else 'KS',
+            'Stat Value': statistic, 
+            'P-Value': p_value,
+            'PSI': quantile_sketch.psi(reference_values, sketch),
+            'Rows': sketch.n
+        })
+    columns = ['Feature', 'Test', 'Drift', 'Stat Value', 'P-Value', 'Adjusted P-Value', 'PSI', 'Rows']
+    results = pd.DataFrame(rows, columns=[column for column in columns if column not in ('Drift', 'Adjusted P-Value')])
+    results['Adjusted P-Value'] = adjust_p_values(results['P-Value'].to_numpy(dtype=np.float64), correction)
+    results['Drift'] = np.where(results['Adjusted P-Value'] < p_val, 'Yes', 'No')
+    return results[columns]
+
+
+@instrumentation.timed("drift", {"computation": "sketch_drift_timeline"})
+def sketch_drift_timeline(
+    reference: Dict[str, np.ndarray],
+    partitions: Dict[pd.Timestamp, Dict[str, "quantile_sketch.KLLSketch"]],
+    freq: str = "day",
+    p_val: float = 0.05
+) -> pd.DataFrame:
+    """
+    Tests every feature of a reference window for drift in every day or week of sketched data 
+    (approximate two-sample KS tests, see sketch_test), as drift_timeline without the raw rows. The 
+    sketches of the partitions of a window are merged, so the windows must not be smaller than the 
+    partitions.
+
+    Args:
+        reference (Dict[str, np.ndarray]): The reference window in compact form (see get_reference).
+        partitions (Dict[pd.Timestamp, Dict[str, quantile_sketch.KLLSketch]]): 
+            The sketches of every partition, by start of the partition (see quantile_sketch.SketchStore.load_partitions).
+        freq (str, optional): Size of the windows: "hour", "day" or "week" (starting on monday). Defaults to "day".
+        p_val (float, optional): The p-value threshold of a drift. Defaults to 0.05.
+
+    Returns:
+        pd.DataFrame: 
+            One row per window (with rows) and feature: 'Window' (start time), 'Feature', 'Rows', 
+            'Stat Value', 'P-Value' and 'Drift' ('Yes' or 'No'), sorted by window and feature.
+
+    Raises:
+        ValueError: If freq is unknown.
+    """
+    if freq not in TIMELINE_FREQUENCIES:
+        raise ValueError(f"Unknown frequency {freq}, expected one of {list(TIMELINE_FREQUENCIES)}.")
+    size = TIMELINE_FREQUENCIES[freq]
+    offset = _WEEK_OFFSET_NS if freq == "week" else 0
+    # merge the sketches of the partitions of every window (into new sketches, the partitions are unchanged)
+    windows = {}
+    for partition_start in sorted(partitions):
+        window_start = pd.Timestamp((partition_start.value + offset) // size * size - offset)
+        window = windows.setdefault(window_start, {})
+        for feature, sketch in partitions[partition_start].items():
+            window.setdefault(feature, quantile_sketch.KLLSketch(sketch.k)).merge(sketch)
+
+    rows = []
+    for window_start, sketches in windows.items():
+        for feature, reference_values in reference.items():
+            if feature not in sketches or sketches[feature].n == 0:
+                continue
+            distance, p_value = sketch_test(reference_values, sketches[feature])
+            rows.append({
+                'Window': window_start,
+                'Feature': feature,
+                'Rows': sketches[feature].n,
+                'Stat Value': distance,
+                'P-Value': p_value,
+                'Drift': 'Yes' if p_value < p_val else 'No',
+            })
+    return pd.DataFrame(rows, columns=['Window', 'Feature', 'Rows', 'Stat Value', 'P-Value', 'Drift'])
+
+
+def chi2_sf(
+    x: float,
+    df: int
+) -> float:
+    """
+    Returns the survival function of the chi-square distribution, i.e. the regularized upper 
+    incomplete gamma function Q(df / 2, x / 2) (series below a + 1, continued fraction above).
+
+    Args:
+        x (float): The chi-square statistic.
+        df (int): The degrees of freedom.
+
+    Returns:
+        float: P(X > x).
+    """
+    a, x = df / 2, x / 2
+    if x <= 0:
+        return 1.0
+    log_prefactor = a * math.log(x) - x - math.lgamma(a)
+    if x < a + 1:
+        term = total = 1 / a
+        n = a
+        while abs(term) > abs(total) * 1e-15:
+            n += 1
+            term *= x / n
+            total += term
+        return max(0.0, 1 - total * math.exp(log_prefactor))
+    # modified Lentz continued fraction
+    tiny = 1e-300
+    b = x + 1 - a
+    c, d = 1 / tiny, 1 / b
+    h = d
+    for i in range(1, 1000):
+        an = -i * (i - a)
+        b += 2
+        d = an * d + b
+        d = tiny if abs(d) < tiny else d
+        c = b + an / c
+        c = tiny if abs(c) < tiny else c
+        d = 1 / d
+        delta = d * c
+        h *= delta
+        if abs(delta - 1) < 1e-15:
+            break
+    return min(1.0, math.exp(log_prefactor) * h)
+
+
+def chi2_test(
+    reference: np.ndarray,
+    sample: np.ndarray
+) -> Tuple[float, float]:
+    """
+    Chi-square test of homogeneity of the categories of a sample and of a reference (2 x K contingency 
+    table of the category counts, K - 1 degrees of freedom).
+
+    Args:
+        reference (np.ndarray): The reference values (no missing values).
+        sample (np.ndarray): The values of the sample (no missing values).
+
+    Returns:
+        Tuple[float, float]: The chi-square statistic and the p-value (nan for an empty sample).
+    """
+    if len(reference) == 0 or len(sample) == 0:
+        return np.nan, np.nan
+    categories = np.union1d(np.unique(reference), np.unique(sample))
+    counts = np.stack([
+        np.bincount(np.searchsorted(categories, values), minlength=len(categories))
+        for values in (reference, sample)
+    ]).astype(np.float64)
+    return _chi2_test_counts(counts)
+
+
+def _chi2_test_counts(
+    counts: np.ndarray
+) -> Tuple[float, float]:
+    """ Returns the chi-square statistic and the p-value of a 2 x K contingency table of category counts """
+    if counts.shape[1] < 2:
+        return 0.0, 1.0
+    expected = counts.sum(axis=1, keepdims=True) * counts.sum(axis=0, keepdims=True) / counts.sum()
+    statistic = float(np.sum((counts - expected) ** 2 / expected))
+    return statistic, chi2_sf(statistic, counts.shape[1] - 1)
+
+
+def adjust_p_values(
+    p_values: np.ndarray,
+    method: str = "bh"
+) -> np.ndarray:
+    """
+    Corrects the p-values of several tests for multiple testing, vectorized.
+
+    Args:
+        p_values (np.ndarray): The p-values (missing values are left out of the correction).
+        method (str, optional): 
+            "bh" (Benjamini-Hochberg, controls the false discovery rate), "bonferroni" (controls the 
+            family-wise error rate), or "none". Defaults to "bh".
+
+    Returns:
+        np.ndarray: The adjusted p-values (nan where the p-value is missing).
+
+    Raises:
+        ValueError: If the method is unknown.
+    """
+    p_values = np.asarray(p_values, dtype=np.float64)
+    adjusted = np.full(p_values.shape, np.nan)
+    valid = ~np.isnan(p_values)
+    m = int(valid.sum())
+    if method == "none":
+        adjusted[valid] = p_values[valid]
+    elif method == "bonferroni":
+        adjusted[valid] = np.minimum(p_values[valid] * m, 1.0)
+    elif method == "bh":
+        order = np.argsort(p_values[valid])
+        scaled = p_values[valid][order] * m / np.arange(1, m + 1)
+        # the adjusted p-value of a rank is the smallest scaled p-value of that rank or above
+        scaled = np.minimum.accumulate(scaled[::-1])[::-1]
+        values = np.empty(m)
+        values[order] = np.minimum(scaled, 1.0)
+        adjusted[valid] = values
+    else:
+        raise ValueError(f"Unknown correction method {method}, expected 'bh', 'bonferroni' or 'none'.")
+    return adjusted
+
+
+def _drift_test(
+    reference: np.ndarray,
+    sample: np.ndarray,
+    categorical: bool
+) -> Tuple[float, float]:
+    """ Returns the statistic and the p-value of the drift test of one feature (chi-square or KS) """
+    return chi2_test(reference, sample) if categorical else ks_test(reference, sample)
+
+
+def _drift_test_shared(
+    buffer_dir: str,
+    index: int,
+    categorical: bool
+) -> Tuple[float, float]:
+    """
+    Worker of full_drift: tests one feature, whose sorted reference and sample values are memory-mapped 
+    from buffer_dir (reference_<index>.npy and sample_<index>.npy).
+    """
+    reference = np.load(os.path.join(buffer_dir, f"reference_{index}.npy"), mmap_mode="r")
+    sample = np.load(os.path.join(buffer_dir, f"sample_{index}.npy"), mmap_mode="r")
+    return _drift_test(reference, sample, categorical)
+
+
+@instrumentation.timed("drift", {"computation": "full_drift"})
+def full_drift(
+    reference: Dict[str, np.ndarray],
+    df: pd.DataFrame,
+    categorical_features: List[str] = CATEGORICAL_FEATURES,
+    p_val: float = 0.05,
+    correction: str = "bh",
+    n_workers: int = None
+) -> pd.DataFrame:
+    """
+    Tests every feature of a reference window for drift in a DataFrame, with the test of its type: 
+    chi-square tests for the categorical features, and two-sample KS tests for the others. A drift is 
+    detected where the p-value, corrected for the number of tests (see adjust_p_values), is below p_val.
+
+    The features are tested in parallel on a pool of n_workers processes. The values are not pickled: 
+    they are exchanged through memory-mapped buffers (in shared memory, /dev/shm, where available), as 
+    in feature_pipeline.engineer_features_parallel. Small samples are tested serially.
+
+    Args:
+        reference (Dict[str, np.ndarray]): The reference window in compact form (see get_reference, e.g. with DRIFT_FEATURES).
+        df (pd.DataFrame): The data to test, e.g. the predictions.
+        categorical_features (List[str], optional): The categorical features. Defaults to CATEGORICAL_FEATURES.
+        p_val (float, optional): The threshold of the corrected p-value of a drift. Defaults to 0.05.
+        correction (str, optional): Multiple testing correction: "bh", "bonferroni" or "none". Defaults to "bh".
+        n_workers (int, optional): Number of worker processes. Defaults to the number of CPUs.
+
+    Returns:
+        pd.DataFrame: 
+            One row per feature: 'Feature', 'Test' ('KS' or 'Chi-Square'), 'Drift' ('Yes' or 'No'), 
+            'Stat Value', 'P-Value' and 'Adjusted P-Value'.
+
+    Raises:
+        ValueError: If n_workers is not a positive integer.
+    """
+    n_workers = os.cpu_count() if n_workers is None else n_workers
+    if n_workers < 1:
+        raise ValueError("n_workers must be a positive integer.")
+    features = list(reference)
+    categorical = [feature in categorical_features for feature in features]
+    samples = []
+    for feature in features:
+        values = df[feature].to_numpy(dtype=np.float64, na_value=np.nan)
+        samples.append(values[~np.isnan(values)])
+
+    n_rows = sum(len(sample) for sample in samples)
+    if n_workers == 1 or len(features) < 2 or n_rows < MIN_ROWS_PARALLEL_DRIFT:
+        results = [_drift_test(reference[feature], sample, is_categorical) for feature, sample, is_categorical in zip(features, samples, categorical)]
+    else:
+        shm_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+        with tempfile.TemporaryDirectory(dir=shm_dir) as buffer_dir:
+            # write the values to memory-mapped buffers, one pair per feature
+            for index, feature in enumerate(features):
+                for name, values in (("reference", reference[feature]), ("sample", samples[index])):
+                    buffer = np.lib.format.open_memmap(
+                        os.path.join(buffer_dir, f"{name}_{index}.npy"), mode="w+", dtype=np.float64, shape=values.shape
+                    )
+                    buffer[:] = values
+                    buffer.flush()
+                    del buffer
+            # test the features in parallel, the largest first (to balance the workers)
+            order = sorted(range(len(features)), key=lambda index: -len(samples[index]))
+            with ProcessPoolExecutor(max_workers=min(n_workers, len(features))) as executor:
+                futures = {index: executor.submit(_drift_test_shared, buffer_dir, index, categorical[index]) for index in order}
+                results = [futures[index].result() for index in range(len(features))]
+
+    statistics = np.array([statistic for statistic, _ in results], dtype=np.float64)
+    p_values = np.array([p_value for _, p_value in results], dtype=np.float64)
+    adjusted = adjust_p_values(p_values, correction)
+    return pd.DataFrame({
+        'Feature': features,
+        'Test': np.where(categorical, 'Chi-Square', 'KS'),
+        'Drift': np.where(adjusted < p_val, 'Yes', 'No'),
+        'Stat Value': statistics,
+        'P-Value': p_values,
+        'Adjusted P-Value': adjusted,
+    }, columns=['Feature', 'Test', 'Drift', 'Stat Value', 'P-Value', 'Adjusted P-Value'])
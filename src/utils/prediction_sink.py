@@ -0,0 +1,341 @@
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import atexit
+from config import config
+import fcntl
+import json
+import pandas as pd
+from pathlib import Path
+from src.utils import instrumentation
+import threading
+import time
+from typing import Any, Callable
+
+
+# directory of the local durable spools of the prediction rows not yet written to the 'predictions' 
+# feature group (one spool per producer, see get_spool_path)
+SPOOL_DIR = Path(config.DATA_DIR)
+
+# process-wide sink (see get_prediction_sink)
+_prediction_sink = None
+_prediction_sink_lock = threading.Lock()
+
+
+def get_spool_path(
+    producer: str
+) -> Path:
+    """
+    Returns the spool file of a producer of predictions (e.g. "app"), 
+    so that the producers running in different processes never share a spool.
+
+    Args:
+        producer (str): Name of the producer.
+
+    Returns:
+        Path: The spool file (<SPOOL_DIR>/predictions_spool.<producer>.jsonl).
+    """
+    return Path(SPOOL_DIR, f"predictions_spool.{producer}.jsonl")
+
+
+def _json_default(value: Any) -> Any:
+    """ Converts the NumPy scalars of a DataFrame row to JSON values """
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+class PredictionSink(object):
+    """
+    Write-behind sink of prediction rows for a feature group.
+
+    Rows are appended to a local spool file (append-only JSON lines, each write synced to disk) and
+    append returns as soon as they are spooled. A background thread inserts the spooled rows into the
+    feature group in batches, once max_batch_rows rows are pending or the oldest pending row is
+    max_delay_seconds old (failed inserts are retried after max_delay_seconds). The byte offset of
+    the rows already inserted is committed (atomically) next to the spool after every insert, so
+    that the rows spooled but not inserted are replayed when the sink is created again, e.g. after
+    a crash or a restart. Delivery is at least once: rows inserted right before a crash (before
+    their offset was committed) are inserted again.
+
+    A spool belongs to one sink at a time: the sink holds an exclusive lock (flock) of
+    <spool_path>.lock until it is closed, and creating a second sink of the same spool, in any
+    process, fails. Every producer has its own spool (see get_spool_path).
+
+    Attributes
+    ----------
+    spool_path : Path
+        The spool file (the committed offset is in <spool_path>.offset).
+    max_batch_rows : int
+        Number of pending rows that triggers an insert.
+    max_delay_seconds : float
+        Maximum time a row is pending before an insert is triggered.
+    stats : dict
+        Number of rows 'spooled' and 'inserted', number of 'inserts' and 'failed_inserts', and the
+        'last_error'.
+
+    Methods
+    -------
+    append(df):
+        Spools the rows of a DataFrame.
+    flush():
+        Inserts all the pending rows into the feature group.
+    close(flush=True):
+        Stops the background thread (and inserts the pending rows).
+    """
+    def __init__(
+        self,
+        get_feature_group: Callable[[], Any],
+        spool_path: Path = None,
+        max_batch_rows: int = 100,
+        max_delay_seconds: float = 30.0,
+        producer: str = "app"
+    ):
+        """ Lock and recover the spool (replaying its pending rows), and start the background thread """
+        if max_batch_rows < 1:
+            raise ValueError("max_batch_rows must be a positive integer.")
+        self.get_feature_group = get_feature_group
+        self.spool_path = Path(spool_path or get_spool_path(producer))
+        self.max_batch_rows = max_batch_rows
+        self.max_delay_seconds = max_delay_seconds
+        self.stats = {"spooled": 0, "inserted": 0, "inserts": 0, "failed_inserts": 0, "last_error": None}
+        self._offset_path = Path(str(self.spool_path) + ".offset")
+        self._feature_group = None
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._closing = False
+        self._retry_at = None
+
+        self._lock_file = self._lock_spool()
+        try:
+            self._recover()
+        except Exception:
+            self._lock_file.close()
+            raise
+        # rows left by a previous process are replayed at once
+        self._oldest = time.monotonic() - self.max_delay_seconds if self._pending else None
+        self._thread = threading.Thread(target=self._run, name="prediction-sink", daemon=True)
+        self._thread.start()
+
+    def _write_offset(
+        self,
+        offset: int
+    ) -> None:
+        """ Commits the offset of the rows already inserted (atomically) """
+        temp_path = Path(str(self._offset_path) + ".tmp")
+        with open(temp_path, "w") as f:
+            f.write(str(offset))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self._offset_path)
+
+    def _lock_spool(self) -> Any:
+        """ Takes the exclusive lock of the spool (held until the sink is closed), and returns the open lock file """
+        os.makedirs(self.spool_path.parent, exist_ok=True)
+        lock_file = open(Path(str(self.spool_path) + ".lock"), "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            raise RuntimeError(f"The spool {self.spool_path} is used by another prediction sink.")
+        return lock_file
+
+    def _recover(self) -> None:
+        """ Finds the pending rows of the spool, and drops a row torn by a crash in the middle of a write """
+        os.makedirs(self.spool_path.parent, exist_ok=True)
+        with open(self.spool_path, "ab"):
+            pass
+        size = os.path.getsize(self.spool_path)
+        try:
+            with open(self._offset_path) as f:
+                offset = int(f.read().strip() or 0)
+        except FileNotFoundError:
+            offset = 0
+        if offset > size:
+            # the spool was emptied after all its rows were inserted
+            offset = 0
+            self._write_offset(offset)
+
+        with open(self.spool_path, "rb+") as f:
+            f.seek(offset)
+            data = f.read()
+            end = offset + data.rfind(b"\n") + 1
+            if end < size:
+                f.truncate(end)
+        self._offset = offset
+        self._end = end
+        self._pending = data[:end - offset].count(b"\n")
+
+    def append(
+        self,
+        df: pd.DataFrame
+    ) -> None:
+        """
+        Spools the rows of a DataFrame (returns once they are synced to disk).
+
+        Args:
+            df (pd.DataFrame): Prediction rows, with the columns of the feature group.
+
+        Returns:
+            None
+
+        Raises:
+            ValueError: If the sink is closed.
+        """
+        dtypes = {column: str(dtype) for column, dtype in df.dtypes.items()}
+        lines = b"".join(
+            (json.dumps({"values": row, "dtypes": dtypes}, default=_json_default) + "\n").encode("utf-8")
+            for row in df.to_dict(orient="records")
+        )
+        with self._condition:
+            if self._closing:
+                raise ValueError("The prediction sink is closed.")
+            with open(self.spool_path, "ab") as f:
+                f.write(lines)
+                f.flush()
+                os.fsync(f.fileno())
+            self._end += len(lines)
+            if not self._pending:
+                self._oldest = time.monotonic()
+            self._pending += len(df)
+            self.stats["spooled"] += len(df)
+            self._condition.notify()
+
+    def flush(self) -> int:
+        """
+        Inserts all the pending rows into the feature group (in one insert).
+
+        Returns:
+            int: Number of rows inserted.
+
+        Raises:
+            Exception: If the insert fails (the rows stay pending).
+        """
+        with self._flush_lock:
+            with self._lock:
+                start, end = self._offset, self._end
+            if start == end:
+                return 0
+            with open(self.spool_path, "rb") as f:
+                f.seek(start)
+                records = [json.loads(line) for line in f.read(end - start).splitlines()]
+            df = pd.DataFrame([record["values"] for record in records]).astype(records[0]["dtypes"])
+
+            if self._feature_group is None:
+                self._feature_group = self.get_feature_group()
+            labels = {"feature_group": getattr(self._feature_group, "name", "predictions")}
+            with instrumentation.timer("feature_group_insert", labels):
+                self._feature_group.insert(df)
+            instrumentation.increment("feature_group_insert_rows_total", len(df), labels)
+
+            with self._lock:
+                self._offset = end
+                self._pending -= len(records)
+                self._oldest = time.monotonic() if self._pending else None
+                if self._offset == self._end:
+                    # every spooled row is inserted: empty the spool (recovery handles a crash in between)
+                    with open(self.spool_path, "wb"):
+                        pass
+                    self._offset = self._end = 0
+                self._write_offset(self._offset)
+                self.stats["inserted"] += len(records)
+                self.stats["inserts"] += 1
+            return len(records)
+
+    def _seconds_until_due(self) -> float:
+        """ Returns the time until the pending rows must be inserted (None if there are none), with the lock held """
+        if not self._pending:
+            return None
+        due = self._oldest + self.max_delay_seconds
+        if self._pending >= self.max_batch_rows:
+            due = time.monotonic()
+        if self._retry_at is not None:
+            due = max(due, self._retry_at)
+        return max(0.0, due - time.monotonic())
+
+    def _run(self) -> None:
+        """ Inserts the pending rows whenever they are due, until the sink is closed """
+        while True:
+            with self._condition:
+                while not self._closing:
+                    timeout = self._seconds_until_due()
+                    if timeout == 0:
+                        break
+                    self._condition.wait(timeout)
+                if self._closing:
+                    return
+            try:
+                self.flush()
+                self._retry_at = None
+            except Exception as e:
+                self.stats["failed_inserts"] += 1
+                self.stats["last_error"] = str(e)
+                self._retry_at = time.monotonic() + self.max_delay_seconds
+                print(f"Error inserting predictions into the feature store (will retry): {e}")
+
+    @property
+    def pending_rows(self) -> int:
+        """ Number of rows spooled but not inserted yet """
+        with self._lock:
+            return self._pending
+
+    def close(
+        self,
+        flush: bool = True
+    ) -> None:
+        """
+        Stops the background thread, and inserts the pending rows (rows that can not be inserted stay in
+        the spool, and are replayed by the next sink). The lock of the spool is released.
+
+        Args:
+            flush (bool): Whether to insert the pending rows before returning.
+
+        Returns:
+            None
+        """
+        with self._condition:
+            self._closing = True
+            self._condition.notify()
+        self._thread.join()
+        try:
+            if flush:
+                self.flush()
+        finally:
+            # the next sink of the spool (in any process) can take it over
+            self._lock_file.close()
+
+
+def get_prediction_sink(
+    get_feature_group: Callable[[], Any],
+    **kwargs
+) -> PredictionSink:
+    """
+    Returns the process-wide prediction sink (shared, e.g., by all the Streamlit sessions), creating
+    it on first use. Its pending rows are inserted when the process exits.
+
+    Args:
+        get_feature_group (Callable):
+            Function returning the 'predictions' feature group (called once, on the first insert).
+        **kwargs: Other arguments of PredictionSink (used when the sink is created).
+
+    Returns:
+        PredictionSink: The sink.
+    """
+    global _prediction_sink
+    with _prediction_sink_lock:
+        if _prediction_sink is None:
+            _prediction_sink = PredictionSink(get_feature_group, **kwargs)
+            atexit.register(_close_prediction_sink, _prediction_sink)
+        return _prediction_sink
+
+
+def _close_prediction_sink(
+    sink: PredictionSink
+) -> None:
+    """ Inserts the pending rows of a sink at exit (they are replayed on restart otherwise) """
+    try:
+        sink.close(flush=True)
+    except Exception as e:
+        print(f"Error inserting predictions into the feature store at exit (spooled for replay): {e}")
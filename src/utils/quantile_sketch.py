@@ -0,0 +1,708 @@
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from config import config
+import fcntl
+import json
+import numpy as np
+import pandas as pd
+from pathlib import Path
+import shutil
+import tempfile
+from typing import Any, Dict, List, Tuple
+
+
+# Mergeable streaming quantile sketches (KLL, Karnin, Lang and Liberty 2016) of the monitored features.
+# Every producer of predictions (app.py, automated_data_generation, the prediction service) updates
+# the sketches of the time partitions of its rows, persisted in SKETCH_DIR and shared through a dataset
+# of the Hopsworks project (the producers and the monitoring run on different machines, and the runner
+# of automated_data_generation is fresh on every run), and the monitoring merges the sketches of a time
+# range to test it for drift without scanning the raw predictions.
+#
+# Error guarantee: the normalized rank error of a sketch of size parameter k, i.e.
+# |rank(x) - true rank(x)| / n, is at most rank_error(k) with 99% confidence (the empirical bounds of
+# the Apache DataSketches KLL sketch: 1.33% for a single rank, 1.65% for all ranks at once, at k=200).
+# It does not depend on the number of values n, and holds after any number of merges.
+#
+# Memory: a sketch keeps at most about 3k values (4.8 kB of float64 values per feature at k=200),
+# whatever the number of values seen.
+
+
+# directory of the persisted sketches (see SketchStore)
+SKETCH_DIR = Path(config.DATA_DIR, "sketches")
+
+# dataset directory of the shared sketches in the project (see SketchStore)
+REMOTE_SKETCH_DIR = "Resources"
+
+# producers of the sketches (one file per producer and partition)
+PRODUCERS = ["app", "automated_data_generation", "prediction_service"]
+
+# default size parameter of the sketches
+DEFAULT_K = 200
+
+# decay of the capacity of the levels below the top level
+_CAPACITY_DECAY = 2 / 3
+
+# sizes of the time partitions of SketchStore, and the format of their names
+PARTITION_FREQUENCIES = {"hour": ("H", "%Y-%m-%dT%H"), "day": ("D", "%Y-%m-%d")}
+
+
+def rank_error(
+    k: int,
+    all_ranks: bool = True
+) -> float:
+    """
+    Returns the normalized rank error bound (99% confidence) of a sketch of size parameter k.
+
+    Args:
+        k (int): Size parameter of the sketch.
+        all_ranks (bool, optional):
+            Bound of all the ranks at once (e.g. of a KS statistic), or of a single rank. Defaults to True.
+
+    Returns:
+        float: The bound, as a fraction of the number of values.
+    """
+    if all_ranks:
+        return 2.446 / k ** 0.9433
+    return 2.296 / k ** 0.9723
+
+
+class KLLSketch(object):
+    """
+    KLL quantile sketch of a stream of values.
+
+    Values are kept in levels of compactors: a value of level h stands for 2^h values of the stream.
+    When the sketch holds more values than its total capacity, the lowest full level is sorted, and
+    every other value (from a random offset) is promoted to the next level, the others are dropped.
+    The capacity decays by 2/3 per level below the top level (at least 8), so the sketch keeps at
+    most 3k + 8 * (number of levels) values, the number of levels growing with log2(n / k).
+
+    Attributes
+    ----------
+    k : int
+        Size parameter (capacity of the top level).
+    n : int
+        Number of values seen (missing values are skipped).
+    levels : list
+        The values of every level (np.ndarray), level 0 first.
+    min_value : float
+        Smallest value seen (nan before the first value).
+    max_value : float
+        Largest value seen (nan before the first value).
+
+    Methods
+    -------
+    update(values):
+        Adds values to the sketch.
+    merge(other):
+        Adds the values of another sketch.
+    quantile(q):
+        Returns the approximate quantiles q.
+    cdf(x):
+        Returns the approximate fraction of the values at most x.
+    to_arrays():
+        Returns the sketch as a dictionary of arrays (see from_arrays).
+    """
+    def __init__(
+        self,
+        k: int = DEFAULT_K,
+        seed: int = None
+    ):
+        """ Set the size parameter and the random generator of the compactions """
+        if k < 8:
+            raise ValueError("k must be at least 8.")
+        self.k = int(k)
+        self.n = 0
+        self.levels = [np.empty(0, dtype=np.float64)]
+        self.min_value = np.nan
+        self.max_value = np.nan
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(
+        self,
+        level: int
+    ) -> int:
+        """ Returns the capacity of a level """
+        depth = len(self.levels) - 1 - level
+        return max(8, int(np.ceil(self.k * _CAPACITY_DECAY ** depth)))
+
+    def _compress(self) -> None:
+        """
+        Compacts levels until the sketch is within its total capacity (lazily: the lowest level at or
+        above its own capacity is compacted, the other levels may stay above theirs)
+        """
+        while len(self) > sum(self._capacity(level) for level in range(len(self.levels))):
+            level = next(level for level, items in enumerate(self.levels) if len(items) >= self._capacity(level))
+            if level + 1 == len(self.levels):
+                self.levels.append(np.empty(0, dtype=np.float64))
+            items = np.sort(self.levels[level])
+            # an odd value out stays in the level
+            kept = items[:1] if len(items) % 2 else items[:0]
+            items = items[len(kept):]
+            promoted = items[int(self._rng.integers(2))::2]
+            self.levels[level] = kept
+            self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+
+    def update(
+        self,
+        values: np.ndarray
+    ) -> "KLLSketch":
+        """
+        Adds values to the sketch (vectorized: all the values are added, then compacted together).
+
+        Args:
+            values (np.ndarray): The values (missing values are skipped).
+
+        Returns:
+            KLLSketch: The sketch.
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return self
+        self.n += len(values)
+        self.min_value = np.nanmin([self.min_value, values.min()])
+        self.max_value = np.nanmax([self.max_value, values.max()])
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+        return self
+
+    def merge(
+        self,
+        other: "KLLSketch"
+    ) -> "KLLSketch":
+        """
+        Adds the values of another sketch (with the same size parameter).
+
+        Args:
+            other (KLLSketch): The other sketch (unchanged).
+
+        Returns:
+            KLLSketch: The sketch.
+
+        Raises:
+            ValueError: If the size parameters differ.
+        """
+        if other.k != self.k:
+            raise ValueError(f"Can not merge sketches of size parameters {self.k} and {other.k}.")
+        if other.n == 0:
+            return self
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0, dtype=np.float64))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        self.min_value = np.nanmin([self.min_value, other.min_value])
+        self.max_value = np.nanmax([self.max_value, other.max_value])
+        self._compress()
+        return self
+
+    def __len__(self) -> int:
+        """ Returns the number of values kept """
+        return sum(len(items) for items in self.levels)
+
+    def _weighted_items(self) -> Tuple[np.ndarray, np.ndarray]:
+        """ Returns the distinct values kept, sorted, and their cumulative weights """
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(values), 2 ** level, dtype=np.int64) for level, values in enumerate(self.levels)])
+        order = np.argsort(items, kind="stable")
+        items, cumulative = items[order], np.cumsum(weights[order])
+        # the last position of every distinct value
+        last = np.append(items[1:] != items[:-1], True)
+        return items[last], cumulative[last]
+
+    def cdf(
+        self,
+        x: np.ndarray
+    ) -> np.ndarray:
+        """
+        Returns the approximate fraction of the values at most x (within rank_error(k) of the exact fraction).
+
+        Args:
+            x (np.ndarray): The points.
+
+        Returns:
+            np.ndarray: The fractions (nan for an empty sketch).
+        """
+        x = np.asarray(x, dtype=np.float64)
+        if self.n == 0:
+            return np.full(x.shape, np.nan)
+        items, cumulative = self._weighted_items()
+        positions = np.searchsorted(items, x, side="right")
+        return np.concatenate([[0], cumulative])[positions] / cumulative[-1]
+
+    def quantile(
+        self,
+        q: np.ndarray
+    ) -> np.ndarray:
+        """
+        Returns the approximate quantiles q (values whose normalized rank is within rank_error(k) of q).
+
+        Args:
+            q (np.ndarray): The quantiles, between 0 and 1.
+
+        Returns:
+            np.ndarray: The values (nan for an empty sketch).
+
+        Raises:
+            ValueError: If a quantile is not between 0 and 1.
+        """
+        q = np.asarray(q, dtype=np.float64)
+        if np.any((q < 0) | (q > 1)):
+            raise ValueError("Quantiles must be between 0 and 1.")
+        if self.n == 0:
+            return np.full(q.shape, np.nan)
+        items, cumulative = self._weighted_items()
+        positions = np.searchsorted(cumulative, q * cumulative[-1], side="left")
+        values = items[np.minimum(positions, len(items) - 1)]
+        # the extremes are exact
+        return np.where(q == 0, self.min_value, np.where(q == 1, self.max_value, values))
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """
+        Returns the sketch as arrays (e.g. for np.savez).
+
+        Returns:
+            Dict[str, np.ndarray]: 'meta' (k, n, min and max value), and the values of every level ('level_<h>').
+        """
+        arrays = {"meta": np.array([self.k, self.n, self.min_value, self.max_value], dtype=np.float64)}
+        for level, items in enumerate(self.levels):
+            arrays[f"level_{level}"] = items
+        return arrays
+
+    @classmethod
+    def from_arrays(
+        cls,
+        arrays: Dict[str, np.ndarray],
+        seed: int = None
+    ) -> "KLLSketch":
+        """
+        Returns the sketch of to_arrays.
+
+        Args:
+            arrays (Dict[str, np.ndarray]): The arrays of to_arrays.
+            seed (int, optional): Seed of the random generator of the later compactions.
+
+        Returns:
+            KLLSketch: The sketch.
+        """
+        k, n, min_value, max_value = arrays["meta"]
+        sketch = cls(int(k), seed=seed)
+        sketch.n = int(n)
+        sketch.min_value, sketch.max_value = float(min_value), float(max_value)
+        n_levels = sum(1 for name in arrays if name.startswith("level_"))
+        sketch.levels = [np.asarray(arrays[f"level_{level}"], dtype=np.float64) for level in range(n_levels)]
+        return sketch
+
+
+def ks_distance(
+    reference: np.ndarray,
+    sketch: KLLSketch
+) -> float:
+    """
+    Returns the approximate two-sample KS statistic of a sketched sample against a sorted reference.
+
+    The CDF of the sketch only steps at its values, so the largest distance to the reference CDF is
+    reached at those values (as in monitoring_utils._ks_statistics). As the CDF of the sketch is within
+    rank_error(k) of the CDF of the sample everywhere, so is the statistic of the exact statistic.
+
+    Args:
+        reference (np.ndarray): The sorted reference values (see monitoring_utils.build_reference).
+        sketch (KLLSketch): The sketch of the sample.
+
+    Returns:
+        float: The statistic (nan if the reference or the sketch is empty).
+    """
+    if len(reference) == 0 or sketch.n == 0:
+        return np.nan
+    items, cumulative = sketch._weighted_items()
+    right = cumulative / cumulative[-1]
+    left = np.concatenate([[0], right[:-1]])
+    n = len(reference)
+    distances = np.maximum(
+        right - np.searchsorted(reference, items, side="right") / n,
+        np.searchsorted(reference, items, side="left") / n - left
+    )
+    return float(distances.max())
+
+
+def category_counts(
+    sketch: KLLSketch,
+    categories: np.ndarray = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the approximate number of values of every category of a sketched categorical sample (e.g.
+    for a chi-square test). The count of a category is within 2 * rank_error(k) * n of the exact count.
+
+    Args:
+        sketch (KLLSketch): The sketch of the sample.
+        categories (np.ndarray, optional): Categories counted besides those kept by the sketch (e.g. those of a reference).
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The sorted categories, and their approximate counts.
+    """
+    items = np.empty(0, dtype=np.float64)
+    counts = np.empty(0, dtype=np.float64)
+    if sketch.n > 0:
+        items, cumulative = sketch._weighted_items()
+        counts = np.diff(np.concatenate([[0], cumulative])) * sketch.n / cumulative[-1]
+    all_categories = items if categories is None else np.union1d(np.asarray(categories, dtype=np.float64), items)
+    all_counts = np.zeros(len(all_categories))
+    all_counts[np.searchsorted(all_categories, items)] = counts
+    return all_categories, all_counts
+
+
+def psi(
+    reference: np.ndarray,
+    sketch: KLLSketch,
+    n_bins: int = 10,
+    min_fraction: float = 1e-4
+) -> float:
+    """
+    Returns the population stability index of a sketched sample against a sorted reference, over the
+    quantile bins of the reference (deciles by default). The fraction of the sample in every bin is
+    within 2 * rank_error(k) of the exact fraction.
+
+    Args:
+        reference (np.ndarray): The sorted reference values (see monitoring_utils.build_reference).
+        sketch (KLLSketch): The sketch of the sample.
+        n_bins (int, optional): Number of quantile bins of the reference. Defaults to 10.
+        min_fraction (float, optional): Floor of the fractions of a bin (avoids log(0)). Defaults to 1e-4.
+
+    Returns:
+        float: The index (nan if the reference or the sketch is empty).
+    """
+    if len(reference) == 0 or sketch.n == 0:
+        return np.nan
+    # inner edges of the bins (ties of the reference merge bins)
+    edges = np.unique(np.quantile(reference, np.arange(1, n_bins) / n_bins))
+    reference_cdf = np.concatenate([[0], np.searchsorted(reference, edges, side="right") / len(reference), [1]])
+    sample_cdf = np.concatenate([[0], sketch.cdf(edges), [1]])
+    expected = np.maximum(np.diff(reference_cdf), min_fraction)
+    actual = np.maximum(np.diff(sample_cdf), min_fraction)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+
+class SketchStore(object):
+    """
+    Sketches of features persisted per time partition (an hour or a day) and per producer:
+    <root>/<partition>/<producer>.npz, with one KLLSketch per feature.
+
+    A producer updates the sketches of the partitions of its rows (read, merged and written back under
+    an exclusive file lock, so that threads and processes of the same producer do not lose updates),
+    and the monitoring merges all the sketches of a time range.
+
+    With a dataset api (see hopsworks_utils.FeatureStoreConnection.get_dataset_api), the sketches are 
+    shared through the project: every update uploads the updated files (<remote_dir>/sketches_<partition>_
+    <producer>.npz), and a partition missing locally, e.g. on a fresh runner, is downloaded before it is 
+    updated. Every producer lists its partitions in <remote_dir>/sketches_<producer>.json, from which 
+    the monitoring downloads them (see sync). A producer must run on one machine at a time (as the 
+    scheduled automated_data_generation and the app), or else use a name of its own.
+
+    Attributes
+    ----------
+    root : Path
+        Directory of the partitions.
+    freq : str
+        Size of the partitions: "hour" or "day".
+    k : int
+        Size parameter of new sketches.
+    dataset_api : hopsworks.core.dataset_api.DatasetApi
+        Dataset api of the project sharing the sketches, or None (local sketches only).
+    remote_dir : str
+        Dataset directory of the shared sketches.
+
+    Methods
+    -------
+    update(df, producer, features, time_column='pickup_datetime'):
+        Adds the values of the rows of a DataFrame to the sketches of their partitions.
+    sync(producers=PRODUCERS, start=None, end=None):
+        Downloads the shared sketches of the partitions in a time range.
+    partitions(start=None, end=None):
+        Returns the names of the partitions in a time range.
+    load(start=None, end=None, features=None):
+        Returns the merged sketches of the partitions in a time range.
+    load_partitions(start=None, end=None, features=None):
+        Returns the merged sketches of every partition in a time range.
+    """
+    def __init__(
+        self,
+        root: Path = SKETCH_DIR,
+        freq: str = "day",
+        k: int = DEFAULT_K,
+        dataset_api: Any = None,
+        remote_dir: str = REMOTE_SKETCH_DIR
+    ):
+        """ Set the directory, the partition size, the size parameter and the shared dataset """
+        if freq not in PARTITION_FREQUENCIES:
+            raise ValueError(f"Unknown frequency {freq}, expected one of {list(PARTITION_FREQUENCIES)}.")
+        self.root = Path(root)
+        self.freq = freq
+        self.k = k
+        self.dataset_api = dataset_api
+        self.remote_dir = remote_dir
+
+    @staticmethod
+    def _read(
+        path: Path
+    ) -> Dict[str, KLLSketch]:
+        """ Returns the sketches of a file (none if it does not exist) """
+        if not os.path.exists(path):
+            return {}
+        arrays = {}
+        with np.load(path) as data:
+            for name in data.files:
+                feature, key = name.rsplit("__", 1)
+                arrays.setdefault(feature, {})[key] = data[name]
+        return {feature: KLLSketch.from_arrays(sketch_arrays) for feature, sketch_arrays in arrays.items()}
+
+    @staticmethod
+    def _write(
+        path: Path,
+        sketches: Dict[str, KLLSketch]
+    ) -> None:
+        """ Writes the sketches of a file (through a temporary file, so that readers never see a partial file) """
+        arrays = {}
+        for feature, sketch in sketches.items():
+            for key, values in sketch.to_arrays().items():
+                arrays[f"{feature}__{key}"] = values
+        fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(temp_path, path)
+
+    def _download(
+        self,
+        remote_name: str,
+        path: Path
+    ) -> bool:
+        """ Downloads a shared file to path (replacing it atomically), and returns whether it exists """
+        remote_path = f"{self.remote_dir}/{remote_name}"
+        if not self.dataset_api.exists(remote_path):
+            return False
+        os.makedirs(path.parent, exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=path.parent, prefix=".download_") as temp_dir:
+            downloaded = self.dataset_api.download(remote_path, local_path=temp_dir, overwrite=True)
+            os.replace(downloaded, path)
+        return True
+
+    def _upload(
+        self,
+        path: Path,
+        remote_name: str
+    ) -> None:
+        """ Uploads a file as a shared file """
+        with tempfile.TemporaryDirectory(dir=path.parent, prefix=".upload_") as temp_dir:
+            # the uploaded file is named as the shared file
+            temp_path = Path(temp_dir, remote_name)
+            shutil.copyfile(path, temp_path)
+            self.dataset_api.upload(str(temp_path), self.remote_dir, overwrite=True)
+
+    def _add_to_index(
+        self,
+        producer: str,
+        names: List[str]
+    ) -> None:
+        """ Adds partitions to the shared list of the partitions of a producer """
+        path = Path(self.root, f".{producer}.json")
+        with open(Path(self.root, f".{producer}.index.lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            partitions = []
+            if self._download(f"sketches_{producer}.json", path):
+                with open(path) as f:
+                    partitions = json.load(f)["partitions"]
+            with open(path, "w") as f:
+                json.dump({"partitions": sorted(set(partitions) | set(names))}, f)
+            self._upload(path, f"sketches_{producer}.json")
+
+    def update(
+        self,
+        df: pd.DataFrame,
+        producer: str,
+        features: List[str],
+        time_column: str = "pickup_datetime"
+    ) -> int:
+        """
+        Adds the values of the rows of a DataFrame to the sketches of their partitions (and shares the 
+        updated sketches, with a dataset api).
+
+        Args:
+            df (pd.DataFrame): The rows, e.g. the predictions with their features.
+            producer (str): Name of the producer (one file per producer and partition).
+            features (List[str]): The sketched columns.
+            time_column (str, optional):
+                The column of the time of the rows (datetimes, strings, or seconds since the epoch).
+                Defaults to "pickup_datetime".
+
+        Returns:
+            int: Number of partitions updated.
+        """
+        times = df[time_column]
+        times = pd.to_datetime(times, unit="s") if pd.api.types.is_numeric_dtype(times) else pd.to_datetime(times)
+        offset, name_format = PARTITION_FREQUENCIES[self.freq]
+        partitions = times.dt.floor(offset).dt.strftime(name_format).to_numpy()
+        names, codes = np.unique(partitions[times.notna().to_numpy()], return_inverse=True)
+        values = {feature: df[feature].to_numpy(dtype=np.float64, na_value=np.nan)[times.notna().to_numpy()] for feature in features}
+        new_names = []
+        for code, name in enumerate(names):
+            rows = codes == code
+            directory = Path(self.root, name)
+            os.makedirs(directory, exist_ok=True)
+            path = Path(directory, f"{producer}.npz")
+            remote_name = f"sketches_{name}_{producer}.npz"
+            with open(Path(directory, f".{producer}.lock"), "w") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                # continue from the shared sketches of the partition (e.g. on a fresh runner)
+                if self.dataset_api is not None and not path.exists() and not self._download(remote_name, path):
+                    new_names.append(name)
+                sketches = self._read(path)
+                for feature in features:
+                    sketches.setdefault(feature, KLLSketch(self.k)).update(values[feature][rows])
+                self._write(path, sketches)
+                if self.dataset_api is not None:
+                    self._upload(path, remote_name)
+        if new_names:
+            self._add_to_index(producer, new_names)
+        return len(names)
+
+    def _in_range(
+        self,
+        name: str,
+        start: str = None,
+        end: str = None
+    ) -> bool:
+        """ Returns whether a partition name is valid and the partition is in a time range """
+        offset, name_format = PARTITION_FREQUENCIES[self.freq]
+        try:
+            partition_start = pd.to_datetime(name, format=name_format)
+        except ValueError:
+            return False
+        if start is not None and partition_start + pd.Timedelta(1, unit=offset) <= pd.Timestamp(start):
+            return False
+        return end is None or partition_start < pd.Timestamp(end)
+
+    def sync(
+        self,
+        producers: List[str] = PRODUCERS,
+        start: str = None,
+        end: str = None
+    ) -> int:
+        """
+        Downloads the shared sketches of the partitions in a time range (e.g. before the monitoring 
+        loads them), replacing the local copies.
+
+        Args:
+            producers (List[str], optional): The producers. Defaults to PRODUCERS.
+            start (str, optional): The start of the range (see partitions).
+            end (str, optional): The end of the range (see partitions).
+
+        Returns:
+            int: Number of files downloaded.
+
+        Raises:
+            ValueError: If the store has no dataset api.
+        """
+        if self.dataset_api is None:
+            raise ValueError("The sketches are not shared (no dataset api).")
+        os.makedirs(self.root, exist_ok=True)
+        n_files = 0
+        for producer in producers:
+            index_path = Path(self.root, f".{producer}.json")
+            if not self._download(f"sketches_{producer}.json", index_path):
+                continue
+            with open(index_path) as f:
+                names = json.load(f)["partitions"]
+            for name in names:
+                if self._in_range(name, start, end):
+                    n_files += self._download(f"sketches_{name}_{producer}.npz", Path(self.root, name, f"{producer}.npz"))
+        return n_files
+
+    def partitions(
+        self,
+        start: str = None,
+        end: str = None
+    ) -> List[str]:
+        """
+        Returns the names of the partitions in a time range, in time order.
+
+        Args:
+            start (str, optional): The start of the range (a partition is included if it ends after start).
+            end (str, optional): The end of the range (a partition is included if it starts before end).
+
+        Returns:
+            List[str]: The names of the partitions.
+        """
+        if not os.path.isdir(self.root):
+            return []
+        return [name for name in sorted(os.listdir(self.root)) if self._in_range(name, start, end)]
+
+    def _load_partition(
+        self,
+        name: str,
+        features: List[str] = None
+    ) -> Dict[str, KLLSketch]:
+        """ Returns the merged sketches (of all the producers) of a partition """
+        merged = {}
+        directory = Path(self.root, name)
+        for file_name in sorted(os.listdir(directory)):
+            if file_name.startswith(".") or not file_name.endswith(".npz"):
+                continue
+            for feature, sketch in self._read(Path(directory, file_name)).items():
+                if features is not None and feature not in features:
+                    continue
+                if feature in merged:
+                    merged[feature].merge(sketch)
+                else:
+                    merged[feature] = sketch
+        return merged
+
+    def load(
+        self,
+        start: str = None,
+        end: str = None,
+        features: List[str] = None
+    ) -> Dict[str, KLLSketch]:
+        """
+        Returns the merged sketches (of all the producers) of the partitions in a time range.
+
+        Args:
+            start (str, optional): The start of the range (see partitions).
+            end (str, optional): The end of the range (see partitions).
+            features (List[str], optional): The features (all the sketched features by default).
+
+        Returns:
+            Dict[str, KLLSketch]: The merged sketch of every feature.
+        """
+        merged = {}
+        for sketches in self.load_partitions(start, end, features).values():
+            for feature, sketch in sketches.items():
+                if feature in merged:
+                    merged[feature].merge(sketch)
+                else:
+                    merged[feature] = sketch
+        return merged
+
+    def load_partitions(
+        self,
+        start: str = None,
+        end: str = None,
+        features: List[str] = None
+    ) -> Dict[pd.Timestamp, Dict[str, KLLSketch]]:
+        """
+        Returns the merged sketches (of all the producers) of every partition in a time range, e.g. for 
+        a drift timeline (see monitoring_utils.sketch_drift_timeline).
+
+        Args:
+            start (str, optional): The start of the range (see partitions).
+            end (str, optional): The end of the range (see partitions).
+            features (List[str], optional): The features (all the sketched features by default).
+
+        Returns:
+            Dict[pd.Timestamp, Dict[str, KLLSketch]]: The merged sketch of every feature, by start of the partition.
+        """
+        _, name_format = PARTITION_FREQUENCIES[self.freq]
+        return {
+            pd.to_datetime(name, format=name_format): self._load_partition(name, features)
+            for name in self.partitions(start, end)
+        }
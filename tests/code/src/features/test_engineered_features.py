@@ -63,6 +63,46 @@ def test_extract_minute_of_the_day(datetime):
     assert engineered_features.extract_minute_of_the_day(datetime).equals(expected_output)
 
 
+def test_extract_datetime_features(datetime):
+    datetime = pd.to_datetime(datetime)
+    expected_output = pd.DataFrame({
+        "month": [1, 1, 1, 1],
+        "week": [52, 52, 1, 1],
+        "weekday": [5, 6, 0, 1],
+        "hour": [0, 6, 12, 18],
+        "minute": [30, 0, 45, 12],
+        "minute_of_the_day": [30, 360, 765, 1092],
+        "hour_before7_after7": [1, 0, 1, 1],
+        "holiday": [0, 1, 0, 0]
+    })
+    output = engineered_features.extract_datetime_features(datetime, ["2022-01-01", "2022-01-02"])
+    assert output.equals(expected_output)
+
+
+def test_extract_datetime_features_matches_dt_accessor():
+    # hourly timestamps over several year boundaries (incl. iso weeks 53) and before the epoch
+    datetime = pd.Series(pd.date_range("1968-12-20", "1971-01-10", freq="59min"))
+    datetime = pd.concat([datetime, pd.Series(pd.date_range("2015-12-20", "2021-01-10", freq="7h"))])
+    output = engineered_features.extract_datetime_features(datetime)
+    assert np.array_equal(output["month"], datetime.dt.month)
+    assert np.array_equal(output["week"], datetime.dt.isocalendar().week.astype(np.int64))
+    assert np.array_equal(output["weekday"], datetime.dt.weekday)
+    assert np.array_equal(output["hour"], datetime.dt.hour)
+    assert np.array_equal(output["minute"], datetime.dt.minute)
+    assert output.index.equals(datetime.index)
+
+
+def test_extract_datetime_features_missing_values():
+    datetime = pd.to_datetime(pd.Series(["2016-01-18 10:00:00", None]))
+    output = engineered_features.extract_datetime_features(
+        datetime, [pd.to_datetime("2016-01-18").date()]
+    )
+    assert output["month"].dtype == np.float64
+    assert output["month"][0] == 1 and np.isnan(output["month"][1])
+    assert output["holiday"].tolist() == [1, 0]
+    assert output["hour_before7_after7"].tolist() == [1, 0]
+
+
 @pytest.fixture
 def holiday_list():
     return ["2022-01-01", "2022-01-02"]
@@ -75,6 +115,50 @@ def test_get_holidays(datetime, holiday_list):
     assert np.array_equal(result, expected_output)
 
 
+@pytest.mark.parametrize("federal, expected_output", [
+    # the semantics of the trained model: sundays only
+    (False, [0, 0, 1, 0, 0]),
+    (True, [1, 0, 1, 1, 1]),
+])
+def test_get_holidays_from_holiday_index(monkeypatch, federal, expected_output):
+    monkeypatch.setattr(engineered_features.config, "FEDERAL_HOLIDAYS_FEATURE", federal)
+    datetime = pd.to_datetime(pd.Series([
+        "2016-01-18 08:00:00", # martin luther king jr. day
+        "2016-01-19 08:00:00",
+        "2016-01-24 23:59:59", # sunday
+        "2016-07-04 00:00:00", # independence day
+        "2016-12-26 12:00:00", # christmas (observed)
+    ]))
+    expected_output = np.array(expected_output)
+    assert np.array_equal(engineered_features.get_holidays(datetime), expected_output)
+    assert np.array_equal(
+        engineered_features.extract_datetime_features(datetime)["holiday"], expected_output
+    )
+
+
+def test_holiday_index_matches_trained_features():
+    # the training features passed the calendar DataFrame to isin (matching its column labels)
+    datetime = pd.Series(pd.date_range("2016-01-01", "2016-12-31 23:00:00", freq="5h"))
+    calendar = engineered_features.get_us_federal_holiday_calender(datetime.min(), datetime.max())
+    trained = ((datetime.dt.weekday == 6) | datetime.dt.date.isin(calendar)).astype(np.int64)
+    assert np.array_equal(engineered_features.get_holidays(datetime), trained)
+
+
+def test_get_holiday_index_is_extended_lazily(monkeypatch):
+    monkeypatch.setattr(engineered_features.config, "FEDERAL_HOLIDAYS_FEATURE", True)
+    first_day, bitmap = engineered_features.get_holiday_index()
+    # a day before the covered range extends the index, keeping the previous days
+    year = pd.Timestamp(first_day, unit="D").year - 2
+    day = (pd.Timestamp(year=year, month=7, day=4) - pd.Timestamp("1970-01-01")).days
+    extended_first_day, extended_bitmap = engineered_features.get_holiday_index(day, day)
+    assert extended_first_day <= day < first_day
+    assert extended_bitmap[day - extended_first_day] == 1
+    offset = first_day - extended_first_day
+    assert np.array_equal(extended_bitmap[offset:offset + len(bitmap)], bitmap)
+    # the extended index is shared by the whole process
+    assert engineered_features.get_holiday_index()[0] == extended_first_day
+
+
 def test_get_us_federal_holiday_calender():
     expected_output = pd.DataFrame({
         "date": [
@@ -124,4 +208,38 @@ def test_calculate_direction(
     direction = engineered_features.calculate_direction(
         pickup_latitude, pickup_longitude, dropoff_latitude, dropoff_longitude
     )
-    assert np.isclose(direction, expected_direction, rtol=0.1)
\ No newline at end of file
+    assert np.isclose(direction, expected_direction, rtol=0.1)
+
+
+@pytest.fixture
+def coordinates():
+    rng = np.random.default_rng(0)
+    return (
+        rng.uniform(40.5, 41.0, 1000), rng.uniform(-74.25, -73.5, 1000),
+        rng.uniform(40.5, 41.0, 1000), rng.uniform(-74.25, -73.5, 1000)
+    )
+
+
+def test_calculate_distance_and_direction(coordinates):
+    distance, direction = engineered_features.calculate_distance_and_direction(*coordinates)
+    assert np.array_equal(distance, engineered_features.calculate_haversine_distance(*coordinates))
+    assert np.array_equal(direction, engineered_features.calculate_direction(*coordinates))
+
+
+def test_calculate_distance_and_direction_float32_with_buffers(coordinates):
+    out = (np.empty(1000, dtype=np.float32), np.empty(1000, dtype=np.float32))
+    distance, direction = engineered_features.calculate_distance_and_direction(
+        *coordinates, dtype=np.float32, out=out
+    )
+    assert distance is out[0] and direction is out[1]
+    assert np.allclose(distance, engineered_features.calculate_haversine_distance(*coordinates), atol=1e-2)
+    # compare directions on the circle (359.9 and 0.1 degrees are close)
+    delta = (direction - engineered_features.calculate_direction(*coordinates) + 180) % 360 - 180
+    assert np.abs(delta).max() < 1
+
+
+def test_calculate_distance_and_direction_invalid_buffers(coordinates):
+    with pytest.raises(ValueError):
+        engineered_features.calculate_distance_and_direction(
+            *coordinates, out=(np.empty(10), np.empty(10))
+        )
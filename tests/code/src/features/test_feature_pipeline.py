@@ -0,0 +1,69 @@
+import pandas as pd
+import pytest
+
+# the feature pipeline needs the hopsworks client libraries
+pytest.importorskip("hsfs")
+pytest.importorskip("hopsworks")
+from src.features import feature_pipeline
+
+
+@pytest.fixture
+def processed_df():
+    n_rows = 2 * feature_pipeline.MIN_ROWS_PER_SHARD + 7
+    return pd.DataFrame({
+        "id": [f"id{i}" for i in range(n_rows)],
+        "pickup_datetime": pd.date_range("2016-01-01", "2016-06-30", periods=n_rows).strftime("%Y-%m-%d %H:%M:%S"),
+        "pickup_longitude": [-73.98 + (i % 100) * 1e-3 for i in range(n_rows)],
+        "pickup_latitude": [40.75 + (i % 37) * 1e-3 for i in range(n_rows)],
+        "dropoff_longitude": [-73.95 - (i % 53) * 1e-3 for i in range(n_rows)],
+        "dropoff_latitude": [40.70 + (i % 11) * 1e-3 for i in range(n_rows)],
+    }, index=range(10, n_rows + 10))
+
+
+def test_engineer_features_parallel(processed_df):
+    expected_output = feature_pipeline.engineer_features(processed_df.copy())
+    output = feature_pipeline.engineer_features_parallel(processed_df.copy(), n_workers=2)
+    assert output.equals(expected_output)
+
+
+def test_engineer_features_parallel_invalid_workers(processed_df):
+    with pytest.raises(ValueError):
+        feature_pipeline.engineer_features_parallel(processed_df, n_workers=0)
+
+
+@pytest.fixture
+def trips_df():
+    return pd.DataFrame({
+        "id": ["id1", "id2", "id3", "id4"],
+        "pickup_datetime": pd.to_datetime([
+            "2016-01-01 00:00:00", "2016-01-01 00:10:00", "2016-01-01 00:10:00", "2016-01-01 00:20:00"
+        ]),
+    })
+
+
+def test_select_rows_after_watermark(trips_df):
+    watermark = {"event_time": pd.Timestamp("2016-01-01 00:10:00"), "ids": ["id2"]}
+    mask = feature_pipeline.select_rows(trips_df, watermark)
+    assert mask.tolist() == [False, False, True, True]
+    assert feature_pipeline.select_rows(trips_df, None).all()
+
+
+def test_select_rows_backfill(trips_df):
+    mask = feature_pipeline.select_rows(
+        trips_df, backfill=("2016-01-01 00:05:00", "2016-01-01 00:10:00")
+    )
+    assert mask.tolist() == [False, True, True, False]
+
+
+def test_advance_and_persist_watermark(trips_df, tmp_path):
+    watermark = feature_pipeline.advance_watermark(None, trips_df.iloc[:2])
+    assert watermark == {"event_time": pd.Timestamp("2016-01-01 00:10:00"), "ids": ["id2"]}
+    watermark = feature_pipeline.advance_watermark(watermark, trips_df.iloc[2:3])
+    assert watermark["ids"] == ["id2", "id3"]
+    # rows before the watermark do not move it back
+    assert feature_pipeline.advance_watermark(watermark, trips_df.iloc[:1]) == watermark
+
+    path = tmp_path / "watermark.json"
+    assert feature_pipeline.read_watermark(path) is None
+    feature_pipeline.write_watermark(watermark, path)
+    assert feature_pipeline.read_watermark(path) == watermark
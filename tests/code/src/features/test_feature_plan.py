@@ -0,0 +1,74 @@
+import pandas as pd
+import numpy as np
+import pytest
+from src.features import engineered_features, feature_plan
+
+
+@pytest.fixture
+def data():
+    return pd.DataFrame({
+        "vendor_id": [1, 2, 2],
+        "passenger_count": [1, 3, 6],
+        "pickup_latitude": [40.7128, 40.7306, 40.6413],
+        "pickup_longitude": [-74.0060, -73.9352, -73.7781],
+        "dropoff_latitude": [40.7580, 40.6413, 40.7128],
+        "dropoff_longitude": [-73.9855, -73.7781, -74.0060],
+        "pickup_datetime": pd.to_datetime(["2022-01-01 00:30:00", "2022-01-02 06:00:00", "2022-07-04 18:12:00"]),
+    })
+
+
+def test_model_feature_plan_follows_model_schema():
+    plan = feature_plan.get_model_feature_plan()
+    assert plan.columns == [
+        "h2amto7am_7amto2am", "direction", "dropoff_latitude", "dropoff_longitude", "haversine_distance",
+        "holiday", "minute_of_the_day", "month", "passenger_count", "pickup_latitude", "pickup_longitude",
+        "vendor_id", "week", "weekday"
+    ]
+    assert plan is feature_plan.get_model_feature_plan()
+
+
+def test_compute_matches_features(data):
+    plan = feature_plan.get_model_feature_plan()
+    matrix = plan.compute(data)
+    assert matrix.shape == (3, 14) and matrix.dtype == np.float64 and matrix.flags.c_contiguous
+
+    df = plan.to_frame(matrix)
+    assert np.shares_memory(df.to_numpy(), matrix)
+    datetime_df = engineered_features.extract_datetime_features(data.pickup_datetime)
+    distance, direction = engineered_features.calculate_distance_and_direction(
+        data.pickup_latitude.values, data.pickup_longitude.values,
+        data.dropoff_latitude.values, data.dropoff_longitude.values
+    )
+    np.testing.assert_array_equal(df.h2amto7am_7amto2am, datetime_df.hour_before7_after7)
+    np.testing.assert_array_equal(df.minute_of_the_day, datetime_df.minute_of_the_day)
+    # sundays only, as the model was trained
+    np.testing.assert_array_equal(df.holiday, [0, 1, 0])
+    np.testing.assert_array_equal(df.haversine_distance, distance)
+    np.testing.assert_array_equal(df.direction, direction)
+    np.testing.assert_array_equal(df.vendor_id, data.vendor_id)
+
+
+def test_to_frame_typed(data):
+    plan = feature_plan.ENGINEERED_FEATURE_PLAN
+    data.loc[1, "pickup_datetime"] = pd.NaT
+    df = plan.to_frame(plan.compute(data), typed=True, index=pd.Index([5, 6, 7]))
+    assert list(df.columns) == [name for name, _, _ in feature_plan.ENGINEERED_COLUMNS]
+    assert df.index.tolist() == [5, 6, 7]
+    # integer features with missing values stay float
+    assert df.month.dtype == np.float64 and np.isnan(df.month[6])
+    assert df.holiday_df.dtype == np.int64
+    assert df.direction_df.dtype == np.float64
+
+
+def test_compute_into_out(data):
+    plan = feature_plan.ENGINEERED_FEATURE_PLAN
+    out = np.zeros((5, len(plan.columns)))
+    plan.compute(data, out=out[1:4])
+    np.testing.assert_array_equal(out[1:4], plan.compute(data))
+    with pytest.raises(ValueError):
+        plan.compute(data, out=np.zeros((3, len(plan.columns)), dtype=np.float32))
+
+
+def test_unknown_source():
+    with pytest.raises(ValueError):
+        feature_plan.FeaturePlan([("fare", "fare_amount", "float64")])
@@ -0,0 +1,31 @@
+import os
+import subprocess
+import sys
+from src.inference import automated_data_generation
+from src.inference.automated_data_generation import StartupProfile
+
+
+def test_startup_profile():
+    profile = StartupProfile()
+    with profile.phase("imports"):
+        with profile.phase("imports: pandas"):
+            pass
+    for _ in range(2):
+        with profile.phase("predict"):
+            pass
+
+    report = profile.report()
+    assert list(report["phases"]) == ["imports", "imports: pandas", "predict"]
+    assert report["phases"]["imports"] >= report["phases"]["imports: pandas"]
+    assert report["total_ms"] >= report["phases"]["imports"] + report["phases"]["predict"]
+    assert profile.format().splitlines()[-1].startswith("total")
+
+
+def test_import_is_light():
+    # parsing the arguments must not wait for pandas or the feature store client
+    code = (
+        f"import sys; sys.path.insert(0, {os.path.dirname(automated_data_generation.__file__)!r}); "
+        "import automated_data_generation; "
+        "assert not {'pandas', 'hopsworks', 'joblib'} & set(sys.modules), sorted(sys.modules)"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
@@ -0,0 +1,72 @@
+import pytest
+from src.inference.prediction_cache import PredictionCache
+
+
+TRIP = {
+    "vendor_id": 2,
+    "passenger_count": 1,
+    "pickup_latitude": 40.64131,
+    "pickup_longitude": -73.77812,
+    "dropoff_latitude": 40.75800,
+    "dropoff_longitude": -73.98550,
+    "pickup_datetime": 1467590400.0, # 2016-07-04 00:00:00 (federal holiday, monday)
+}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_key_quantization():
+    cache = PredictionCache(grid_degrees=0.001, minute_bucket=15)
+    key = cache.key(TRIP)
+    # holiday flag as the model was trained (sundays only)
+    assert key[4:] == (0, 0, 0, 2, 1)
+    # nearby pickup point, a few minutes later: same key
+    assert cache.key(dict(TRIP, pickup_latitude=40.64148, pickup_datetime=TRIP["pickup_datetime"] + 600)) == key
+    assert cache.key(dict(TRIP, pickup_latitude=40.6425)) != key
+    assert cache.key(dict(TRIP, pickup_datetime=TRIP["pickup_datetime"] + 86400)) != key
+    # exact coordinates
+    assert PredictionCache(grid_degrees=None).key(TRIP)[0] == TRIP["pickup_latitude"]
+
+
+def test_lru_and_ttl():
+    clock = FakeClock()
+    cache = PredictionCache(max_size=2, ttl_seconds=10, clock=clock)
+    trips = [dict(TRIP, passenger_count=count) for count in (1, 2, 3)]
+    cache.put(trips[0], 100.0)
+    cache.put(trips[1], 200.0)
+    assert cache.get(trips[0]) == 100.0
+    cache.put(trips[2], 300.0)
+    # least recently used is evicted
+    assert cache.get(trips[1]) is None
+    clock.now = 11
+    assert cache.get(trips[0]) is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"], stats["expirations"]) == (1, 2, 1, 1)
+    assert stats["size"] == 1
+
+
+def test_get_or_compute_and_invalidation():
+    cache = PredictionCache(model_version=1)
+    calls = []
+    compute = lambda trip: calls.append(trip) or 42.0
+    assert cache.get_or_compute(TRIP, compute) == 42.0
+    assert cache.get_or_compute(dict(TRIP, pickup_datetime=TRIP["pickup_datetime"] + 30), compute) == 42.0
+    assert len(calls) == 1
+    stats = cache.stats()
+    assert stats["hit_rate"] == 0.5 and stats["mean_hit_ms"] is not None
+
+    cache.set_model_version(1)
+    assert cache.stats()["size"] == 1
+    cache.set_model_version(2)
+    assert cache.stats()["size"] == 0 and cache.stats()["invalidations"] == 1
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        PredictionCache(max_size=0)
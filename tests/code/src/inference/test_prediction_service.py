@@ -0,0 +1,187 @@
+import asyncio
+import json
+import pytest
+from src.inference import prediction_service
+from src.utils import instrumentation
+
+
+TRIP = {
+    "vendor_id": 2,
+    "passenger_count": 1,
+    "pickup_latitude": 40.7128,
+    "pickup_longitude": -74.0060,
+    "dropoff_latitude": 40.7580,
+    "dropoff_longitude": -73.9855,
+    "pickup_datetime": 1467590400.0,
+}
+
+
+class FakePredictor:
+    """ Predicts the haversine distance, and records the batch sizes """
+    def __init__(self):
+        self.batch_sizes = []
+
+    def predict(self, inputs):
+        self.batch_sizes.append(len(inputs))
+        return inputs["haversine_distance"].tolist()
+
+
+async def request(port, method, path, body=None):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    content = b"" if body is None else json.dumps(body).encode()
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(content)}\r\nConnection: close\r\n\r\n".encode()
+        + content
+    )
+    response = await reader.read()
+    writer.close()
+    head, _, payload = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(payload)
+
+
+def test_micro_batching():
+    predictor = FakePredictor()
+
+    async def main():
+        batcher = prediction_service.MicroBatcher(predictor, max_batch_size=4, max_wait_ms=50)
+        await batcher.start()
+        trips = [dict(TRIP, dropoff_latitude=40.70 + i * 1e-2) for i in range(10)]
+        predictions = await asyncio.gather(*[batcher.submit(trip) for trip in trips])
+        await batcher.stop()
+        return trips, predictions, batcher.stats
+
+    trips, predictions, stats = asyncio.run(main())
+    assert predictor.batch_sizes == [4, 4, 2]
+    assert stats == {"requests": 10, "batches": 3, "max_batch_size_seen": 4}
+    # every request gets the prediction of its own trip
+    assert len(set(predictions)) == 10
+    assert predictions[3] == FakePredictor().predict(
+        prediction_service.app_utils.process_input(*(trips[3][c] for c in prediction_service.app_utils.INPUT_COLUMNS))
+    )[0]
+
+
+def test_service_endpoints():
+    async def main():
+        service = prediction_service.PredictionService(FakePredictor, max_batch_size=8, max_wait_ms=1)
+        server = await service.start("127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        responses = {"health": await request(port, "GET", "/health")}
+        await service._loading
+        responses["ready"] = await request(port, "GET", "/ready")
+        responses["predict"] = await request(port, "POST", "/predict", TRIP)
+        responses["invalid"] = await request(port, "POST", "/predict", dict(TRIP, vendor_id="two"))
+        responses["missing"] = await request(port, "POST", "/predict", {"vendor_id": 1})
+        responses["method"] = await request(port, "GET", "/predict")
+        responses["unknown"] = await request(port, "GET", "/unknown")
+        server.close()
+        await server.wait_closed()
+        await service.stop()
+        return responses
+
+    responses = asyncio.run(main())
+    assert responses["health"] == (200, {"status": "ok"})
+    assert responses["ready"][0] == 200
+    assert responses["predict"][0] == 200 and responses["predict"][1]["prediction"] > 0
+    assert [responses[name][0] for name in ("invalid", "missing", "method", "unknown")] == [400, 400, 405, 404]
+
+
+def test_not_ready_until_loaded():
+    def load_predictor():
+        raise FileNotFoundError("no model")
+
+    async def main():
+        service = prediction_service.PredictionService(load_predictor)
+        await service._load()
+        return await service.handle("GET", "/ready", b""), await service.handle("POST", "/predict", b"{}")
+
+    ready, predict = asyncio.run(main())
+    assert ready[0] == 503 and ready[1]["status"] == "failed"
+    assert predict[0] == 503
+
+
+def test_service_cache():
+    predictor = FakePredictor()
+
+    async def main():
+        cache = prediction_service.PredictionCache(max_size=10)
+        service = prediction_service.PredictionService(lambda: predictor, cache=cache)
+        await service._load()
+        body = json.dumps(TRIP).encode()
+        responses = [await service.handle("POST", "/predict", body) for _ in range(3)]
+        ready = await service.handle("GET", "/ready", b"")
+        await service.stop()
+        return responses, ready
+
+    responses, ready = asyncio.run(main())
+    assert all(response == responses[0] for response in responses)
+    assert predictor.batch_sizes == [1]
+    assert ready[1]["cache"]["hits"] == 2
+
+
+def test_metrics_endpoint():
+    predictor = FakePredictor()
+    instrumentation.get_registry().reset()
+    instrumentation.enable()
+
+    async def main():
+        service = prediction_service.PredictionService(lambda: predictor)
+        await service._load()
+        await service.handle("POST", "/predict", json.dumps(TRIP).encode())
+        responses = await service.handle("GET", "/metrics", b""), await service.handle("GET", "/metrics?format=json", b"")
+        await service.stop()
+        return responses
+
+    try:
+        text, snapshot = asyncio.run(main())
+    finally:
+        instrumentation.enable(False)
+    assert text[0] == 200 and 'nyc_taxi_predict_seconds_count 1' in text[1]
+    assert 'nyc_taxi_process_input_rows_total 1' in text[1]
+    assert snapshot[0] == 200 and any(histogram["name"] == "predict_seconds" for histogram in snapshot[1]["histograms"])
+
+
+def test_unexpected_error_is_answered():
+    async def main():
+        service = prediction_service.PredictionService(FakePredictor, max_batch_size=8, max_wait_ms=1)
+        handle = service.handle
+
+        async def failing_handle(method, path, body):
+            if path == "/ready":
+                raise RuntimeError("unexpected failure")
+            return await handle(method, path, body)
+
+        service.handle = failing_handle
+        server = await service.start("127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        responses = [await request(port, "GET", "/ready"), await request(port, "GET", "/health")]
+        server.close()
+        await server.wait_closed()
+        await service.stop()
+        return responses
+
+    failed, health = asyncio.run(main())
+    assert failed == (500, {"error": "Internal server error"})
+    assert health == (200, {"status": "ok"})
+
+
+def test_body_size_is_capped():
+    async def main():
+        service = prediction_service.PredictionService(FakePredictor, max_batch_size=8, max_wait_ms=1)
+        server = await service.start("127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        responses = []
+        for content_length in (prediction_service.MAX_BODY_BYTES + 1, "-1", "many"):
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            # the body is never sent: the service must answer from the headers
+            writer.write(f"POST /predict HTTP/1.1\r\nContent-Length: {content_length}\r\n\r\n".encode())
+            head, _, payload = (await reader.read()).partition(b"\r\n\r\n")
+            writer.close()
+            responses.append((int(head.split()[1]), json.loads(payload)))
+        server.close()
+        await server.wait_closed()
+        await service.stop()
+        return responses
+
+    too_large, negative, invalid = asyncio.run(main())
+    assert too_large[0] == 413 and negative[0] == 413
+    assert invalid[0] == 400
@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.inference.tree_ensemble import TreeEnsemble
+
+
+def json_model(trees, base_score="5E-1", objective="reg:squaredlogerror", feature_names=None):
+    return {
+        "learner": {
+            "attributes": {},
+            "feature_names": feature_names or [],
+            "gradient_booster": {"name": "gbtree", "model": {"gbtree_model_param": {}, "trees": trees}},
+            "learner_model_param": {"base_score": base_score},
+            "objective": {"name": objective},
+        }
+    }
+
+
+# x0 < 1.5 (missing: left) -> 1.0, else x1 in {2, 4} (missing or out of the table 0-31: right) -> 10.0, else 5.0
+SPLIT_TREE = {
+    "left_children": [1, -1, 3, -1, -1],
+    "right_children": [2, -1, 4, -1, -1],
+    "split_indices": [0, 0, 1, 0, 0],
+    "split_conditions": [1.5, 1.0, 0.0, 5.0, 10.0],
+    "default_left": [1, 0, 0, 0, 0],
+    "categories": [2, 4],
+    "categories_nodes": [2],
+    "categories_segments": [0],
+    "categories_sizes": [2],
+}
+LEAF_TREE = {
+    "left_children": [-1], "right_children": [-1], "split_indices": [0],
+    "split_conditions": [0.25], "default_left": [0],
+}
+
+
+def test_predict():
+    ensemble = TreeEnsemble.from_json(json_model([SPLIT_TREE, LEAF_TREE]))
+    assert (ensemble.n_trees, ensemble.max_depth) == (2, 2)
+    inputs = np.array([[1.0, 0], [2, 2], [2, 3], [np.nan, 4], [2, np.nan], [2, 7], [2, 31]])
+    np.testing.assert_array_equal(
+        ensemble.predict(inputs),
+        np.array([1.75, 10.75, 5.75, 1.75, 10.75, 5.75, 5.75], dtype=np.float32)
+    )
+
+
+def test_predict_out_of_table_categories():
+    # categories out of the table of a split follow its default direction, as missing values
+    inputs = np.array([[2.0, -1], [2, 32], [2, 1000]])
+    ensemble = TreeEnsemble.from_json(json_model([SPLIT_TREE, LEAF_TREE]))
+    np.testing.assert_array_equal(ensemble.predict(inputs), np.full(3, 10.75, dtype=np.float32))
+    default_left_tree = dict(SPLIT_TREE, default_left=[1, 0, 1, 0, 0])
+    ensemble = TreeEnsemble.from_json(json_model([default_left_tree, LEAF_TREE]))
+    np.testing.assert_array_equal(ensemble.predict(inputs), np.full(3, 5.75, dtype=np.float32))
+
+
+def test_predict_dataframe():
+    ensemble = TreeEnsemble.from_json(
+        json_model([SPLIT_TREE, LEAF_TREE], feature_names=["x0", "x1"]), output_transform=np.expm1
+    )
+    # columns are selected by name, and categorical columns are encoded by their codes
+    df = pd.DataFrame({
+        "x1": pd.Categorical(["a", "c", None], categories=["a", "b", "c"]),
+        "x0": [2.0, 2.0, 2.0],
+    })
+    np.testing.assert_allclose(ensemble.predict(df), np.expm1([5.75, 10.75, 10.75]), rtol=1e-6)
+
+
+def test_unsupported_objective():
+    with pytest.raises(ValueError):
+        TreeEnsemble.from_json(json_model([LEAF_TREE], objective="binary:logistic"))
+
+
+def test_parity_with_xgboost():
+    xgb = pytest.importorskip("xgboost")
+    compose = pytest.importorskip("sklearn.compose")
+    rng = np.random.default_rng(0)
+    n_rows = 2000
+    X = pd.DataFrame({
+        "haversine_distance": rng.exponential(3, n_rows),
+        "direction": rng.uniform(-180, 180, n_rows),
+        "minute_of_the_day": rng.integers(0, 1440, n_rows),
+        "vendor_id": pd.Categorical(rng.integers(1, 3, n_rows)),
+        "passenger_count": pd.Categorical(rng.integers(1, 7, n_rows)),
+    })
+    X.loc[::17, "direction"] = np.nan
+    y = 60 + 120 * X.haversine_distance + rng.exponential(100, n_rows) + 50 * (X.vendor_id == 2)
+    model = compose.TransformedTargetRegressor(
+        regressor=xgb.XGBRegressor(
+            objective="reg:squaredlogerror", tree_method="hist", enable_categorical=True,
+            max_cat_to_onehot=1, n_estimators=50, max_depth=6, random_state=56
+        ),
+        func=np.log1p,
+        inverse_func=np.expm1
+    )
+    model.fit(X, y)
+
+    ensemble = TreeEnsemble.from_model(model)
+    for batch in (X[:1], X[:64], X):
+        np.testing.assert_allclose(ensemble.predict(batch), model.predict(batch), rtol=1e-6)
+
+    if int(xgb.__version__.split(".")[0]) < 2:
+        # unseen categories follow the default direction (XGBoost 2 sends them left)
+        unseen = X[:64].astype({"vendor_id": float, "passenger_count": float})
+        unseen.loc[::2, "vendor_id"] = 40.0
+        unseen.loc[1::2, "passenger_count"] = -1.0
+        booster = model.regressor_.get_booster()
+        expected = np.expm1(booster.inplace_predict(unseen.to_numpy(dtype=np.float32)))
+        np.testing.assert_allclose(ensemble.predict(unseen.to_numpy(dtype=np.float32)), expected, rtol=1e-6)
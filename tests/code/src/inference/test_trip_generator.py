@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.inference.trip_generator import DEFAULT_DISTRIBUTION, generate_trips
+
+START = pd.Timestamp("2016-01-01").value / 1e9
+END = pd.Timestamp("2016-07-01").value / 1e9
+
+
+def test_generate_trips_is_reproducible():
+    trips = generate_trips(1000, seed=7, start_time=START, end_time=END)
+    pd.testing.assert_frame_equal(trips, generate_trips(1000, seed=7, start_time=START, end_time=END))
+    assert not trips.equals(generate_trips(1000, seed=8, start_time=START, end_time=END))
+    assert list(trips.columns) == [
+        'vendor_id', 'passenger_count', 'pickup_latitude', 'pickup_longitude',
+        'dropoff_latitude', 'dropoff_longitude', 'pickup_datetime'
+    ]
+
+
+def test_generate_trips_follows_distributions():
+    trips = generate_trips(200000, seed=0, start_time=START, end_time=END)
+
+    assert set(trips.vendor_id) == {1, 2}
+    assert trips.vendor_id.eq(2).mean() == pytest.approx(780263 / 1458541, abs=0.01)
+    assert trips.passenger_count.eq(1).mean() == pytest.approx(1033510 / 1458527, abs=0.01)
+    min_lat, max_lat, min_lon, max_lon = DEFAULT_DISTRIBUTION["pickup_bounds"]
+    assert trips.pickup_latitude.between(min_lat, max_lat).all()
+    assert trips.pickup_longitude.between(min_lon, max_lon).all()
+
+    assert trips.pickup_datetime.between(START, END - 1e-6).all()
+    hours = (trips.pickup_datetime // 3600 % 24).astype(int)
+    weights = np.asarray(DEFAULT_DISTRIBUTION["hourly_weights"])
+    np.testing.assert_allclose(np.bincount(hours, minlength=24) / len(trips), weights / weights.sum(), atol=0.003)
+
+
+def test_generate_trips_in_short_window():
+    # the window starts and ends within hours: times stay inside it
+    start, end = START + 1800.5, START + 2 * 3600 + 60
+    trips = generate_trips(10000, seed=1, start_time=start, end_time=end)
+    assert trips.pickup_datetime.between(start, end).all()
+    with pytest.raises(ValueError):
+        generate_trips(1, start_time=end, end_time=start)
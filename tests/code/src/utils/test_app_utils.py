@@ -0,0 +1,196 @@
+import hashlib
+import joblib
+import pandas as pd
+import pytest
+import threading
+from src.features import engineered_features
+from src.utils import app_utils
+
+
+@pytest.fixture
+def trips():
+    return pd.DataFrame({
+        "vendor_id": [1, 2, 2],
+        "passenger_count": [1, 3, 6],
+        "pickup_latitude": [40.7128, 40.7306, 40.6413],
+        "pickup_longitude": [-74.0060, -73.9352, -73.7781],
+        "dropoff_latitude": [40.7580, 40.6413, 40.7128],
+        "dropoff_longitude": [-73.9855, -73.7781, -74.0060],
+        "pickup_datetime": [1451606399.75, 1467590400.0, 1688500000.5],
+    })
+
+
+def reference_features(trip):
+    """ Features of one trip as the original process_input computed them (.dt accessors on a strftime) """
+    pickup = pd.to_datetime(pd.Series([
+        pd.to_datetime(trip.pickup_datetime, unit="s").strftime("%Y-%m-%d %H:%M:%S")
+    ]))
+    hour = pickup.dt.hour[0]
+    return {
+        "h2amto7am_7amto2am": int(hour in (0, 1) or hour > 7),
+        "direction": float(engineered_features.calculate_direction(
+            trip.pickup_latitude, trip.pickup_longitude, trip.dropoff_latitude, trip.dropoff_longitude
+        )),
+        "dropoff_latitude": trip.dropoff_latitude,
+        "dropoff_longitude": trip.dropoff_longitude,
+        "haversine_distance": float(engineered_features.calculate_haversine_distance(
+            trip.pickup_latitude, trip.pickup_longitude, trip.dropoff_latitude, trip.dropoff_longitude
+        )),
+        # sundays only, as the model was trained
+        "holiday": int(pickup.dt.weekday[0] == 6),
+        "minute_of_the_day": hour * 60 + pickup.dt.minute[0],
+        "month": pickup.dt.month[0],
+        "passenger_count": trip.passenger_count,
+        "pickup_latitude": trip.pickup_latitude,
+        "pickup_longitude": trip.pickup_longitude,
+        "vendor_id": trip.vendor_id,
+        "week": int(pickup.dt.isocalendar().week[0]),
+        "weekday": pickup.dt.weekday[0],
+    }
+
+
+def test_process_input_batch_matches_reference(trips):
+    # a sunday trip: 2016-07-03 00:00:00
+    trips = pd.concat([trips, trips.iloc[[1]].assign(pickup_datetime=1467504000.0)], ignore_index=True)
+    output = app_utils.process_input_batch(trips)
+    expected_output = pd.DataFrame([reference_features(trip) for trip in trips.itertuples(index=False)])
+    pd.testing.assert_frame_equal(output, expected_output, check_dtype=False)
+    # pickup time is truncated to the second: 2015-12-31 23:59:59
+    assert output.minute_of_the_day[0] == 1439
+    assert output.month[0] == 12
+    assert output.holiday.tolist() == [0, 0, 0, 1]
+    # a single trip gives the same features
+    pd.testing.assert_frame_equal(
+        app_utils.process_input(*trips[app_utils.INPUT_COLUMNS].iloc[3]), output.iloc[[3]].reset_index(drop=True)
+    )
+
+
+def test_process_input_batch_missing_column(trips):
+    with pytest.raises(KeyError):
+        app_utils.process_input_batch(trips.drop(columns=["vendor_id"]))
+
+
+class FakeRegistryModel:
+    def __init__(self, download_dir):
+        self.download_dir = download_dir
+
+    def download(self):
+        return str(self.download_dir)
+
+
+class FakeProject:
+    def __init__(self, download_dir):
+        self.download_dir = download_dir
+        self.downloads = 0
+
+    def get_model_registry(self):
+        return self
+
+    def get_model(self, model_name, version):
+        self.downloads += 1
+        return FakeRegistryModel(self.download_dir)
+
+
+@pytest.fixture
+def model_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(app_utils.config, "MODEL_DIR", tmp_path)
+    app_utils.clear_model_cache()
+    yield tmp_path
+    app_utils.clear_model_cache()
+
+
+def save_model(directory, model, checksum=True):
+    directory.mkdir(parents=True, exist_ok=True)
+    joblib.dump(model, directory / app_utils.MODEL_FILE)
+    if checksum:
+        # as recorded after a download
+        digest = hashlib.sha256((directory / app_utils.MODEL_FILE).read_bytes()).hexdigest()
+        (directory / (app_utils.MODEL_FILE + ".sha256")).write_text(digest)
+
+
+def test_get_model_cache(model_dir, monkeypatch):
+    monkeypatch.setattr(app_utils, "MODEL_CACHE_CAPACITY", 2)
+    for version in (1, 2, 3):
+        save_model(model_dir / str(version), {"version": version})
+
+    # verified local copies are loaded without a project
+    model = app_utils.get_model(project=None, model_name="model", version=1)
+    assert model == {"version": 1}
+    assert app_utils.get_model(project=None, model_name="model", version=1) is model
+    app_utils.get_model(project=None, model_name="model", version=2)
+    app_utils.get_model(project=None, model_name="model", version=1)
+    app_utils.get_model(project=None, model_name="model", version=3)
+
+    info = app_utils.get_model_cache_info()
+    assert (info["hits"], info["misses"], info["evictions"]) == (2, 3, 1)
+    assert info["resident"] == [("model", 1), ("model", 3)]
+    assert [load["source"] for load in info["loads"]] == ["local"] * 3
+
+
+def test_get_model_downloads_invalid_copy(model_dir, tmp_path_factory):
+    save_model(model_dir / "1", {"version": "corrupt"})
+    (model_dir / "1" / (app_utils.MODEL_FILE + ".sha256")).write_text("0" * 64)
+    download_dir = tmp_path_factory.mktemp("download") / "1"
+    save_model(download_dir, {"version": 1})
+    project = FakeProject(download_dir)
+
+    with pytest.raises(ValueError):
+        app_utils.get_model(project=None, model_name="model", version=1)
+    assert app_utils.get_model(project=project, model_name="model", version=1) == {"version": 1}
+    assert project.downloads == 1
+    assert app_utils.get_model_cache_info()["loads"][-1]["source"] == "registry"
+
+    # the downloaded copy is verified by its recorded checksum
+    app_utils.clear_model_cache()
+    app_utils.get_model(project=project, model_name="model", version=1)
+    assert project.downloads == 1
+
+
+def test_get_model_downloads_copy_without_checksum(model_dir, tmp_path_factory):
+    # a local copy without a recorded checksum is not trusted
+    save_model(model_dir / "1", {"version": "unverified"}, checksum=False)
+    download_dir = tmp_path_factory.mktemp("download") / "1"
+    save_model(download_dir, {"version": 1}, checksum=False)
+    project = FakeProject(download_dir)
+
+    assert not app_utils.has_local_model(version=1)
+    with pytest.raises(ValueError):
+        app_utils.get_model(project=None, model_name="model", version=1)
+    assert app_utils.get_model(project=project, model_name="model", version=1) == {"version": 1}
+    assert project.downloads == 1
+    assert app_utils.has_local_model(version=1)
+    assert (model_dir / "1" / (app_utils.MODEL_FILE + ".sha256")).exists()
+
+
+def test_get_model_load_does_not_block_other_models(model_dir, monkeypatch):
+    save_model(model_dir / "1", {"version": 1})
+    cached = app_utils.get_model(project=None, model_name="model", version=1)
+    load_model = app_utils._load_model
+    loading, release = threading.Event(), threading.Event()
+
+    def slow_load_model(project, model_name, version):
+        if version == 2:
+            loading.set()
+            release.wait(timeout=5)
+        return load_model(project, model_name, version)
+
+    save_model(model_dir / "2", {"version": 2})
+    monkeypatch.setattr(app_utils, "_load_model", slow_load_model)
+    results = []
+    loaders = [
+        threading.Thread(target=lambda: results.append(app_utils.get_model(project=None, model_name="model", version=2)))
+        for _ in range(2)
+    ]
+    for loader in loaders:
+        loader.start()
+    assert loading.wait(timeout=5)
+    # a cache hit of another model while version 2 is loading
+    assert app_utils.get_model(project=None, model_name="model", version=1) is cached
+    release.set()
+    for loader in loaders:
+        loader.join(timeout=5)
+
+    # version 2 was loaded once, by one of the concurrent callers
+    assert results == [{"version": 2}] * 2 and results[0] is results[1]
+    info = app_utils.get_model_cache_info()
+    assert (info["hits"], info["misses"]) == (2, 2)
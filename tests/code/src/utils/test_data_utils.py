@@ -3,9 +3,10 @@ import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..', '..')))
 
 import tempfile
+import numpy as np
 import pytest
 import pandas as pd
-from src.utils.data_utils import read_data, write_data, concat_dataframes
+from src.utils.data_utils import read_columns, read_data, read_data_in_chunks, write_data, concat_dataframes
 
 
 # generate a temporary file path for testing write_data function
@@ -28,6 +29,93 @@ def test_read_data_file_not_found():
         read_data("invalid_path.csv")
 
 
+@pytest.fixture
+def cached_csv_path(tmp_path):
+    path = os.path.join(tmp_path, "test.csv")
+    pd.DataFrame({
+        "id": ["id1", "id2", "id3"],
+        "pickup_datetime": ["2016-01-01 00:00:17", "2016-01-02 10:30:00", "2016-06-30 23:59:39"],
+        "passenger_count": [1, 2, 6],
+        "pickup_latitude": [40.75, 40.80, 40.65]
+    }).to_csv(path, index=False)
+    return path
+
+
+def test_read_data_use_cache(cached_csv_path):
+    expected_output = pd.read_csv(cached_csv_path)
+    # first read builds the cache, second read loads from it
+    assert read_data(cached_csv_path, use_cache=True).equals(expected_output)
+    assert os.path.isfile(os.path.join(cached_csv_path + ".cache", "schema.json"))
+    assert read_data(cached_csv_path, use_cache=True).equals(expected_output)
+
+
+def test_read_data_use_cache_columns_and_dates(cached_csv_path):
+    expected_output = pd.read_csv(
+        cached_csv_path, usecols=["pickup_datetime", "passenger_count"], parse_dates=["pickup_datetime"]
+    )
+    for _ in range(2):
+        output = read_data(
+            cached_csv_path, columns=["pickup_datetime", "passenger_count"], 
+            parse_dates=["pickup_datetime"], use_cache=True
+        )
+        assert output.equals(expected_output)
+
+
+def test_read_data_use_cache_invalidated(cached_csv_path):
+    read_data(cached_csv_path, use_cache=True)
+    # rewrite the file with different contents (and size)
+    df = pd.DataFrame({"col1": [1, 2, 3, 4], "col2": ["a", "b", "c", "d"]})
+    df.to_csv(cached_csv_path, index=False)
+    assert read_data(cached_csv_path, use_cache=True).equals(df)
+
+
+def test_read_columns(cached_csv_path):
+    columns = read_columns(cached_csv_path, columns=["passenger_count", "pickup_latitude"])
+    assert list(columns) == ["passenger_count", "pickup_latitude"]
+    assert isinstance(columns["pickup_latitude"], np.memmap)
+    assert np.array_equal(columns["passenger_count"], [1, 2, 6])
+    with pytest.raises(KeyError):
+        read_columns(cached_csv_path, columns=["invalid_column"])
+
+
+def test_write_data_use_cache(tmp_path):
+    path = os.path.join(tmp_path, "test.csv")
+    df = pd.DataFrame({"col1": [1, 2, 3], "col2": ["a", "b", "c"], "col3": [0.1, 0.2, 0.3]})
+    write_data(df, path, use_cache=True)
+    assert os.path.isfile(os.path.join(path + ".cache", "schema.json"))
+    assert read_data(path, use_cache=True).equals(pd.read_csv(path))
+
+
+def test_write_data_use_cache_dtypes_of_a_parse(tmp_path):
+    path = os.path.join(tmp_path, "test.csv")
+    # numeric-looking strings are parsed as numbers
+    df = pd.DataFrame({"id": ["001", "002", "010"], "flag": ["True", "False", "True"]})
+    write_data(df, path, use_cache=True)
+    expected_output = pd.read_csv(path)
+    assert expected_output["id"].tolist() == [1, 2, 10]
+    assert read_data(path, use_cache=True).equals(expected_output)
+    # a rebuilt cache replaces the previous one, leaving no temporary directory
+    write_data(df.assign(id=["3", "4", "5"]), path, use_cache=True)
+    assert read_data(path, use_cache=True)["id"].tolist() == [3, 4, 5]
+    assert sorted(os.listdir(tmp_path)) == ["test.csv", "test.csv.cache"]
+
+
+def test_read_data_in_chunks():
+    # create a test dataframe and write to disk
+    df = pd.DataFrame({"col1": [1, 2, 3, 4, 5], "col2": ["a", "b", "c", "d", "e"]})
+    df.to_csv(temp_path, index=False)
+    # test read_data_in_chunks function
+    chunks = list(read_data_in_chunks(temp_path, chunksize=2))
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    assert pd.concat(chunks).equals(df)
+
+
+def test_read_data_in_chunks_file_not_found():
+    # test read_data_in_chunks function for FileNotFoundError
+    with pytest.raises(FileNotFoundError):
+        next(read_data_in_chunks("invalid_path.csv", chunksize=2))
+
+
 def test_write_data():
     # create a test dataframe
     df = pd.DataFrame({"col1": [1, 2, 3], "col2": ["a", "b", "c"]})
@@ -54,4 +142,59 @@ def test_concat_dataframes():
     expected_result = pd.DataFrame(
         {"A": [1, 2, 3], "B": [4, 5, 6], "C": [7, 8, 9], "D": [10, 11, 12]}
     )
-    assert result.equals(expected_result)
\ No newline at end of file
+    assert result.equals(expected_result)
+
+@pytest.fixture
+def parquet_df():
+    return pd.DataFrame({
+        "id": ["id3", "id1", "id4", "id2", "id5"],
+        "vendor_id": [2, 1, 1, 2, 1],
+        "store_and_fwd_flag": ["N", "N", "Y", "N", "N"],
+        "pickup_datetime": ["2016-03-01 08:00:00", "2016-01-15 10:00:00", "2016-03-31 23:59:59", "2016-01-02 00:00:00", "2016-02-10 12:00:00"],
+        "trip_duration": [600, 455, 1200, 300, 800],
+    })
+
+
+def test_write_and_read_partitioned_parquet(tmp_path, parquet_df):
+    pytest.importorskip("pyarrow")
+    from src.utils.data_utils import read_partitioned_parquet, write_partitioned_parquet
+    path = os.path.join(tmp_path, "train")
+    metadata = write_partitioned_parquet(parquet_df, path, categorical_columns=["vendor_id", "store_and_fwd_flag"])
+    assert [partition["name"] for partition in metadata["partitions"]] == ["year_month=2016-01", "year_month=2016-02", "year_month=2016-03"]
+    assert [partition["n_rows"] for partition in metadata["partitions"]] == [2, 1, 2]
+
+    df = read_partitioned_parquet(path)
+    # sorted by pickup_datetime, typed
+    assert df["id"].tolist() == ["id2", "id1", "id5", "id3", "id4"]
+    assert df["pickup_datetime"].dtype == "datetime64[ns]"
+    assert df["vendor_id"].dtype == pd.CategoricalDtype([1, 2])
+    assert df["store_and_fwd_flag"].dtype == pd.CategoricalDtype(["N", "Y"])
+
+    # rewriting replaces the dataset
+    write_partitioned_parquet(parquet_df.iloc[:1], path)
+    assert len(read_partitioned_parquet(path)) == 1
+
+
+def test_read_partitioned_parquet_filters(tmp_path, parquet_df):
+    pytest.importorskip("pyarrow")
+    from src.utils.data_utils import read_partitioned_parquet, write_partitioned_parquet
+    path = os.path.join(tmp_path, "train")
+    write_partitioned_parquet(parquet_df, path, categorical_columns=["vendor_id", "store_and_fwd_flag"], row_group_size=1)
+
+    df = read_partitioned_parquet(path, columns=["id", "store_and_fwd_flag"], start="2016-01-15 10:00:00", end="2016-03-31 23:59:59")
+    assert list(df.columns) == ["id", "store_and_fwd_flag"]
+    assert df["id"].tolist() == ["id1", "id5", "id3"]
+    # the categories of the whole dataset, whatever the rows read
+    assert df["store_and_fwd_flag"].dtype == pd.CategoricalDtype(["N", "Y"])
+
+    empty = read_partitioned_parquet(path, columns=["vendor_id", "pickup_datetime"], start="2017-01-01")
+    assert len(empty) == 0 and empty["vendor_id"].dtype == pd.CategoricalDtype([1, 2])
+    # all the columns but the excluded ones
+    df = read_partitioned_parquet(path, exclude=["id", "trip_duration"])
+    assert list(df.columns) == ["vendor_id", "store_and_fwd_flag", "pickup_datetime"]
+    with pytest.raises(KeyError):
+        read_partitioned_parquet(path, columns=["unknown"])
+    with pytest.raises(KeyError):
+        read_partitioned_parquet(path, exclude=["unknown"])
+    with pytest.raises(FileNotFoundError):
+        read_partitioned_parquet(os.path.join(tmp_path, "missing"))
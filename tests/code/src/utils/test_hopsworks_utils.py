@@ -0,0 +1,142 @@
+import pytest
+import sys
+import threading
+import types
+from src.utils import hopsworks_utils
+
+
+def test_login_to_hopsworks(monkeypatch):
+    # the hopsworks client library is imported on the first login: stub it
+    class HopsworksRestAPIError(Exception):
+        pass
+
+    def login(project, api_key_value=None):
+        if api_key_value == "invalid":
+            raise HopsworksRestAPIError("invalid api key")
+        return f"project {project}"
+
+    hopsworks = types.ModuleType("hopsworks")
+    hopsworks.login = login
+    hopsworks.exceptions = types.SimpleNamespace(HopsworksRestAPIError=HopsworksRestAPIError)
+    monkeypatch.setitem(sys.modules, "hopsworks", hopsworks)
+
+    assert hopsworks_utils.login_to_hopsworks("nyc_taxi_trip_duration", api_key="key") == "project nyc_taxi_trip_duration"
+    # the error is printed and raised (with its response, see is_transient_error)
+    with pytest.raises(HopsworksRestAPIError):
+        hopsworks_utils.login_to_hopsworks("nyc_taxi_trip_duration", api_key="invalid")
+
+
+def test_local_connection_caches_handles(tmp_path):
+    connection = hopsworks_utils.FeatureStoreConnection("nyc_taxi_trip_duration", backend="local", local_dir=tmp_path)
+    fg = connection.get_or_create_feature_group(name="predictions", version=1, primary_key=["pickup_datetime"])
+    assert connection.get_feature_group(name="predictions", version=1) is fg
+    assert connection.get_feature_store() is connection.get_project().get_feature_store()
+    assert connection.stats["logins"] == 1
+
+
+def test_reconnects_with_backoff(tmp_path, monkeypatch):
+    attempts = []
+
+    def login(project, api_key=None):
+        attempts.append(project)
+        if len(attempts) < 3:
+            raise ConnectionError("reset")
+        return "project"
+
+    monkeypatch.setattr(hopsworks_utils, "login_to_hopsworks", login)
+    delays = []
+    connection = hopsworks_utils.FeatureStoreConnection(
+        "nyc_taxi_trip_duration", backend="hopsworks", backoff_seconds=0.5, sleep=delays.append
+    )
+    assert connection.get_project() == "project"
+    assert delays == [0.5, 1.0]
+    assert connection.stats == {"logins": 1, "failed_attempts": 2}
+
+    connection = hopsworks_utils.FeatureStoreConnection(
+        "nyc_taxi_trip_duration", backend="hopsworks", max_retries=1, sleep=delays.append
+    )
+    attempts.clear()
+    with pytest.raises(ConnectionError):
+        connection.get_project()
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class FakeRestAPIError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"status {status_code}")
+        self.response = FakeResponse(status_code)
+
+
+def test_is_transient_error():
+    assert hopsworks_utils.is_transient_error(ConnectionError("reset"))
+    assert hopsworks_utils.is_transient_error(TimeoutError("timed out"))
+    assert hopsworks_utils.is_transient_error(FakeRestAPIError(503))
+    assert hopsworks_utils.is_transient_error(FakeRestAPIError(429))
+    assert not hopsworks_utils.is_transient_error(FakeRestAPIError(404))
+    assert not hopsworks_utils.is_transient_error(ValueError("no such version"))
+    assert not hopsworks_utils.is_transient_error(FileNotFoundError("missing"))
+
+
+def test_permanent_errors_are_not_retried(tmp_path, monkeypatch):
+    class FakeFeatureStore:
+        def get_feature_view(self, name, version):
+            raise FakeRestAPIError(404)
+
+    class FakeProject:
+        def get_feature_store(self):
+            return FakeFeatureStore()
+
+    monkeypatch.setattr(hopsworks_utils, "login_to_hopsworks", lambda project, api_key=None: FakeProject())
+    delays = []
+    connection = hopsworks_utils.FeatureStoreConnection("nyc_taxi_trip_duration", backend="hopsworks", sleep=delays.append)
+    with pytest.raises(FakeRestAPIError):
+        connection.get_feature_view(name="missing", version=7)
+    assert delays == []
+    assert connection.stats == {"logins": 1, "failed_attempts": 0}
+
+
+def test_login_auth_errors_are_not_retried(monkeypatch):
+    def login(project, api_key=None):
+        raise FakeRestAPIError(401)
+
+    monkeypatch.setattr(hopsworks_utils, "login_to_hopsworks", login)
+    delays = []
+    connection = hopsworks_utils.FeatureStoreConnection("nyc_taxi_trip_duration", backend="hopsworks", sleep=delays.append)
+    with pytest.raises(FakeRestAPIError):
+        connection.get_project()
+    assert delays == []
+    assert connection.stats == {"logins": 0, "failed_attempts": 0}
+
+
+def test_lock_is_released_during_backoff(tmp_path):
+    connection = hopsworks_utils.FeatureStoreConnection("nyc_taxi_trip_duration", backend="local", local_dir=tmp_path)
+    connection.get_or_create_feature_group(name="predictions", version=1, primary_key=["pickup_datetime"])
+    # another thread is not blocked while a lookup is backing off
+    cached = []
+
+    def sleep(delay):
+        thread = threading.Thread(target=lambda: cached.append(connection.get_feature_group(name="predictions", version=1)))
+        thread.start()
+        thread.join(timeout=5)
+        assert not thread.is_alive()
+
+    connection._sleep = sleep
+    calls = []
+
+    def lookup(fs):
+        calls.append(fs)
+        if len(calls) == 1:
+            raise ConnectionError("reset")
+        return "feature_view"
+
+    assert connection._get_handle(("feature_view", "view", 1), lookup) == "feature_view"
+    assert len(cached) == 1 and len(calls) == 2
+
+
+def test_get_connection_is_process_wide(tmp_path):
+    connection = hopsworks_utils.get_connection("nyc_taxi_trip_duration", backend="local", local_dir=tmp_path)
+    assert hopsworks_utils.get_connection("nyc_taxi_trip_duration", backend="local") is connection
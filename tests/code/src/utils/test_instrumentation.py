@@ -0,0 +1,93 @@
+import json
+import pytest
+import threading
+from src.utils import instrumentation
+
+
+@pytest.fixture
+def metrics():
+    instrumentation.get_registry().reset()
+    instrumentation.enable()
+    yield instrumentation.get_registry()
+    instrumentation.enable(False)
+    instrumentation.get_registry().reset()
+
+
+def test_disabled_records_nothing():
+    instrumentation.enable(False)
+    instrumentation.get_registry().reset()
+
+    @instrumentation.timed("operation")
+    def operation(x):
+        return 2 * x
+
+    assert operation(2) == 4
+    with instrumentation.timer("block"):
+        instrumentation.increment("calls_total")
+    assert instrumentation.snapshot()["counters"] == [] and instrumentation.snapshot()["histograms"] == []
+
+
+def test_timer_and_counters(metrics):
+    @instrumentation.timed("operation", {"kind": "test"})
+    def operation(fail=False):
+        if fail:
+            raise ValueError("failed")
+        return 1
+
+    assert operation() == 1
+    with pytest.raises(ValueError):
+        operation(fail=True)
+    instrumentation.increment("rows_total", 5)
+    instrumentation.increment("rows_total", 2)
+
+    snapshot = instrumentation.snapshot()
+    json.dumps(snapshot)
+    counters = {counter["name"]: counter for counter in snapshot["counters"]}
+    assert counters["rows_total"]["value"] == 7
+    assert counters["operation_errors_total"] == {"name": "operation_errors_total", "labels": {"kind": "test"}, "value": 1}
+    histogram, = snapshot["histograms"]
+    assert histogram["name"] == "operation_seconds" and histogram["count"] == 2
+    assert histogram["buckets"]["+Inf"] == 2
+
+
+def test_prometheus_format(metrics):
+    metrics.observe("stage_seconds", 0.003, {"stage": 'a"b'})
+    metrics.observe("stage_seconds", 100.0, {"stage": 'a"b'})
+    metrics.increment("errors_total", 1, {"app": "inference"})
+
+    lines = instrumentation.to_prometheus().splitlines()
+    assert "# TYPE nyc_taxi_errors_total counter" in lines
+    assert 'nyc_taxi_errors_total{app="inference"} 1' in lines
+    assert "# TYPE nyc_taxi_stage_seconds histogram" in lines
+    # cumulative buckets, the label value escaped
+    assert 'nyc_taxi_stage_seconds_bucket{stage="a\\"b",le="0.0025"} 0' in lines
+    assert 'nyc_taxi_stage_seconds_bucket{stage="a\\"b",le="0.005"} 1' in lines
+    assert 'nyc_taxi_stage_seconds_bucket{stage="a\\"b",le="60"} 1' in lines
+    assert 'nyc_taxi_stage_seconds_bucket{stage="a\\"b",le="+Inf"} 2' in lines
+    assert 'nyc_taxi_stage_seconds_count{stage="a\\"b"} 2' in lines
+
+
+def test_export(metrics, tmp_path):
+    instrumentation.increment("calls_total")
+    instrumentation.export("job", tmp_path)
+    with open(tmp_path / "job.json") as f:
+        assert json.load(f)["counters"][0]["value"] == 1
+    assert "nyc_taxi_calls_total 1" in (tmp_path / "job.prom").read_text()
+
+
+def test_concurrent_exports(metrics, tmp_path):
+    # streamlit sessions are threads of one process, exporting under the same name
+    def export():
+        for _ in range(20):
+            instrumentation.increment("calls_total")
+            instrumentation.export("app", tmp_path)
+
+    threads = [threading.Thread(target=export) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    instrumentation.export("app", tmp_path)
+    with open(tmp_path / "app.json") as f:
+        assert json.load(f)["counters"][0]["value"] == 80
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["app.json", "app.prom"]
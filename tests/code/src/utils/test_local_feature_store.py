@@ -0,0 +1,85 @@
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import pytest
+from src.utils.local_feature_store import FeatureStoreException, LocalProject
+
+
+@pytest.fixture
+def fs(tmp_path):
+    return LocalProject("nyc_taxi_trip_duration", tmp_path).get_feature_store()
+
+
+def test_insert_upserts_on_primary_key(fs):
+    fg = fs.create_feature_group(name="processed", version="1", primary_key=["id"], event_time="pickup_datetime")
+    fg.insert(features=pd.DataFrame({"id": ["a", "b"], "value": [1, 2]}), write_options={"wait_for_job": True})
+    fg.insert(features=pd.DataFrame({"id": ["b", "c"], "value": [20, 3]}))
+
+    df = fs.get_feature_group("processed", version=1).read()
+    pd.testing.assert_frame_equal(df, pd.DataFrame({"id": ["a", "b", "c"], "value": [1, 20, 3]}))
+
+
+def test_get_or_create_feature_group(fs):
+    with pytest.raises(FeatureStoreException):
+        fs.get_feature_group(name="predictions", version=1)
+    fg = fs.get_or_create_feature_group(name="predictions", version=1, primary_key=["pickup_datetime"])
+    assert fg.primary_key == ["pickup_datetime"]
+    assert fs.get_or_create_feature_group(name="predictions", version=1).primary_key == ["pickup_datetime"]
+
+
+def test_feature_view_training_data(fs):
+    fg_processed = fs.create_feature_group(name="processed", version=1, primary_key=["id"], event_time="pickup_datetime")
+    fg_processed.insert(features=pd.DataFrame({
+        "id": ["a", "b", "c"],
+        "pickup_datetime": pd.to_datetime(["2016-01-01 00:00:17", "2016-05-31 23:59:59", "2016-06-01 00:00:00"]),
+    }))
+    fg_engineered = fs.create_feature_group(name="engineered", version=1, primary_key=["id"])
+    fg_engineered.insert(features=pd.DataFrame({"id": ["c", "b", "a"], "month": [6, 5, 1]}))
+
+    query = fg_processed.select_all().join(fg_engineered.select_all(), on=["id"])
+    fs.create_feature_view(name="combined_features", query=query, version=1)
+    feature_view = fs.get_feature_view(name="combined_features", version=1)
+    version, job = feature_view.create_training_data(
+        start_time=pd.Timestamp("2016-01-01 00:00:17"),
+        end_time=pd.Timestamp("2016-05-31 23:59:59"),
+        data_format="csv"
+    )
+    assert (version, job) == (1, None)
+
+    df, labels = fs.get_feature_view(name="combined_features", version=1).get_training_data(training_dataset_version=1)
+    assert labels is None
+    assert list(df.columns) == ["id", "pickup_datetime", "month"]
+    assert df["id"].tolist() == ["a", "b"] and df["month"].tolist() == [1, 5]
+    with pytest.raises(FeatureStoreException):
+        feature_view.get_training_data(training_dataset_version=2)
+
+
+def test_dataset_api(tmp_path):
+    dataset_api = LocalProject("nyc_taxi_trip_duration", tmp_path / "project").get_dataset_api()
+    local_file = tmp_path / "sketches.npz"
+    local_file.write_bytes(b"v1")
+    assert not dataset_api.exists("Resources/sketches.npz")
+    assert dataset_api.upload(str(local_file), "Resources") == "Resources/sketches.npz"
+    assert dataset_api.exists("Resources/sketches.npz")
+    local_file.write_bytes(b"v2")
+    with pytest.raises(FileExistsError):
+        dataset_api.upload(str(local_file), "Resources")
+    dataset_api.upload(str(local_file), "Resources", overwrite=True)
+
+    (tmp_path / "downloads").mkdir()
+    downloaded = dataset_api.download("Resources/sketches.npz", local_path=str(tmp_path / "downloads"))
+    assert open(downloaded, "rb").read() == b"v2"
+    with pytest.raises(FileExistsError):
+        dataset_api.download("Resources/sketches.npz", local_path=str(tmp_path / "downloads"))
+    with pytest.raises(FileNotFoundError):
+        dataset_api.download("Resources/missing.npz", local_path=str(tmp_path / "downloads"), overwrite=True)
+
+
+def test_concurrent_inserts_write_distinct_parts(fs):
+    fs.create_feature_group(name="predictions", version=1, primary_key=["id"])
+    # separate handles (as separate processes), inserting at the same time
+    groups = [fs.get_feature_group("predictions", version=1) for _ in range(8)]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda i: groups[i].insert(pd.DataFrame({"id": [i], "value": [i]})), range(8)))
+
+    df = fs.get_feature_group("predictions", version=1).read()
+    assert sorted(df["id"]) == list(range(8))
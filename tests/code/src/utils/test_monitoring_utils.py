@@ -0,0 +1,187 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.utils import monitoring_utils
+
+
+class FakeFeatureView:
+    def __init__(self, df):
+        self.df = df
+
+    def get_training_data(self, training_dataset_version):
+        return self.df, None
+
+
+class FakeFeatureStore:
+    def __init__(self, df):
+        self.df = df
+        self.calls = 0
+
+    def get_feature_view(self, name, version):
+        self.calls += 1
+        return FakeFeatureView(self.df)
+
+
+def test_ks_p_value():
+    # survival function of the Kolmogorov distribution of size 188 (= round(187.5), half to even)
+    np.testing.assert_allclose(
+        monitoring_utils.ks_p_value(np.array([0.0, 0.05, 0.1, 0.2]), 500, 300),
+        [1.0, 0.715761, 0.043386, 4.562540e-07],
+        rtol=1e-5
+    )
+    assert np.isnan(monitoring_utils.ks_p_value(np.array([0.1, 0.1]), 500, np.array([0, 10]))).tolist() == [True, False]
+
+
+def test_ks_test_matches_brute_force():
+    rng = np.random.default_rng(0)
+    reference, sample = rng.normal(0, 1, 500), rng.normal(0.2, 1, 300)
+    continuous = reference, sample
+    distance, p_value = monitoring_utils.ks_test(np.sort(reference), np.append(sample, np.nan))
+
+    values = np.concatenate([reference, sample])
+    expected = max(abs((reference <= v).mean() - (sample <= v).mean()) for v in values)
+    assert distance == pytest.approx(expected)
+    assert 0 < p_value < 0.05
+    assert np.isnan(monitoring_utils.ks_test(np.sort(reference), np.array([]))[1])
+
+    # with ties
+    reference, sample = rng.integers(0, 10, 500).astype(float), rng.integers(0, 12, 300).astype(float)
+    distance, _ = monitoring_utils.ks_test(np.sort(reference), sample)
+    expected = max(abs((reference <= v).mean() - (sample <= v).mean()) for v in range(13))
+    assert distance == pytest.approx(expected)
+
+    scipy_stats = pytest.importorskip("scipy.stats")
+    reference, sample = continuous
+    distance, p_value = monitoring_utils.ks_test(np.sort(reference), sample)
+    # as the feature-wise tests of TabularDrift
+    result = scipy_stats.ks_2samp(reference, sample, method="asymp")
+    assert distance == pytest.approx(result.statistic)
+    assert p_value == pytest.approx(result.pvalue, rel=1e-9)
+
+
+def test_get_reference_is_cached(tmp_path):
+    rng = np.random.default_rng(1)
+    test_df = pd.DataFrame({
+        'direction_df': rng.uniform(0, 360, 100),
+        'minute_of_the_day': rng.integers(0, 1440, 100),
+        'trip_duration': rng.integers(60, 3600, 100),
+    })
+    features = ['direction', 'minute_of_the_day', 'prediction']
+    fs = FakeFeatureStore(test_df)
+
+    reference = monitoring_utils.get_reference(fs, 'combined_features', 1, 2, features=features, cache_dir=tmp_path)
+    assert fs.calls == 1
+    np.testing.assert_array_equal(reference['direction'], np.sort(test_df['direction_df']))
+    cached = monitoring_utils.get_reference(fs, 'combined_features', 1, 2, features=features, cache_dir=tmp_path)
+    assert fs.calls == 1
+    for feature in features:
+        np.testing.assert_array_equal(cached[feature], reference[feature])
+
+    # a feature missing from the cache rebuilds it
+    test_df['pickup_latitude'] = rng.uniform(40.6, 40.9, 100)
+    monitoring_utils.get_reference(fs, 'combined_features', 1, 2, features=features + ['pickup_latitude'], cache_dir=tmp_path)
+    assert fs.calls == 2
+
+
+def test_feature_drift():
+    rng = np.random.default_rng(3)
+    reference = {'stable': np.sort(rng.normal(0, 1, 2000)), 'prediction': np.sort(rng.normal(0, 1, 2000))}
+    df = pd.DataFrame({'stable': rng.normal(0, 1, 1000), 'prediction': rng.normal(1, 1, 1000)})
+
+    results = monitoring_utils.feature_drift(reference, df, p_val=0.05)
+    assert list(results.columns) == ['Feature', 'Drift', 'Stat Value', 'P-Value']
+    assert results['Feature'].tolist() == ['stable', 'prediction']
+    assert results['Drift'].tolist() == ['No', 'Yes']
+
+
+def test_drift_timeline_matches_per_window_tests():
+    rng = np.random.default_rng(4)
+    reference = {
+        'minute_of_the_day': np.sort(rng.integers(0, 1440, 3000).astype(np.float64)), # ties
+        'prediction': np.sort(rng.normal(0, 1, 3000)),
+    }
+    times = pd.Timestamp("2023-07-03") + pd.to_timedelta(rng.uniform(0, 21 * 86400, 2000), unit="s")
+    df = pd.DataFrame({
+        'pickup_datetime': times.strftime("%Y-%m-%d %H:%M:%S"),
+        'minute_of_the_day': rng.integers(0, 1440, 2000),
+        # drift starts in the third week
+        'prediction': rng.normal(0, 1, 2000) + (times >= pd.Timestamp("2023-07-17")),
+    })
+    df.loc[5, 'prediction'] = np.nan
+
+    timeline = monitoring_utils.drift_timeline(reference, df, freq="day")
+    assert list(timeline.columns) == ['Window', 'Feature', 'Rows', 'Stat Value', 'P-Value', 'Drift']
+    assert len(timeline) == 21 * 2
+    for (window, feature), row in timeline.set_index(['Window', 'Feature']).iterrows():
+        in_window = (pd.to_datetime(df['pickup_datetime']).dt.floor("D") == window).to_numpy()
+        distance, p_value = monitoring_utils.ks_test(reference[feature], df.loc[in_window, feature].to_numpy(dtype=float))
+        assert row['Stat Value'] == pytest.approx(distance)
+        assert row['P-Value'] == pytest.approx(p_value)
+
+    weekly = monitoring_utils.drift_timeline(reference, df, freq="week")
+    drift = weekly[weekly['Feature'] == 'prediction'].set_index('Window')['Drift']
+    assert drift.tolist() == ['No', 'No', 'Yes']
+    assert drift.index[0] == pd.Timestamp("2023-07-03") # a monday
+    with pytest.raises(ValueError):
+        monitoring_utils.drift_timeline(reference, df, freq="month")
+
+
+def test_chi2_sf():
+    assert monitoring_utils.chi2_sf(3.841458820694124, 1) == pytest.approx(0.05)
+    assert monitoring_utils.chi2_sf(11.070497693516351, 5) == pytest.approx(0.05)
+    # closed form for even degrees of freedom: exp(-x / 2) * (1 + x / 2)
+    assert monitoring_utils.chi2_sf(30.0, 4) == pytest.approx(np.exp(-15) * 16)
+    assert monitoring_utils.chi2_sf(0.0, 3) == 1.0
+
+
+def test_chi2_test():
+    reference = np.repeat([1.0, 2.0, 3.0], [500, 300, 200])
+    sample = np.repeat([1.0, 2.0, 4.0], [40, 50, 10])
+    statistic, p_value = monitoring_utils.chi2_test(reference, sample)
+
+    counts = np.array([[500, 300, 200, 0], [40, 50, 0, 10]], dtype=float)
+    expected = counts.sum(axis=1, keepdims=True) * counts.sum(axis=0, keepdims=True) / counts.sum()
+    assert statistic == pytest.approx(((counts - expected) ** 2 / expected).sum())
+    assert p_value == pytest.approx(monitoring_utils.chi2_sf(statistic, 3))
+    assert monitoring_utils.chi2_test(reference, reference[::10])[1] > 0.05
+
+
+def test_adjust_p_values():
+    p_values = np.array([0.01, 0.04, np.nan, 0.03, 0.5])
+    np.testing.assert_allclose(
+        monitoring_utils.adjust_p_values(p_values, "bh"), [0.04, 0.04 * 4 / 3, np.nan, 0.04 * 4 / 3, 0.5]
+    )
+    np.testing.assert_allclose(
+        monitoring_utils.adjust_p_values(p_values, "bonferroni"), [0.04, 0.16, np.nan, 0.12, 1.0]
+    )
+    with pytest.raises(ValueError):
+        monitoring_utils.adjust_p_values(p_values, "holm")
+
+
+def test_full_drift_serial_and_parallel(monkeypatch):
+    rng = np.random.default_rng(1)
+    n = 4000
+    reference_df = pd.DataFrame({
+        'vendor_id': rng.choice([1, 2], n, p=[0.5, 0.5]),
+        'passenger_count': rng.choice([1, 2, 3], n),
+        'direction': rng.normal(0, 1, n),
+        'prediction': rng.normal(0, 1, n),
+    })
+    df = pd.DataFrame({
+        'vendor_id': rng.choice([1, 2], n, p=[0.7, 0.3]),
+        'passenger_count': rng.choice([1, 2, 3], n),
+        'direction': rng.normal(0, 1, n),
+        'prediction': rng.normal(0.3, 1, n),
+    })
+    reference = monitoring_utils.build_reference(reference_df, list(reference_df.columns))
+
+    serial = monitoring_utils.full_drift(reference, df, n_workers=1)
+    assert serial['Test'].tolist() == ['Chi-Square', 'Chi-Square', 'KS', 'KS']
+    assert serial['Drift'].tolist() == ['Yes', 'No', 'No', 'Yes']
+    assert serial['P-Value'].iloc[2] == pytest.approx(monitoring_utils.ks_test(reference['direction'], df['direction'])[1])
+    np.testing.assert_allclose(serial['Adjusted P-Value'], monitoring_utils.adjust_p_values(serial['P-Value'], "bh"))
+
+    # the same results on the process pool (through the shared buffers)
+    monkeypatch.setattr(monitoring_utils, "MIN_ROWS_PARALLEL_DRIFT", 0)
+    parallel = monitoring_utils.full_drift(reference, df, n_workers=2)
+    pd.testing.assert_frame_equal(serial, parallel)
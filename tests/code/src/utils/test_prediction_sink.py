@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+import pytest
+import time
+from src.utils import prediction_sink
+from src.utils.prediction_sink import PredictionSink
+
+
+class FakeFeatureGroup:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.inserted = []
+
+    def insert(self, df):
+        if self.fail:
+            raise ConnectionError("feature store unavailable")
+        self.inserted.append(df)
+
+
+def prediction_rows(n_rows, start=0):
+    return pd.DataFrame({
+        "pickup_datetime": [f"2016-07-04 00:00:{i:02d}" for i in range(start, start + n_rows)],
+        "holiday": np.ones(n_rows, dtype=np.int64),
+        "prediction": np.arange(start, start + n_rows, dtype=np.float32) + 0.1,
+    })
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_flush_by_size(tmp_path):
+    feature_group = FakeFeatureGroup()
+    sink = PredictionSink(lambda: feature_group, tmp_path / "spool.jsonl", max_batch_rows=3, max_delay_seconds=60)
+    sink.append(prediction_rows(2))
+    assert sink.pending_rows == 2 and feature_group.inserted == []
+    sink.append(prediction_rows(1, start=2))
+    assert wait_for(lambda: sink.pending_rows == 0)
+    sink.close()
+
+    df = pd.concat(feature_group.inserted, ignore_index=True)
+    pd.testing.assert_frame_equal(df, prediction_rows(3))
+    assert (tmp_path / "spool.jsonl").stat().st_size == 0
+
+
+def test_flush_by_time(tmp_path):
+    feature_group = FakeFeatureGroup()
+    sink = PredictionSink(lambda: feature_group, tmp_path / "spool.jsonl", max_batch_rows=100, max_delay_seconds=0.05)
+    sink.append(prediction_rows(1))
+    assert wait_for(lambda: len(feature_group.inserted) == 1)
+    sink.close()
+
+
+def test_replay_after_restart(tmp_path):
+    spool_path = tmp_path / "spool.jsonl"
+    failing = FakeFeatureGroup(fail=True)
+    sink = PredictionSink(lambda: failing, spool_path, max_batch_rows=1, max_delay_seconds=60)
+    sink.append(prediction_rows(2))
+    assert wait_for(lambda: sink.stats["failed_inserts"] == 1)
+    with pytest.raises(ConnectionError):
+        sink.close(flush=True)
+    # a crash in the middle of a write leaves a torn row
+    with open(spool_path, "ab") as f:
+        f.write(b'{"values": {"pickup')
+
+    feature_group = FakeFeatureGroup()
+    sink = PredictionSink(lambda: feature_group, spool_path, max_batch_rows=100, max_delay_seconds=60)
+    assert wait_for(lambda: len(feature_group.inserted) == 1)
+    sink.close()
+    pd.testing.assert_frame_equal(feature_group.inserted[0], prediction_rows(2))
+
+
+def test_append_after_close(tmp_path):
+    sink = PredictionSink(lambda: FakeFeatureGroup(), tmp_path / "spool.jsonl")
+    sink.close()
+    with pytest.raises(ValueError):
+        sink.append(prediction_rows(1))
+
+
+def test_spool_is_locked_by_one_sink(tmp_path):
+    spool_path = tmp_path / "spool.jsonl"
+    sink = PredictionSink(lambda: FakeFeatureGroup(), spool_path)
+    with pytest.raises(RuntimeError):
+        PredictionSink(lambda: FakeFeatureGroup(), spool_path)
+    sink.close()
+    # released on close
+    PredictionSink(lambda: FakeFeatureGroup(), spool_path).close()
+
+
+def test_spool_per_producer(tmp_path, monkeypatch):
+    monkeypatch.setattr(prediction_sink, "SPOOL_DIR", tmp_path)
+    assert prediction_sink.get_spool_path("app") != prediction_sink.get_spool_path("automated_data_generation")
+    app_sink = PredictionSink(lambda: FakeFeatureGroup(), producer="app")
+    job_sink = PredictionSink(lambda: FakeFeatureGroup(), producer="automated_data_generation")
+    assert app_sink.spool_path == tmp_path / "predictions_spool.app.jsonl"
+    job_sink.close()
+    app_sink.close()
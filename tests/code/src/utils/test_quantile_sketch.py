@@ -0,0 +1,184 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.utils import monitoring_utils, quantile_sketch
+from src.utils.local_feature_store import LocalDatasetApi
+
+
+def exact_cdf(values, x):
+    return np.searchsorted(np.sort(values), x, side="right") / len(values)
+
+
+def max_rank_error(sketch, values):
+    grid = np.quantile(values, np.linspace(0, 1, 1001))
+    return np.abs(sketch.cdf(grid) - exact_cdf(values, grid)).max()
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_rank_error_within_bound(seed):
+    rng = np.random.default_rng(seed)
+    values = rng.lognormal(size=100000)
+    sketch = quantile_sketch.KLLSketch(k=200, seed=seed)
+    for chunk in np.array_split(values, 500):
+        sketch.update(chunk)
+
+    assert sketch.n == len(values)
+    assert max_rank_error(sketch, values) <= quantile_sketch.rank_error(200)
+    # bounded memory
+    assert len(sketch) <= 3 * 200 + 8 * len(sketch.levels)
+    # the extremes are exact
+    assert sketch.quantile([0, 1]).tolist() == [values.min(), values.max()]
+
+
+def test_merge_within_bound():
+    rng = np.random.default_rng(0)
+    values = rng.normal(size=200000)
+    sketches = [quantile_sketch.KLLSketch(seed=i).update(chunk) for i, chunk in enumerate(np.array_split(values, 40))]
+    merged = sketches[0]
+    for sketch in sketches[1:]:
+        merged.merge(sketch)
+
+    assert merged.n == len(values)
+    assert max_rank_error(merged, values) <= quantile_sketch.rank_error(merged.k)
+    assert len(merged) <= 3 * merged.k + 8 * len(merged.levels)
+    with pytest.raises(ValueError):
+        merged.merge(quantile_sketch.KLLSketch(k=100))
+
+
+def test_quantile_and_missing_values():
+    sketch = quantile_sketch.KLLSketch().update(np.array([3.0, np.nan, 1.0, 2.0]))
+    assert sketch.n == 3
+    assert sketch.quantile([0, 0.5, 1]).tolist() == [1.0, 2.0, 3.0]
+    assert np.isnan(quantile_sketch.KLLSketch().quantile(0.5))
+    with pytest.raises(ValueError):
+        sketch.quantile(1.5)
+
+
+def test_to_arrays_round_trip():
+    sketch = quantile_sketch.KLLSketch(seed=0).update(np.arange(10000.0))
+    restored = quantile_sketch.KLLSketch.from_arrays(sketch.to_arrays())
+    assert (restored.k, restored.n, len(restored.levels)) == (sketch.k, sketch.n, len(sketch.levels))
+    np.testing.assert_array_equal(restored.cdf([10.0, 5000.0]), sketch.cdf([10.0, 5000.0]))
+
+
+def test_ks_distance_and_psi_close_to_exact():
+    rng = np.random.default_rng(1)
+    reference = np.sort(rng.normal(0, 1, 50000))
+    for shift in [0.0, 0.1, 0.5]:
+        sample = rng.normal(shift, 1, 100000)
+        sketch = quantile_sketch.KLLSketch(seed=0).update(sample)
+        exact_distance, _ = monitoring_utils.ks_test(reference, sample)
+        assert abs(quantile_sketch.ks_distance(reference, sketch) - exact_distance) <= quantile_sketch.rank_error(sketch.k)
+
+        # exact psi over the deciles of the reference
+        edges = np.quantile(reference, np.arange(1, 10) / 10)
+        expected = np.diff(np.concatenate([[0], exact_cdf(reference, edges), [1]]))
+        actual = np.diff(np.concatenate([[0], exact_cdf(sample, edges), [1]]))
+        exact_psi = np.sum((actual - expected) * np.log(actual / expected))
+        assert quantile_sketch.psi(reference, sketch) == pytest.approx(exact_psi, abs=0.01)
+
+
+def test_sketch_store(tmp_path):
+    store = quantile_sketch.SketchStore(tmp_path, freq="day")
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        'pickup_datetime': pd.date_range("2016-01-01", periods=96, freq="H").strftime("%Y-%m-%d %H:%M:%S"),
+        'prediction': rng.random(96),
+    })
+    assert store.update(df, producer="app", features=['prediction']) == 4
+    # rows of another producer, with times in seconds since the epoch
+    assert store.update(
+        pd.DataFrame({'pickup_datetime': [pd.Timestamp("2016-01-02 12:00").timestamp()], 'prediction': [0.5]}),
+        producer="job",
+        features=['prediction']
+    ) == 1
+    # a partition updated twice
+    store.update(df.iloc[:24], producer="app", features=['prediction'])
+
+    assert store.partitions() == ["2016-01-01", "2016-01-02", "2016-01-03", "2016-01-04"]
+    assert store.partitions(start="2016-01-02 06:00", end="2016-01-03") == ["2016-01-02"]
+    assert store.load()['prediction'].n == 96 + 1 + 24
+    assert store.load(start="2016-01-02", end="2016-01-03")['prediction'].n == 25
+
+
+def test_sketch_store_shared(tmp_path):
+    dataset_api = LocalDatasetApi(tmp_path / "datasets")
+    df = pd.DataFrame({
+        'pickup_datetime': ["2016-01-01 10:00:00", "2016-01-02 10:00:00"],
+        'prediction': [1.0, 2.0],
+    })
+    quantile_sketch.SketchStore(tmp_path / "run_1", dataset_api=dataset_api).update(df, producer="automated_data_generation", features=['prediction'])
+    # a fresh runner continues from the shared sketches
+    store = quantile_sketch.SketchStore(tmp_path / "run_2", dataset_api=dataset_api)
+    store.update(df.iloc[1:], producer="automated_data_generation", features=['prediction'])
+    assert store.load()['prediction'].n == 2
+    quantile_sketch.SketchStore(tmp_path / "app", dataset_api=dataset_api).update(
+        df.assign(pickup_datetime="2016-01-03 10:00:00"), producer="app", features=['prediction']
+    )
+
+    # the monitoring downloads the sketches of all the producers
+    monitoring_store = quantile_sketch.SketchStore(tmp_path / "monitoring", dataset_api=dataset_api)
+    assert monitoring_store.sync(end="2016-01-03") == 2
+    assert monitoring_store.partitions() == ["2016-01-01", "2016-01-02"]
+    assert monitoring_store.sync() == 3
+    assert monitoring_store.load()['prediction'].n == 1 + 2 + 2
+    partitions = monitoring_store.load_partitions(start="2016-01-02")
+    assert list(partitions) == [pd.Timestamp("2016-01-02"), pd.Timestamp("2016-01-03")]
+    assert partitions[pd.Timestamp("2016-01-02")]['prediction'].n == 2
+    with pytest.raises(ValueError):
+        quantile_sketch.SketchStore(tmp_path / "local").sync()
+
+
+def test_category_counts():
+    rng = np.random.default_rng(1)
+    values = rng.choice([0, 1, 2], size=50000, p=[0.2, 0.3, 0.5])
+    sketch = quantile_sketch.KLLSketch(seed=0).update(values)
+    categories, counts = quantile_sketch.category_counts(sketch, [0, 1, 2, 3])
+    assert categories.tolist() == [0, 1, 2, 3]
+    exact = np.bincount(values, minlength=4)
+    assert np.abs(counts - exact).max() <= 2 * quantile_sketch.rank_error(sketch.k) * len(values)
+    assert counts.sum() == pytest.approx(len(values))
+
+
+def test_sketch_drift():
+    rng = np.random.default_rng(3)
+    reference = {'a': np.sort(rng.normal(0, 1, 5000)), 'b': np.sort(rng.normal(0, 1, 5000))}
+    sketches = {
+        'a': quantile_sketch.KLLSketch(seed=0).update(rng.normal(0, 1, 20000)),
+        'b': quantile_sketch.KLLSketch(seed=0).update(rng.normal(1, 1, 20000)),
+    }
+    results = monitoring_utils.sketch_drift(reference, sketches, p_val=0.05)
+    assert results['Feature'].tolist() == ['a', 'b']
+    assert results['Drift'].tolist() == ['No', 'Yes']
+    assert results['Rows'].tolist() == [20000, 20000]
+    assert results['PSI'].iloc[1] > 0.25 > results['PSI'].iloc[0]
+    assert results['Test'].tolist() == ['KS', 'KS']
+
+
+def test_sketch_drift_categorical():
+    rng = np.random.default_rng(4)
+    reference = {'vendor_id': np.sort(rng.choice([1, 2], size=5000, p=[0.5, 0.5])).astype(np.float64)}
+    same = quantile_sketch.KLLSketch(seed=0).update(rng.choice([1, 2], size=20000, p=[0.5, 0.5]))
+    shifted = quantile_sketch.KLLSketch(seed=0).update(rng.choice([1, 2], size=20000, p=[0.4, 0.6]))
+    for sketch, drift in ((same, 'No'), (shifted, 'Yes')):
+        results = monitoring_utils.sketch_drift(reference, {'vendor_id': sketch}, categorical_features=['vendor_id'])
+        assert results['Test'].tolist() == ['Chi-Square'] and results['Drift'].tolist() == [drift]
+
+
+def test_sketch_drift_timeline():
+    rng = np.random.default_rng(5)
+    reference = {'a': np.sort(rng.normal(0, 1, 5000))}
+    # monday 2016-01-04 to sunday 2016-01-10, then a drifted monday
+    partitions = {
+        day: {'a': quantile_sketch.KLLSketch(seed=0).update(rng.normal(1 if day.weekday() == 0 and day.day == 11 else 0, 1, 2000))}
+        for day in pd.date_range("2016-01-04", "2016-01-11")
+    }
+    daily = monitoring_utils.sketch_drift_timeline(reference, partitions, freq="day")
+    assert len(daily) == 8 and daily['Rows'].tolist() == [2000] * 8
+    assert daily['Stat Value'].iloc[:7].max() < 0.1 < 0.3 < daily['Stat Value'].iloc[7]
+    assert daily['Drift'].iloc[7] == 'Yes'
+    weekly = monitoring_utils.sketch_drift_timeline(reference, partitions, freq="week")
+    assert weekly['Window'].tolist() == [pd.Timestamp("2016-01-04"), pd.Timestamp("2016-01-11")]
+    assert weekly['Rows'].tolist() == [14000, 2000]
+    # the sketches of the partitions are unchanged
+    assert partitions[pd.Timestamp("2016-01-04")]['a'].n == 2000